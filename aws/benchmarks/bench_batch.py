@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Batch scoring throughput: one batch request vs the same measurements scored
+one request at a time through the single-measurement path, with the result
+cache cold (every render is new) and warm (the same chart re-opened).
+
+Usage: python -m aws.benchmarks.bench_batch [--size N] [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile'))
+
+import lambda_function  # noqa: E402
+
+handler = lambda_function.lambda_handler.__wrapped__
+
+
+def make_measurements(size, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "weight": round(rng.uniform(2.0, 20.0), 3),
+            "date_birth": "2021-01-01",
+            "date_measurement": (date(2021, 1, 1) + timedelta(days=rng.randint(0, 1856))).isoformat(),
+            "sex": rng.choice(["male", "female"]),
+        }
+        for _ in range(size)
+    ]
+
+
+def timed_ms(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch scoring benchmark')
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    measurements = make_measurements(args.size)
+    event = {"body": json.dumps({"measurements": measurements})}
+
+    def cold(fn):
+        def run():
+            lambda_function.clear_result_cache()
+            return fn()
+        return run
+
+    first = timed_ms(cold(lambda: handler(dict(event), None)))
+    batch = [timed_ms(cold(lambda: handler(dict(event), None))) for _ in range(args.repeat)]
+    scoring = [timed_ms(cold(lambda: lambda_function.score_measurements(measurements))) for _ in range(args.repeat)]
+    warm = [timed_ms(lambda: lambda_function.score_measurements(measurements)) for _ in range(args.repeat)]
+    single = timed_ms(cold(lambda: [handler({"body": json.dumps(m)}, None) for m in measurements]))
+
+    print(f"{args.size} measurements")
+    print(f"  first batch (incl. lazy NumPy import) {first:9.2f} ms")
+    print(f"  batch request, median                 {statistics.median(batch):9.2f} ms")
+    print(f"  scoring only, median                  {statistics.median(scoring):9.2f} ms")
+    print(f"  scoring only, result cache warm       {statistics.median(warm):9.2f} ms")
+    print(f"  {args.size} single requests, total        {single:9.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
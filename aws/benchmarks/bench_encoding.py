@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Payload size and serialization time of batch results in each response
+encoding, against the previous format (json.dumps echoing the whole
+request under "input"), with and without gzip.
+
+Usage: python -m aws.benchmarks.bench_encoding [--size N ...] [--repeat N]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile'))
+
+import encoding  # noqa: E402
+import lambda_function  # noqa: E402
+
+from aws.benchmarks.bench_batch import make_measurements  # noqa: E402
+
+
+def best_ms(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def variants(body, results):
+    """name -> fn() returning the response body bytes on the wire"""
+    payload = {"count": len(results), "failed": 0, "user_id": "bench", "success": True}
+
+    def legacy():
+        return json.dumps({"input": body, "results": results, **payload}).encode()
+
+    def encoded(name, use_gzip):
+        def run():
+            data = dict(payload)
+            if name == 'columnar':
+                data["columns"] = lambda_function.columnar_results(results)
+            else:
+                data["results"] = results
+            text, _, binary = encoding.finish(encoding.serialize(data, name, "results"), name, use_gzip)
+            return base64.b64decode(text) if binary else text.encode()
+        return run
+
+    yield 'previous (with input echo)', legacy
+    for name in encoding.FORMATS:
+        if encoding.available(name):
+            yield name, encoded(name, False)
+            yield f'{name} + gzip', encoded(name, True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Response encoding benchmark')
+    parser.add_argument('--size', type=int, nargs='*', default=[100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    for size in args.size:
+        body = {"measurements": make_measurements(size)}
+        results = lambda_function.score_measurements(body["measurements"])
+        print(f"\n{size} measurements")
+        print(f"{'encoding':<28} {'bytes':>10} {'vs prev':>8} {'ms':>8}")
+        reference = None
+        for name, fn in variants(body, results):
+            size_bytes = len(fn())
+            reference = reference or size_bytes
+            print(f"{name:<28} {size_bytes:>10} {size_bytes / reference:>7.0%} {best_ms(fn, args.repeat):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Per-request JWT validation cost: rebuilding the RSA key from its JWK on
+every request, the cached public key, and the warm path where a repeat
+token is served from the verified token cache. Then the whole
+require_jwt_auth overhead per request in each AUTH_MODE.
+
+Usage: python -m aws.benchmarks.bench_jwt [--requests N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile'))
+
+import jwt  # noqa: E402
+import jwt_validator  # noqa: E402
+import metrics  # noqa: E402
+
+from aws.tools.local_jwks import SigningKey, id_token_claims, jwks_document  # noqa: E402
+
+POOL_ID = 'us-east-1_bench'
+CLIENT_ID = 'bench-client'
+ISSUER = f'https://cognito-idp.us-east-1.amazonaws.com/{POOL_ID}'
+
+
+def validate_uncached(token):
+    """The previous per-request path: JWK lookup and RSA key parsing every time"""
+    kid = jwt.get_unverified_header(token)['kid']
+    jwk = jwt_validator.find_jwk_by_kid(kid)
+    public_key = jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(jwk))
+    return jwt.decode(token, public_key, algorithms=['RS256'], audience=CLIENT_ID, issuer=ISSUER)
+
+
+def measure_us(fn, token, requests):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn(token)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples), sorted(samples)[int(len(samples) * 0.99) - 1]
+
+
+@jwt_validator.require_jwt_auth
+def _noop_handler(event, context):
+    return {'statusCode': 200}
+
+
+def auth_overhead(token, requests):
+    """(mode, median us, p99 us) of require_jwt_auth around a handler that does nothing"""
+    claims = id_token_claims(ISSUER, CLIENT_ID)
+    authorizer_event = {'headers': {}, 'requestContext': {'authorizer': {'claims': {k: str(v) for k, v in claims.items()}}}}
+    token_event = {'headers': {'Authorization': f'Bearer {token}'}}
+    cases = (
+        ('verify, signature checked', 'verify', 0, token_event),
+        ('verify, token cache hit', 'verify', 1024, token_event),
+        ('authorizer claims', 'authorizer', 0, authorizer_event),
+    )
+    for name, mode, cache_size, event in cases:
+        jwt_validator.AUTH_MODE = mode
+        jwt_validator.TOKEN_CACHE_SIZE = cache_size
+        jwt_validator.clear_token_cache()
+        yield (name, *measure_us(lambda e: _noop_handler(dict(e), None), event, requests))
+    jwt_validator.AUTH_MODE = 'verify'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='JWT validation benchmark')
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    jwt_validator.COGNITO_REGION = 'us-east-1'
+    jwt_validator.COGNITO_USER_POOL_ID = POOL_ID
+    jwt_validator.COGNITO_CLIENT_ID = CLIENT_ID
+    key = SigningKey()
+    jwt_validator.set_jwks(jwks_document([key, SigningKey()]))
+    token = key.sign(id_token_claims(ISSUER, CLIENT_ID))
+
+    jwt_validator.TOKEN_CACHE_SIZE = 0
+    for name, fn in (('rebuild key per request', validate_uncached), ('cached public key', jwt_validator.validate_jwt_token)):
+        median, p99 = measure_us(fn, token, args.requests)
+        print(f"{name:<26} median {median:8.1f} us   p99 {p99:8.1f} us")
+
+    jwt_validator.TOKEN_CACHE_SIZE = 1024
+    jwt_validator.validate_jwt_token(token)
+    median, p99 = measure_us(jwt_validator.validate_jwt_token, token, args.requests)
+    print(f"{'verified token cache hit':<26} median {median:8.1f} us   p99 {p99:8.1f} us")
+    print(f"token cache stats: {jwt_validator.token_cache_stats()}")
+
+    print("\nrequire_jwt_auth overhead per request (metrics disabled)")
+    metrics.METRICS_ENABLED = False
+    for name, median, p99 in auth_overhead(token, args.requests):
+        print(f"{name:<26} median {median:8.1f} us   p99 {p99:8.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Per-lookup latency and allocations of the LMS row lookup:
+the original DataFrame scan vs binary search vs the direct grid index.
+
+Usage: python -m aws.benchmarks.bench_lms_lookup [--lookups N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile'))
+
+import percentile_engine as engine  # noqa: E402
+from lms_tables import load_artifact  # noqa: E402
+
+
+def dataframe_lookup(df):
+    def lookup(age_days):
+        row = df.loc[df['Day'] == age_days]
+        if row.empty:
+            idx = (df['Day'] - age_days).abs().idxmin()
+            row = df.loc[[idx]]
+        return float(row['L'].iloc[0]), float(row['M'].iloc[0]), float(row['S'].iloc[0])
+    return lookup
+
+
+def bisect_lookup(table):
+    def lookup(age_days):
+        i = engine.nearest_index(table.x, age_days)
+        return table.L[i], table.M[i], table.S[i]
+    return lookup
+
+
+def measure(lookup, ages):
+    start = time.perf_counter()
+    for age in ages:
+        lookup(age)
+    per_lookup_us = (time.perf_counter() - start) / len(ages) * 1e6
+
+    tracemalloc.start()
+    for age in ages[:1000]:
+        lookup(age)
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+    return per_lookup_us, peak, blocks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='LMS lookup micro-benchmark')
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    table = load_artifact()[('wfa', 'female')]
+    rng = random.Random(0)
+    ages = [rng.randint(0, 1900) for _ in range(args.lookups)]
+
+    candidates = [
+        ('direct index', lambda age: engine.lookup_lms(table, age)),
+        ('binary search', bisect_lookup(table)),
+    ]
+    try:
+        import pandas as pd
+        df = pd.DataFrame({'Day': [int(x) for x in table.x], 'L': list(table.L), 'M': list(table.M), 'S': list(table.S)})
+        candidates.append(('DataFrame scan', dataframe_lookup(df)))
+    except ImportError:
+        print('pandas not installed, skipping the DataFrame baseline')
+
+    print(f"{'path':<16}{'us/lookup':>12}{'peak bytes':>14}{'live blocks':>14}")
+    for name, lookup in candidates:
+        sample = ages if name != 'DataFrame scan' else ages[:2000]
+        per_lookup_us, peak, blocks = measure(lookup, sample)
+        print(f"{name:<16}{per_lookup_us:>12.3f}{peak:>14}{blocks:>14}")
+
+
+if __name__ == '__main__':
+    main()
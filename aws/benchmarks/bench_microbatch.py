@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Throughput of single-measurement requests with micro-batching off and on, at
+several concurrencies. Rounds alternate between the two settings and the
+median of each is reported, since one round is within this machine's noise.
+
+By default the handler is called from a pool of threads in process, which
+isolates the scoring path; with --server the same load goes over HTTP to an
+in-process LocalServer, as the local server sees it.
+
+Usage: python -m aws.benchmarks.bench_microbatch [--concurrency N ...] [--requests N] [--rounds N]
+           [--window-us N] [--server]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile'))
+
+import lambda_function  # noqa: E402
+import metrics  # noqa: E402
+import microbatch  # noqa: E402
+
+from aws.tools import loadgen  # noqa: E402
+from aws.tools.local_server import LocalServer  # noqa: E402
+
+handler = lambda_function.lambda_handler.__wrapped__
+
+
+def run_threads(bodies, requests, concurrency):
+    """Call the handler requests times from concurrency threads; returns (req/s, CPU us per request)"""
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            handler({'body': bodies[i % len(bodies)]}, None)
+
+    threads = [threading.Thread(target=work) for _ in range(concurrency)]
+    start, cpu = time.perf_counter(), time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return requests / (time.perf_counter() - start), (time.process_time() - cpu) / requests * 1e6
+
+
+def run_server(server, bodies, requests, concurrency):
+    cpu = time.process_time()
+    report = loadgen.run_load(server.url, server.token(), bodies, requests, concurrency)
+    return report['rps'], (time.process_time() - cpu) / requests * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-batching benchmark')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 32])
+    parser.add_argument('--requests', type=int, default=4000, help='requests per round')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--window-us', type=int, default=microbatch.MICROBATCH_WINDOW_US)
+    parser.add_argument('--server', action='store_true', help='send the load over HTTP to a LocalServer')
+    args = parser.parse_args(argv)
+
+    metrics.METRICS_ENABLED = False
+    # Distinct bodies, so most rows miss the result cache as fresh traffic would
+    bodies = loadgen.make_bodies(args.requests * args.rounds * 2, seed=3)
+    server = LocalServer().start() if args.server else None
+    run = (lambda requests, concurrency: run_server(server, bodies, requests, concurrency)) if server else \
+        (lambda requests, concurrency: run_threads(bodies, requests, concurrency))
+    try:
+        run(min(args.requests, 2000), 4)
+        for concurrency in args.concurrency:
+            rounds = {'off': [], 'on': []}
+            stats = {}
+            for _ in range(args.rounds):
+                for mode in rounds:
+                    collector = microbatch.enable(window_us=args.window_us) if mode == 'on' else None
+                    rounds[mode].append(run(args.requests, concurrency))
+                    if collector:
+                        stats = {name: stats.get(name, 0) + count for name, count in collector.stats.items()}
+                    microbatch.disable()
+            medians = {
+                mode: (statistics.median(r[0] for r in results), statistics.median(r[1] for r in results))
+                for mode, results in rounds.items()
+            }
+            for mode, (rps, cpu) in medians.items():
+                print(f"c={concurrency:<3} {mode:<3}  {rps:9.0f} req/s  {cpu:6.1f} us CPU/req", flush=True)
+            gain = medians['on'][0] / medians['off'][0] - 1
+            per_batch = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+            print(f"{'':<9} {gain:+.1%} req/s; {per_batch:.1f} requests per batch, {stats['inline']} scored "
+                  f"inline; {stats['batching_epochs']} batching and {stats['inline_epochs']} inline epochs",
+                  flush=True)
+    finally:
+        microbatch.disable()
+        if server:
+            server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Cost of the sampled profiling hook: the per-call price of profiling.sample()
+when the invocation is not sampled, the end-to-end latency of authenticated
+requests with profiling off, at a 1% sample rate and on every request, and
+what a sampled invocation costs.
+
+Usage: python -m aws.benchmarks.bench_profiling [--requests N] [--size N]
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile'))
+
+import jwt_validator  # noqa: E402
+import lambda_function  # noqa: E402
+import metrics  # noqa: E402
+import profiling  # noqa: E402
+
+from aws.benchmarks.bench_batch import make_measurements  # noqa: E402
+from aws.tools.local_jwks import SigningKey, id_token_claims, jwks_document  # noqa: E402
+
+POOL_ID = 'us-east-1_bench'
+CLIENT_ID = 'bench-client'
+ISSUER = f'https://cognito-idp.us-east-1.amazonaws.com/{POOL_ID}'
+
+
+def sample_ns(rate, number=200000):
+    profiling.PROFILE_SAMPLE_RATE = rate
+
+    def unsampled():
+        with profiling.sample('bench'):
+            pass
+
+    def bare():
+        pass
+
+    overhead = min(timeit.repeat(unsampled, number=number, repeat=5)) - min(timeit.repeat(bare, number=number, repeat=5))
+    return overhead / number * 1e9
+
+
+def request_latencies(event, rate, requests):
+    profiling.PROFILE_SAMPLE_RATE = rate
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        lambda_function.lambda_handler(dict(event), None)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profiling hook overhead benchmark')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    # Keep log and EMF output out of the measurements
+    logging.disable(logging.INFO)
+    metrics.METRICS_ENABLED = False
+    jwt_validator.COGNITO_REGION = 'us-east-1'
+    jwt_validator.COGNITO_USER_POOL_ID = POOL_ID
+    jwt_validator.COGNITO_CLIENT_ID = CLIENT_ID
+    key = SigningKey()
+    jwt_validator.set_jwks(jwks_document([key]))
+    token = key.sign(id_token_claims(ISSUER, CLIENT_ID))
+    event = {'headers': {'Authorization': f'Bearer {token}'},
+             'body': json.dumps({'measurements': make_measurements(args.size)})}
+    lambda_function.lambda_handler(dict(event), None)
+
+    print("profiling.sample() when not sampled")
+    # A tiny rate exercises the random draw without ever profiling
+    for label, rate in (('sampling off', 0.0), ('sampling on, not drawn', 1e-12)):
+        print(f"  {label:<23} {sample_ns(rate):7.1f} ns per call")
+
+    print(f"authenticated request, {args.size} measurements, {args.requests} requests")
+    for label, rate in (('profiling off', 0.0), ('1% sampled', 0.01), ('every request', 1.0)):
+        requests = args.requests if rate < 1 else max(args.requests // 20, 10)
+        median, p99 = request_latencies(event, rate, requests)
+        print(f"  {label:<14} median {median:8.3f} ms   p99 {p99:8.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
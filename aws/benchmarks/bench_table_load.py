@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Compare cold table load: pd.read_excel on the xlsx sources vs mapping the
+precompiled artifact.
+
+Usage: python -m aws.benchmarks.bench_table_load [--repeat N]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.insert(0, lambda_dir)
+
+import lms_tables  # noqa: E402
+
+XLSX = [
+    os.path.join(lambda_dir, 'data', 'weight', 'wfa-boys-zscore-expanded-tables.xlsx'),
+    os.path.join(lambda_dir, 'data', 'weight', 'wfa-girls-zscore-expanded-tables.xlsx'),
+]
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    print(f"{name:<24} median {statistics.median(samples):10.3f} ms   min {min(samples):10.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cold table load benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    report('pd.read_excel (2 tables)', measure(lambda: [pd.read_excel(p) for p in XLSX], args.repeat))
+    report('load_artifact (all)', measure(lms_tables.load_artifact, args.repeat * 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Benchmark and regression suite for the percentile and auth hot paths.
+
+Every benchmark reports the best time per operation over a few repeats (the
+least noisy estimate on a shared machine). Results are compared against the
+baselines in baselines.json; the run fails when a benchmark is slower than
+its baseline by more than the threshold (25% unless its baseline entry sets
+a "threshold"; --update-baseline keeps those). Times are normalized by a
+pure-Python calibration loop timed around each benchmark, so baselines
+carry over between machines and runs on a busy machine.
+
+Usage:
+  python -m aws.benchmarks.suite                    # run and compare
+  python -m aws.benchmarks.suite --update-baseline  # record new baselines
+  python -m aws.benchmarks.suite --only jwt --quick # a subset, few iterations
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.insert(0, lambda_dir)
+
+import cohort_rank  # noqa: E402
+import cohorts  # noqa: E402
+import indicators  # noqa: E402
+import jwt_validator  # noqa: E402
+import lambda_function  # noqa: E402
+import lms_tables  # noqa: E402
+import metrics  # noqa: E402
+import percentile_engine as engine  # noqa: E402
+from sketches import KLLSketch  # noqa: E402
+
+from aws.tools.local_jwks import SigningKey, id_token_claims, jwks_document  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+DEFAULT_THRESHOLD = 0.25
+
+POOL_ID = 'us-east-1_bench'
+CLIENT_ID = 'bench-client'
+ISSUER = f'https://cognito-idp.us-east-1.amazonaws.com/{POOL_ID}'
+
+# name -> (description, fn(quick) -> seconds per operation)
+BENCHMARKS = {}
+
+
+def benchmark(name, description):
+    def register(fn):
+        BENCHMARKS[name] = (description, fn)
+        return fn
+    return register
+
+
+def best_per_op(fn, number, repeat=5):
+    """Best time per call of fn() over repeat runs of number calls"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def calibrate(quick=False):
+    """Seconds for a fixed pure-Python workload, used to normalize across machines"""
+    def work():
+        total = 0
+        table = {}
+        for i in range(20000):
+            table[i % 97] = total
+            total += i * i % 7
+        return total
+    return best_per_op(work, 1 if quick else 3, repeat=2 if quick else 10)
+
+
+@contextmanager
+def patched(module, **values):
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def _ages(count, seed=0):
+    rng = random.Random(seed)
+    return [rng.randint(0, 1856) for _ in range(count)]
+
+
+@benchmark('import', 'import lambda_function in a fresh interpreter')
+def bench_import(quick):
+    code = (
+        'import sys, time; sys.path.insert(0, sys.argv[1]); start = time.perf_counter(); '
+        'import lambda_function; print(time.perf_counter() - start)'
+    )
+    env = {k: v for k, v in os.environ.items() if not k.startswith(('JWKS_', 'PROFILE_'))}
+    samples = [
+        float(subprocess.run([sys.executable, '-c', code, lambda_dir], env=env, check=True,
+                             capture_output=True, text=True).stdout)
+        for _ in range(2 if quick else 7)
+    ]
+    return min(samples)
+
+
+@benchmark('first_request', 'first lambda_handler call of a fresh interpreter warmed at init, 100 measurements')
+def bench_first_request(quick):
+    code = (
+        'import json, sys, time; sys.path.insert(0, sys.argv[1]); import lambda_function; '
+        "m = {'weight': 5.35, 'date_birth': '2025-03-25', 'date_measurement': '2025-06-22', 'sex': 'female'}; "
+        "event = {'body': json.dumps({'measurements': [m] * 100})}; start = time.perf_counter(); "
+        'lambda_function.lambda_handler.__wrapped__(event, None); print(time.perf_counter() - start)'
+    )
+    env = {k: v for k, v in os.environ.items() if not k.startswith(('JWKS_', 'PROFILE_'))}
+    env.update(WARMUP_ON_INIT='true', METRICS_ENABLED='false')
+    samples = [
+        float(subprocess.run([sys.executable, '-c', code, lambda_dir], env=env, check=True,
+                             capture_output=True, text=True).stdout.split()[-1])
+        for _ in range(2 if quick else 7)
+    ]
+    return min(samples)
+
+
+@benchmark('load_table_cold', 'map the table artifact and resolve a table')
+def bench_load_table_cold(quick):
+    def cold():
+        tables = lms_tables.load_artifact()
+        with patched(indicators, LMS_TABLES=tables, TABLES={}):
+            lambda_function.load_table('female')
+    return best_per_op(cold, 5 if quick else 100)
+
+
+@benchmark('load_table_warm', 'load_table for an already resolved table')
+def bench_load_table_warm(quick):
+    lambda_function.load_table('female')
+    return best_per_op(lambda: lambda_function.load_table('female'), 100 if quick else 20000)
+
+
+@benchmark('lms_lookup', 'LMS row lookup by age')
+def bench_lms_lookup(quick):
+    table = lambda_function.load_table('female')
+    ages = _ages(1000)
+    return best_per_op(lambda: [engine.lookup_lms(table, age) for age in ages], 1 if quick else 20) / len(ages)
+
+
+@benchmark('zscore_scalar', 'calculate_zscore + zscore_to_percentile, one value')
+def bench_zscore_scalar(quick):
+    L, M, S = engine.lookup_lms(lambda_function.load_table('female'), 89)
+
+    def one():
+        engine.zscore_to_percentile(engine.calculate_zscore(5.35, L, M, S))
+    return best_per_op(one, 100 if quick else 50000)
+
+
+@benchmark('score_batch_1000', 'vectorized score_batch, 1000 measurements (per batch)')
+def bench_score_batch(quick):
+    table = lambda_function.load_table('female')
+    ages = _ages(1000)
+    rng = random.Random(1)
+    values = [round(rng.uniform(2.0, 20.0), 3) for _ in ages]
+    tables = [table] * len(ages)
+    engine.score_batch(values, tables, ages)
+    return best_per_op(lambda: engine.score_batch(values, tables, ages), 1 if quick else 30)
+
+
+@benchmark('sketch_update', 'KLLSketch.update, one z-score into a full sketch')
+def bench_sketch_update(quick):
+    rng = random.Random(2)
+    values = [rng.gauss(0, 1) for _ in range(10000)]
+    sketch = KLLSketch(seed=0)
+    for value in values:
+        sketch.update(value)
+
+    def fill():
+        for value in values:
+            sketch.update(value)
+    return best_per_op(fill, 1 if quick else 5) / len(values)
+
+
+@benchmark('cohort_percentile', 'cohort percentile of a z-score from a stored cdf grid')
+def bench_cohort_percentile(quick):
+    rng = random.Random(3)
+    sketch = KLLSketch(seed=0)
+    for _ in range(100000 if not quick else 5000):
+        sketch.update(rng.gauss(0, 1))
+    cohort = dict(cohorts.empty_cohort('wfa#female#7'), added=sketch)
+    grid = cohorts.unpack_cdf(cohorts.pack_cdf(cohorts.cdf(cohort)))
+    zscores = [rng.uniform(-3, 3) for _ in range(1000)]
+    return best_per_op(lambda: [cohort_rank.cohort_percentile(grid, z) for z in zscores],
+                       1 if quick else 20) / len(zscores)
+
+
+@contextmanager
+def _auth():
+    key = SigningKey()
+    with patched(jwt_validator, COGNITO_REGION='us-east-1', COGNITO_USER_POOL_ID=POOL_ID,
+                 COGNITO_CLIENT_ID=CLIENT_ID), patched(metrics, METRICS_ENABLED=False):
+        jwt_validator.set_jwks(jwks_document([key, SigningKey()]))
+        jwt_validator.clear_token_cache()
+        try:
+            yield key.sign(id_token_claims(ISSUER, CLIENT_ID))
+        finally:
+            jwt_validator.clear_token_cache()
+
+
+@benchmark('jwt_verify', 'validate_jwt_token, RS256 signature verified')
+def bench_jwt_verify(quick):
+    with _auth() as token, patched(jwt_validator, TOKEN_CACHE_SIZE=0):
+        return best_per_op(lambda: jwt_validator.validate_jwt_token(token), 10 if quick else 500)
+
+
+@benchmark('jwt_cached', 'validate_jwt_token, verified token cache hit')
+def bench_jwt_cached(quick):
+    with _auth() as token:
+        jwt_validator.validate_jwt_token(token)
+        return best_per_op(lambda: jwt_validator.validate_jwt_token(token), 100 if quick else 20000)
+
+
+@benchmark('auth_authorizer', 'require_jwt_auth in authorizer mode, claims from requestContext')
+def bench_auth_authorizer(quick):
+    claims = {k: str(v) for k, v in id_token_claims(ISSUER, CLIENT_ID).items()}
+    event = {'headers': {}, 'requestContext': {'authorizer': {'claims': claims}}}
+    handler = jwt_validator.require_jwt_auth(lambda event, context: {'statusCode': 200})
+    with _auth(), patched(jwt_validator, AUTH_MODE='authorizer'):
+        assert handler(dict(event), None)['statusCode'] == 200
+        return best_per_op(lambda: handler(dict(event), None), 100 if quick else 20000)
+
+
+def _handler_benchmark(size, quick, number):
+    measurement = {'weight': 5.35, 'date_birth': '2025-03-25', 'date_measurement': '2025-06-22', 'sex': 'female'}
+    body = measurement if size == 1 else {'measurements': [measurement] * size}
+    with _auth() as token:
+        event = {'headers': {'Authorization': f'Bearer {token}'}, 'body': json.dumps(body)}
+        lambda_function.lambda_handler(dict(event), None)
+        return best_per_op(lambda: lambda_function.lambda_handler(dict(event), None), 10 if quick else number)
+
+
+@benchmark('handler_single', 'lambda_handler end to end, one measurement, authenticated')
+def bench_handler_single(quick):
+    return _handler_benchmark(1, quick, 2000)
+
+
+@benchmark('handler_batch_100', 'lambda_handler end to end, 100 measurements, authenticated')
+def bench_handler_batch(quick):
+    return _handler_benchmark(100, quick, 300)
+
+
+def run(names=None, quick=False):
+    """
+    Run the selected benchmarks. Returns {name: (seconds per op, calibration
+    seconds)}, each benchmark calibrated right before and after it runs, as
+    the speed of a shared machine drifts over a run.
+    """
+    logging.disable(logging.INFO)
+    try:
+        results = {}
+        for name, (_, fn) in BENCHMARKS.items():
+            if names and not any(part in name for part in names):
+                continue
+            before = calibrate(quick)
+            seconds = fn(quick)
+            results[name] = seconds, (before + calibrate(quick)) / 2
+        return results
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH, previous=None):
+    """Record results, keeping the thresholds (and other benchmarks) of the previous baseline"""
+    benchmarks = dict((previous or {}).get('benchmarks', {}))
+    for name, (seconds, calibration) in results.items():
+        entry = dict(benchmarks.get(name, {}))
+        entry['us'] = round(seconds * 1e6, 3)
+        entry['calibration_us'] = round(calibration * 1e6, 3)
+        benchmarks[name] = entry
+    baseline = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'benchmarks': dict(sorted(benchmarks.items())),
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+        f.write('\n')
+    return baseline
+
+
+def compare(results, baseline, threshold=None):
+    """
+    Rows of (name, current us, expected us, ratio, regressed) where expected
+    is the baseline scaled by the calibration of both runs.
+    """
+    rows = []
+    for name, (seconds, calibration) in results.items():
+        entry = baseline['benchmarks'].get(name)
+        if entry is None:
+            rows.append((name, seconds * 1e6, None, None, False))
+            continue
+        expected = entry['us'] * calibration * 1e6 / entry['calibration_us']
+        ratio = seconds * 1e6 / expected
+        limit = entry.get('threshold', DEFAULT_THRESHOLD if threshold is None else threshold)
+        rows.append((name, seconds * 1e6, expected, ratio, ratio > 1 + limit))
+    return rows
+
+
+def format_rows(rows):
+    lines = [f"{'benchmark':<20} {'current':>12} {'baseline':>12} {'ratio':>7}"]
+    for name, current, expected, ratio, regressed in rows:
+        if expected is None:
+            lines.append(f"{name:<20} {current:>9.2f} us {'(new)':>12}")
+            continue
+        flag = '  REGRESSION' if regressed else ''
+        lines.append(f"{name:<20} {current:>9.2f} us {expected:>9.2f} us {ratio:>6.2f}x{flag}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Percentile and auth benchmark suite')
+    parser.add_argument('--only', nargs='*', help='run benchmarks whose name contains one of these')
+    parser.add_argument('--quick', action='store_true', help='few iterations (smoke test, not for baselines)')
+    parser.add_argument('--update-baseline', action='store_true', help=f'record results in {BASELINE_PATH}')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, help=f'allowed slowdown (default {DEFAULT_THRESHOLD})')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, (description, _) in BENCHMARKS.items():
+            print(f"{name:<20} {description}")
+        return 0
+
+    results = run(args.only, args.quick)
+    baseline = load_baseline(args.baseline)
+    if args.update_baseline:
+        save_baseline(results, args.baseline, baseline)
+        print(f"Baselines written to {args.baseline}")
+        baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(format_rows([(name, seconds * 1e6, None, None, False) for name, (seconds, _) in results.items()]))
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one")
+        return 0
+
+    rows = compare(results, baseline, args.threshold)
+    print(format_rows(rows))
+    regressed = [row[0] for row in rows if row[4]]
+    if regressed:
+        print(f"Regressed beyond threshold: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
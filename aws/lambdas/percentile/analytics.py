@@ -0,0 +1,307 @@
+"""
+Growth velocity and centile-crossing analytics over a baby's measurement series.
+
+POST /percentile/analytics scores a series of measurements of one
+age-indexed indicator in one batch and derives, for each interval between
+consecutive measurements:
+  velocity          z-score change per month
+  conditionalGain   z-score gain conditional on the starting z-score
+                    (Cole 1995), (z2 - r z1) / sqrt(1 - r^2), with the
+                    correlation r between the two ages approximated as
+                    exp(-months / CORRELATION_MONTHS)
+and the crossings of the major centile lines (0.4, 2, 9, 25, 50, 75, 91, 98,
+99.6, two thirds of a z-score apart). The summary flags a drop of two or more
+centile spaces from the highest channel reached.
+
+Request body:
+  sex, date_birth     as for /upnest-percentile
+  indicator           wfa (default), lhfa, hcfa or bfa
+  unit                unit of the values (default: the table unit)
+  series              [{date, value}, ...] (GrowthData rows with
+                      measurementDate also work), in any order
+  state               optional: the "state" of a previous response
+
+The response carries a compact "state". Sending it back with only the new
+measurements appends them without resending or rescoring the history: the
+response then holds the new points and intervals and the same summary a full
+recomputation would give.
+"""
+
+import logging
+import math
+import os
+
+import encoding
+import metrics
+import warmup
+from jwt_validator import require_jwt_auth
+from indicators import INDICATORS, MEASUREMENT_DECIMALS, get_table
+from lambda_function import json_response
+from percentile_engine import VECTORIZE_MIN_BATCH, _numpy, age_in_days, parse_date, score_batch_cached
+from stream_handler import reference_value
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+MAX_SERIES_POINTS = int(os.environ.get('MAX_SERIES_POINTS', '1000'))
+
+# Decay of the correlation between z-scores with the interval, in months
+CORRELATION_MONTHS = float(os.environ.get('CORRELATION_MONTHS', '10'))
+
+# Intervals shorter than this have no meaningful conditional gain (r is close to 1)
+MIN_GAIN_DAYS = 14
+
+DAYS_PER_MONTH = 30.4375
+
+# Major centile lines of the UK-WHO charts, at z = k * 2/3 for k = -4..4
+MAJOR_CENTILES = (0.4, 2, 9, 25, 50, 75, 91, 98, 99.6)
+CHANNEL_WIDTH = 2 / 3
+
+# Falling this many centile spaces from the peak channel is flagged
+FALTERING_SPACES = 2
+
+STATE_VERSION = 1
+
+DECIMALS = 4
+
+
+def channel(z):
+    """Centile space of a z-score: the number of major lines at or below it, minus 5 (-5..4)"""
+    return max(-5, min(4, math.floor(z / CHANNEL_WIDTH + 1e-9)))
+
+
+def crossed_lines(start, end):
+    """Major centiles crossed moving from channel start to channel end, in crossing order"""
+    if end > start:
+        return [MAJOR_CENTILES[k + 4] for k in range(start + 1, end + 1)]
+    return [MAJOR_CENTILES[k + 4] for k in range(start, end, -1)]
+
+
+def conditional_gain(z_from, z_to, months):
+    """z_to adjusted for regression to the mean from z_from, months earlier"""
+    r = math.exp(-months / CORRELATION_MONTHS)
+    return (z_to - r * z_from) / math.sqrt(1 - r * r)
+
+
+def interval_metrics(ages, zscores):
+    """
+    Velocity (z per month) and conditional gain for every pair of consecutive
+    points, as two lists of len(ages) - 1 (gain is None for short intervals).
+    """
+    n = len(ages) - 1
+    if n <= 0:
+        return [], []
+    np = _numpy() if n >= VECTORIZE_MIN_BATCH else None
+    if np is None:
+        velocities, gains = [], []
+        for i in range(n):
+            months = (ages[i + 1] - ages[i]) / DAYS_PER_MONTH
+            velocities.append((zscores[i + 1] - zscores[i]) / months)
+            gains.append(conditional_gain(zscores[i], zscores[i + 1], months)
+                         if ages[i + 1] - ages[i] >= MIN_GAIN_DAYS else None)
+        return velocities, gains
+
+    ages = np.asarray(ages, dtype=np.float64)
+    z = np.asarray(zscores, dtype=np.float64)
+    days = np.diff(ages)
+    months = days / DAYS_PER_MONTH
+    velocities = np.diff(z) / months
+    r = np.exp(-months / CORRELATION_MONTHS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gains = (z[1:] - r * z[:-1]) / np.sqrt(1 - r * r)
+    gains = [g if d >= MIN_GAIN_DAYS else None for g, d in zip(gains.tolist(), days.tolist())]
+    return velocities.tolist(), gains
+
+
+def _round(value):
+    return None if value is None else round(value, DECIMALS)
+
+
+def parse_analytics_request(body):
+    """Validate the request; returns (code, sex, date_birth, points, state) with points sorted by date"""
+    code = body.get('indicator') or 'wfa'
+    if code not in INDICATORS or INDICATORS[code].index != 'age':
+        age_codes = [c for c, indicator in INDICATORS.items() if indicator.index == 'age']
+        raise ValueError(f"Indicator must be one of {', '.join(age_codes)}")
+    sex = body.get('sex')
+    if sex not in ("male", "female"):
+        raise ValueError("Sex must be 'male' or 'female'")
+    date_birth = body.get('date_birth')
+    if not date_birth:
+        raise ValueError("Missing required field: date_birth")
+    parse_date(date_birth)
+
+    series = body.get('series')
+    if not isinstance(series, list):
+        raise ValueError("'series' must be an array")
+    if len(series) > MAX_SERIES_POINTS:
+        raise ValueError(f"Series exceeds {MAX_SERIES_POINTS} measurements")
+
+    measurement = INDICATORS[code].measurement
+    unit = body.get('unit')
+    by_date = {}
+    for i, point in enumerate(series):
+        if not isinstance(point, dict):
+            raise ValueError(f"Measurement {i} must be an object")
+        date = point.get('date') or point.get('measurementDate')
+        if not date:
+            raise ValueError(f"Measurement {i} has no date")
+        try:
+            value = reference_value(measurement, point.get('value'), point.get('unit') or unit)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Measurement {i}: {str(e)}")
+        age_days = age_in_days(date_birth, date)
+        if age_days < 0:
+            raise ValueError(f"Measurement {i} is dated before birth")
+        # A later entry for the same day replaces the earlier one
+        by_date[age_days] = (age_days, date, round(value, MEASUREMENT_DECIMALS[measurement]))
+    points = [by_date[age] for age in sorted(by_date)]
+
+    state = body.get('state')
+    if state is not None:
+        check_state(state, code, sex, date_birth)
+        if points and points[0][0] <= state['last']['ageDays']:
+            raise ValueError("New measurements must be later than the state; send the full series instead")
+    elif not points:
+        raise ValueError("'series' must not be empty")
+    return code, sex, date_birth, points, state
+
+
+def check_state(state, code, sex, date_birth):
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+        raise ValueError("Unsupported analytics state, send the full series instead")
+    if (state.get('indicator'), state.get('sex'), state.get('date_birth')) != (code, sex, date_birth):
+        raise ValueError("The state belongs to another indicator, sex or date of birth")
+    try:
+        for point in (state['first'], state['last']):
+            float(point['ageDays']), float(point['zscore']), int(point['channel'])
+        int(state['count']), int(state['peakChannel'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Malformed analytics state")
+
+
+def analyze(code, sex, date_birth, points, state=None):
+    """
+    Analytics payload for sorted (age_days, date, value) points, appended
+    after state when given.
+    """
+    table = get_table(code, sex)
+    if table is None:
+        raise ValueError(f"{INDICATORS[code].name} reference table is not available")
+    with metrics.phase('ScoreTime'):
+        scored, _ = score_batch_cached([p[2] for p in points], [table] * len(points), [p[0] for p in points])
+
+    ages = [p[0] for p in points]
+    zscores = [z for z, _, _ in scored]
+    channels = [channel(z) for z in zscores]
+    previous = state['last'] if state else None
+    if previous is not None:
+        ages = [previous['ageDays']] + ages
+        zscores = [previous['zscore']] + zscores
+        channels = [previous['channel']] + channels
+    velocities, gains = interval_metrics(ages, zscores)
+
+    dates = ([previous['date']] if previous else []) + [p[1] for p in points]
+    offset = 1 if previous else 0
+    intervals = []
+    crossings = []
+    for i, (velocity, gain) in enumerate(zip(velocities, gains)):
+        intervals.append({
+            "from": dates[i],
+            "to": dates[i + 1],
+            "days": ages[i + 1] - ages[i],
+            "velocity": _round(velocity),
+            "conditionalGain": _round(gain),
+        })
+        if channels[i + 1] != channels[i]:
+            lines = crossed_lines(channels[i], channels[i + 1])
+            crossings.append({
+                "date": dates[i + 1],
+                "direction": "up" if channels[i + 1] > channels[i] else "down",
+                "lines": len(lines),
+                "centiles": lines,
+            })
+
+    new_state = _next_state(code, sex, date_birth, state, points, scored, channels[offset:])
+    return {
+        "indicator": code,
+        "name": INDICATORS[code].name,
+        "sex": sex,
+        "unit": INDICATORS[code].unit,
+        "points": [
+            {
+                "date": date,
+                "ageDays": age,
+                "value": value,
+                "zscore": zscore,
+                "percentile": round(percentile, 2),
+                "channel": point_channel,
+            }
+            for (age, date, value), (zscore, percentile, _), point_channel in zip(points, scored, channels[offset:])
+        ],
+        "intervals": intervals,
+        "crossings": crossings,
+        "summary": summarize(new_state),
+        "state": new_state,
+        "success": True
+    }
+
+
+def _next_state(code, sex, date_birth, state, points, scored, channels):
+    """The state after appending the scored points"""
+    state = dict(state) if state else {
+        "version": STATE_VERSION,
+        "indicator": code,
+        "sex": sex,
+        "date_birth": date_birth,
+        "count": 0,
+        "first": None,
+        "last": None,
+        "peakChannel": -5,
+    }
+    for (age, date, _), (zscore, percentile, _), point_channel in zip(points, scored, channels):
+        point = {"date": date, "ageDays": age, "zscore": zscore, "percentile": round(percentile, 2),
+                 "channel": point_channel}
+        if state["first"] is None:
+            state["first"] = point
+        state["last"] = point
+        state["count"] += 1
+        state["peakChannel"] = max(state["peakChannel"], point_channel)
+    return state
+
+
+def summarize(state):
+    """Whole-series summary, computed from the state alone"""
+    first, last = state["first"], state["last"]
+    days = last["ageDays"] - first["ageDays"]
+    spaces = state["peakChannel"] - last["channel"]
+    return {
+        "count": state["count"],
+        "first": first["date"],
+        "latest": {key: last[key] for key in ("date", "zscore", "percentile")},
+        "velocity": _round((last["zscore"] - first["zscore"]) / (days / DAYS_PER_MONTH)) if days else None,
+        "spacesBelowPeak": spaces,
+        "faltering": spaces >= FALTERING_SPACES,
+    }
+
+
+@require_jwt_auth
+def lambda_handler(event, context):
+    """Lambda handler for growth analytics over a measurement series (see module docstring)"""
+    try:
+        if isinstance(event.get("body"), str):
+            with metrics.phase('ParseTime'):
+                body = encoding.request_body(event)
+        else:
+            body = event
+        code, sex, date_birth, points, state = parse_analytics_request(body)
+        metrics.count('SeriesLength', len(points))
+        with metrics.phase('AnalyticsTime'):
+            payload = analyze(code, sex, date_birth, points, state)
+        payload["user_id"] = event.get('user', {}).get('sub')
+        return json_response(200, payload)
+    except Exception as e:
+        return json_response(400, {"error": str(e), "success": False})
+
+
+warmup.warm_on_init()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Build step: compile every WHO LMS table under data/ into data/lms_tables.bin.
+
+Run after adding or updating a table, before `sam build`:
+    python build_tables.py          # (re)write the artifact
+    python build_tables.py --check  # exit 1 if the artifact is stale
+    python build_tables.py --standard fenton  # data/fenton/ -> data/packs/fenton.bin
+
+Source files follow the WHO naming scheme
+<indicator>-<boys|girls>-zscore-expanded-table[s].xlsx; the first column is the
+index (Day, Length or Height) and L, M, S are read by name. The indicator
+prefix (wfa, lhfa, hcfa, bfa, wfl, wfh) is the code used by indicators.py.
+pandas and openpyxl are only needed here, not at runtime.
+
+The other reference standards (see references.py) are built one pack at a
+time from data/<code>/, where each source is named
+<indicator>-<boys|girls>[-anything].<xlsx|csv> (the aliases in
+lms_tables.INDICATOR_ALIASES are accepted, e.g. hfa for lhfa). CSV sources have the index in
+their first column, in the standard's unit, and L, M, S columns by name.
+"""
+
+import argparse
+import os
+import sys
+
+from lms_tables import (
+    ARTIFACT_PATH, find_pack_sources, find_sources, pack_path, pack_tables, read_source_table, read_xlsx_table
+)
+from references import DEFAULT_STANDARD, STANDARDS
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def compile_tables(root=data_dir):
+    """Return the artifact bytes for every source table under root"""
+    tables = [read_xlsx_table(*source) for source in find_sources(root)]
+    if not tables:
+        raise ValueError(f"No WHO tables found under {root}")
+    return pack_tables(tables)
+
+
+def compile_pack(root):
+    """Return the pack bytes for every pack source table under root"""
+    tables = [read_source_table(*source) for source in find_pack_sources(root)]
+    if not tables:
+        raise ValueError(f"No source tables found under {root}")
+    return pack_tables(tables)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--data-dir')
+    parser.add_argument('--output')
+    parser.add_argument('--standard', default=DEFAULT_STANDARD, choices=list(STANDARDS),
+                        help='reference standard to build (default: the WHO 0-5 artifact)')
+    parser.add_argument('--check', action='store_true', help='only verify the artifact is up to date')
+    args = parser.parse_args(argv)
+
+    if args.standard == DEFAULT_STANDARD:
+        args.output = args.output or ARTIFACT_PATH
+        artifact = compile_tables(args.data_dir or data_dir)
+    else:
+        args.output = args.output or pack_path(args.standard)
+        artifact = compile_pack(args.data_dir or os.path.join(data_dir, args.standard))
+    if args.check:
+        try:
+            with open(args.output, 'rb') as f:
+                current = f.read()
+        except OSError:
+            current = None
+        if current != artifact:
+            print(f"{args.output} is stale, run build_tables.py", file=sys.stderr)
+            return 1
+        print(f"{args.output} is up to date")
+        return 0
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'wb') as f:
+        f.write(artifact)
+    print(f"Wrote {args.output} ({len(artifact)} bytes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,419 @@
+"""
+Bulk import of historical measurements from CSV or JSONL uploads.
+
+POST /percentile/import?babyId=... with a CSV (text/csv) or JSONL
+(application/x-ndjson) body, optionally gzipped (Content-Encoding: gzip and
+Content-Type application/gzip, a binary media type of the API), imports the
+rows into GrowthData for one of the caller's babies. Rows are either one
+measurement each (measurementDate, measurementType, value, unit) or one date
+with a column per measurement, as pediatrician portals and smart scales
+export them (date, "Weight (kg)", height, head_circumference, ...). A unit
+in a column header, in brackets or after an underscore (weight_g), or in a
+<type>_unit column applies to that column; without one, values are in the
+unit of the WHO tables (kg, cm), which is stored with them.
+
+The upload is read as a stream of rows and handled IMPORT_CHUNK_SIZE rows at
+a time: validated, scored in one vectorized pass (stream_handler.score_items),
+checked against the baby's existing measurements (read once from
+BabyGrowthIndex) and written with batched PartiQL INSERTs. The request body
+is decoded (base64, gzip) as the rows are read, so besides the body Lambda
+hands over, working memory is one chunk, the keys of the baby's measurements
+and the report, which lists at most IMPORT_REPORT_MAX_ROWS rows.
+aws/tools/import_growth.py runs the same import on files of any size and
+writes the report of every row as it goes.
+
+Writes are idempotent: a measurement's dataId is derived from the baby, type,
+date and value, and INSERT refuses an existing key, so an upload that is sent
+again (or a retried write that had in fact succeeded) never duplicates data.
+Throttled or failed writes are retried with exponential backoff.
+
+The response counts the measurements of each status (imported, duplicate,
+invalid or failed) and lists the rows that need attention: those not
+imported, with the error, and imported ones that could not be scored (e.g.
+past the age range of the WHO standard), with the reason as a warning.
+Imported measurements are read back through the history endpoint.
+"""
+
+import base64
+import csv
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import re
+import time
+from datetime import date, datetime, timezone
+
+import dynamo
+import encoding
+import metrics
+import warmup
+from history import NotFound, load_baby
+from indicators import MEASUREMENT_DECIMALS
+from jwt_validator import require_jwt_auth
+from lambda_function import encoded_response, json_response
+from percentile_engine import parse_date
+from stream_handler import MEASUREMENT_INDICATORS, REFERENCE_UNITS, UNIT_SCALES, reference_value, score_items
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '500'))
+IMPORT_MAX_ATTEMPTS = int(os.environ.get('IMPORT_MAX_ATTEMPTS', '5'))
+# Rows listed in the response; the counts cover every row
+IMPORT_REPORT_MAX_ROWS = int(os.environ.get('IMPORT_REPORT_MAX_ROWS', '1000'))
+
+# Characters of the request body decoded at a time (a multiple of 4, for base64)
+BODY_BLOCK_SIZE = 64 * 1024
+
+# Write errors worth retrying (RequestFailed: the whole batch was rejected)
+RETRYABLE_ERRORS = ('RequestFailed', 'ThrottlingError', 'ThrottlingException',
+                    'ProvisionedThroughputExceeded', 'RequestLimitExceeded', 'InternalServerError')
+
+STATUSES = ('imported', 'duplicate', 'invalid', 'failed')
+
+# Column names (lowercased, spaces and dashes as underscores) of each field
+FIELD_ALIASES = {
+    'measurementDate': ('measurementdate', 'measurement_date', 'date', 'date_measurement', 'measured_at',
+                        'datetime', 'timestamp'),
+    'measurementType': ('measurementtype', 'measurement_type', 'type'),
+    'value': ('value',),
+    'unit': ('unit',),
+    'notes': ('notes', 'note', 'comment'),
+}
+TYPE_ALIASES = {
+    'weight': ('weight',),
+    'height': ('height', 'length'),
+    'head_circumference': ('head_circumference', 'headcircumference', 'head', 'hc'),
+    'bmi': ('bmi',),
+}
+FIELDS = {alias: field for field, aliases in FIELD_ALIASES.items() for alias in aliases}
+TYPES = {alias: name for name, aliases in TYPE_ALIASES.items() for alias in aliases}
+
+# "Weight (kg)", "weight [g]", "weight_g"
+HEADER_PATTERN = re.compile(r'^(?P<name>.*?)\s*(?:\((?P<paren>[^)]*)\)|\[(?P<bracket>[^\]]*)\])?\s*$')
+
+
+def _normalize(name):
+    return re.sub(r'[\s\-]+', '_', name.strip().lower())
+
+
+def parse_header(name):
+    """(field or measurement type, unit or None) of a column name; field None when not recognized"""
+    match = HEADER_PATTERN.match(name or '')
+    base = _normalize(match['name'])
+    unit = match['paren'] or match['bracket']
+    if base in FIELDS:
+        return FIELDS[base], None
+    if base in TYPES:
+        return TYPES[base], unit.strip() if unit else None
+    head, _, suffix = base.rpartition('_')
+    if head in TYPES:
+        if suffix == 'unit':
+            return f'{TYPES[head]}_unit', None
+        if suffix in UNIT_SCALES[TYPES[head]]:
+            return TYPES[head], suffix
+    return None, None
+
+
+def column_map(names):
+    """{column name: (field, unit)} for the columns that are recognized"""
+    columns = {}
+    for name in names:
+        field, unit = parse_header(name)
+        if field is not None:
+            columns[name] = (field, unit)
+    return columns
+
+
+def read_rows(stream, content_type=''):
+    """
+    Yield (row number, {column: value}) from a binary stream of CSV or
+    JSONL, chosen by content_type or else by the first character.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    first = text.read(1)
+    lines = itertools.chain([first + text.readline()], text) if first else iter(())
+    content_type = content_type.split(';')[0].strip().lower()
+    if content_type in ('application/x-ndjson', 'application/jsonl', 'application/json') or \
+            (not content_type.endswith('csv') and first == '{'):
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                yield number, None
+                continue
+            if isinstance(row, dict) and isinstance(row.get('Item'), dict):
+                row = dynamo.load_item(row['Item'])
+            yield number, row if isinstance(row, dict) else None
+        return
+    # Row numbers count the header as row 1, as spreadsheets show them
+    for number, row in enumerate(csv.DictReader(lines), 2):
+        yield number, row
+
+
+def measurements(row, columns=None):
+    """
+    The measurements of one input row: (measurementType, date, value, unit,
+    notes) tuples, as found (validated by validate()).
+    """
+    columns = columns if columns is not None else column_map(row)
+    fields = {}
+    wide = []
+    units = {}
+    for name, value in row.items():
+        if name not in columns or value is None or value == '':
+            continue
+        field, unit = columns[name]
+        if field in MEASUREMENT_INDICATORS:
+            wide.append((field, value, unit))
+        elif field.endswith('_unit'):
+            units[field[:-len('_unit')]] = value
+        else:
+            fields[field] = value
+    notes = fields.get('notes')
+    found = [(t, fields.get('measurementDate'), value, units.get(t, unit), notes) for t, value, unit in wide]
+    if 'measurementType' in fields or 'value' in fields or not found:
+        measurement_type = fields.get('measurementType')
+        measurement_type = TYPES.get(_normalize(measurement_type), measurement_type) \
+            if isinstance(measurement_type, str) else measurement_type
+        found.append((measurement_type, fields.get('measurementDate'), fields.get('value'), fields.get('unit'), notes))
+    return found
+
+
+def validate(baby, measurement, today=None):
+    """The GrowthData item of a measurement, or a ValueError with the reason it cannot be imported"""
+    measurement_type, measured_on, value, unit, notes = measurement
+    if measurement_type not in MEASUREMENT_INDICATORS:
+        raise ValueError(f"measurementType must be one of {', '.join(MEASUREMENT_INDICATORS)}")
+    if not measured_on:
+        raise ValueError("Missing measurement date")
+    measured_on = parse_date(str(measured_on).strip().replace('Z', '+00:00')).date()
+    if measured_on < parse_date(baby['dateOfBirth']).date():
+        raise ValueError("Measurement is dated before birth")
+    if measured_on > (today or date.today()):
+        raise ValueError("Measurement is dated in the future")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{measurement_type} must be a number")
+    # Without a unit the value is in the unit of the WHO tables, stored explicitly as the app does
+    unit = unit.strip() if isinstance(unit, str) and unit.strip() else REFERENCE_UNITS[measurement_type]
+    reference_value(measurement_type, number, unit)
+    item = {
+        'babyId': baby['babyId'],
+        'measurementType': measurement_type,
+        'measurementDate': measured_on.isoformat(),
+        'value': int(number) if number.is_integer() else number,
+        'unit': unit,
+    }
+    if notes:
+        item['notes'] = str(notes)
+    return item
+
+
+def dedup_key(item):
+    """Same measurement type, date and value (in the WHO unit): the same measurement"""
+    try:
+        value = reference_value(item['measurementType'], item.get('value'), item.get('unit'))
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (item['measurementType'], str(item.get('measurementDate', ''))[:10],
+            round(value, MEASUREMENT_DECIMALS[item['measurementType']]))
+
+
+def data_id(item):
+    """Deterministic dataId, so writing the same measurement twice is refused by INSERT"""
+    digest = hashlib.sha256(repr((item['babyId'], *dedup_key(item))).encode()).hexdigest()
+    return f'import-{digest[:24]}'
+
+
+def existing_keys(baby_id):
+    """Dedup keys of the baby's stored measurements"""
+    items = dynamo.query(dynamo.GROWTH_TABLE_NAME, 'babyId', baby_id, index_name=dynamo.BABY_GROWTH_INDEX,
+                         attributes=('measurementType', 'measurementDate', 'value', 'unit'))
+    return {key for key in map(dedup_key, items) if key is not None}
+
+
+def insert_statement(item):
+    """(statement, parameters) inserting item unless its dataId exists"""
+    names = list(item)
+    fields = ', '.join(f"'{name}': ?" for name in names)
+    return f'INSERT INTO "{dynamo.GROWTH_TABLE_NAME}" VALUE {{{fields}}}', [item[name] for name in names]
+
+
+def write_items(items):
+    """
+    Insert items with BatchExecuteStatement, retrying retryable errors with
+    exponential backoff. Returns one status per item: 'imported',
+    'duplicate' or the error dict of a write that kept failing.
+    """
+    statuses = [None] * len(items)
+    pending = list(range(len(items)))
+    for attempt in range(IMPORT_MAX_ATTEMPTS):
+        if not pending:
+            break
+        if attempt:
+            time.sleep(min(dynamo.RETRY_BASE_DELAY * 2 ** attempt, 2.0))
+        errors = dynamo.batch_execute([insert_statement(items[i]) for i in pending])
+        retry = []
+        for i, error in zip(pending, errors):
+            if error is None:
+                statuses[i] = 'imported'
+            elif error.get('Code') == 'DuplicateItem':
+                # On a retry, the earlier attempt may have written it after all
+                statuses[i] = 'imported' if attempt else 'duplicate'
+            else:
+                statuses[i] = error
+                if error.get('Code') in RETRYABLE_ERRORS:
+                    retry.append(i)
+        pending = retry
+    return statuses
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def import_chunk(baby, user_id, chunk, seen, today=None):
+    """Import the measurements of a chunk of (row number, row) pairs; returns their report entries"""
+    entries = []
+    pending = []
+    columns = {}
+    for number, row in chunk:
+        if row is None:
+            entries.append({'row': number, 'status': 'invalid', 'error': 'Row is not a JSON object'})
+            continue
+        names = tuple(row)
+        if names not in columns:
+            columns[names] = column_map(names)
+        for measurement in measurements(row, columns[names]):
+            entry = {'row': number, 'measurementType': measurement[0]}
+            entries.append(entry)
+            try:
+                item = validate(baby, measurement, today)
+            except ValueError as e:
+                entry.update(status='invalid', error=str(e))
+                continue
+            key = dedup_key(item)
+            if key in seen:
+                entry.update(status='duplicate', dataId=data_id(item))
+                continue
+            seen.add(key)
+            pending.append((entry, item))
+
+    scored = score_items([(item, baby) for _, item in pending])
+    now = _now()
+    items = []
+    for (entry, item), (percentile, zscore, error) in zip(pending, scored):
+        item = dict(item, dataId=data_id(item), userId=user_id, source='import', createdAt=now, updatedAt=now)
+        entry['dataId'] = item['dataId']
+        if error is None:
+            item.update(percentile=percentile, zscore=zscore)
+            entry.update(percentile=percentile, zscore=zscore)
+        else:
+            entry['warning'] = error
+        items.append(item)
+
+    for (entry, item), status in zip(pending, write_items(items)):
+        if isinstance(status, dict):
+            logger.warning(f"Import of {data_id(item)} failed: {status.get('Code')} {status.get('Message')}")
+            entry.update(status='failed', error=status.get('Message') or status.get('Code'))
+        else:
+            entry['status'] = status
+    return entries
+
+
+def import_rows(baby, user_id, rows, chunk_size=None, today=None):
+    """
+    Import (row number, row) pairs for baby, reading and writing a chunk at
+    a time. Yields the report entry of each measurement, in input order.
+    """
+    seen = existing_keys(baby['babyId'])
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield from import_chunk(baby, user_id, chunk, seen, today)
+
+
+class BodyStream(io.RawIOBase):
+    """Binary stream over a request body string, decoded BODY_BLOCK_SIZE characters at a time"""
+
+    def __init__(self, body, base64_encoded=False):
+        self._body = body
+        self._decode = base64.b64decode if base64_encoded else str.encode
+        self._position = 0
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and self._position < len(self._body):
+            block = self._body[self._position:self._position + BODY_BLOCK_SIZE]
+            self._position += BODY_BLOCK_SIZE
+            self._pending = self._decode(block)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def request_stream(event):
+    """The upload as a binary stream (base64-decoded and gunzipped as it is read)"""
+    body = event.get('body')
+    if not isinstance(body, str) or not body:
+        raise ValueError("Missing upload: send CSV or JSONL rows as the request body")
+    stream = io.BufferedReader(BodyStream(body, bool(event.get('isBase64Encoded'))))
+    if encoding.header(event, 'content-encoding').lower() == 'gzip':
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+@require_jwt_auth
+def lambda_handler(event, context):
+    """Lambda handler importing an upload of measurements (see module docstring)"""
+    params = event.get('queryStringParameters') or {}
+    try:
+        baby_id = (params.get('babyId') or '').strip()
+        if not baby_id:
+            raise ValueError("Missing required parameter: babyId")
+        name, use_gzip = encoding.negotiate(event)
+        user_id = event.get('user', {}).get('sub')
+        with metrics.phase('LoadTime'):
+            baby = load_baby(baby_id, user_id)
+        rows = read_rows(request_stream(event), encoding.header(event, 'content-type'))
+        counts = dict.fromkeys(STATUSES, 0)
+        report = []
+        omitted = 0
+        with metrics.phase('ImportTime'):
+            for entry in import_rows(baby, user_id, rows):
+                counts[entry['status']] += 1
+                if entry['status'] == 'imported' and 'warning' not in entry:
+                    continue
+                if len(report) < IMPORT_REPORT_MAX_ROWS:
+                    report.append(entry)
+                else:
+                    omitted += 1
+        for status, count in counts.items():
+            metrics.count(status.capitalize(), count)
+        payload = {"babyId": baby_id, "counts": counts, "rows": report, "omitted": omitted, "success": True}
+        return encoded_response(200, payload, name, use_gzip, rows_key='rows')
+    except NotFound as e:
+        return json_response(404, {"error": str(e), "success": False})
+    except (ValueError, gzip.BadGzipFile, csv.Error) as e:
+        return json_response(400, {"error": str(e), "success": False})
+    except Exception as e:
+        logger.error(f"Unable to import measurements of {params.get('babyId')}: {str(e)}")
+        return json_response(500, {"error": "Unable to import the measurements", "success": False})
+
+
+warmup.warm_on_init(dynamodb=True)
@@ -0,0 +1,160 @@
+"""
+Where a z-score falls among the measurements of other babies in its cohort.
+
+GET /percentile/cohort?measurementType=weight&sex=female&ageMonths=7[&zscore=0.42]
+reads the cohort's CohortSketches item (cohorts.py), projected to its cdf
+grid and quantiles, about 1 KB however many measurements it summarizes, and
+answers by interpolating on the grid. The cohort percentile is the share of
+the cohort at or below the z-score (not the WHO percentile, which compares
+against the reference population). Without zscore only the cohort quantiles
+are returned.
+
+Items are kept in a small LRU for COHORT_CACHE_TTL seconds per container, as
+cohorts only move with new measurements. Cohorts with fewer than
+COHORT_MIN_POPULATION measurements are answered 404, like missing ones, so
+a handful of babies cannot be singled out.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import dynamo
+import metrics
+import warmup
+from cohorts import MAX_AGE_MONTHS, Z_GRID, Z_MIN, Z_STEP, cohort_key, unpack_cdf
+from jwt_validator import require_jwt_auth
+from lambda_function import json_response
+from stream_handler import MEASUREMENT_INDICATORS, SEXES
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+COHORT_CACHE_SIZE = int(os.environ.get('COHORT_CACHE_SIZE', '256'))
+COHORT_CACHE_TTL = float(os.environ.get('COHORT_CACHE_TTL', '60'))
+COHORT_MIN_POPULATION = int(os.environ.get('COHORT_MIN_POPULATION', '20'))
+
+# CohortSketches attributes read per query (never the sketches)
+COHORT_ATTRIBUTES = ('population', 'cdf', 'quantiles', 'updatedAt')
+
+# cohortKey -> (fetched at, item or None), least recently used first
+_cohort_cache = OrderedDict()
+_cohort_cache_lock = threading.Lock()
+_cohort_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+class NotFound(Exception):
+    pass
+
+
+def parse_cohort_request(params):
+    """(measurementType, sex, ageMonths, zscore or None) from the query string"""
+    measurement_type = params.get('measurementType')
+    if measurement_type not in MEASUREMENT_INDICATORS:
+        raise ValueError(f"measurementType must be one of {', '.join(MEASUREMENT_INDICATORS)}")
+    sex = SEXES.get(params.get('sex'))
+    if sex is None:
+        raise ValueError("sex must be 'male' or 'female'")
+    try:
+        age_months = int(params.get('ageMonths'))
+    except (TypeError, ValueError):
+        raise ValueError("ageMonths must be a whole number of months")
+    if not 0 <= age_months <= MAX_AGE_MONTHS:
+        raise ValueError(f"ageMonths must be between 0 and {MAX_AGE_MONTHS}")
+    zscore = params.get('zscore')
+    if zscore in (None, ''):
+        return measurement_type, sex, age_months, None
+    try:
+        zscore = float(zscore)
+    except ValueError:
+        raise ValueError("zscore must be a number")
+    if not math.isfinite(zscore):
+        raise ValueError("zscore must be a number")
+    return measurement_type, sex, age_months, zscore
+
+
+def load_cohort(key):
+    """The cohort item projected to COHORT_ATTRIBUTES (cached), or None"""
+    now = time.monotonic()
+    with _cohort_cache_lock:
+        entry = _cohort_cache.get(key)
+        if entry is not None and now - entry[0] < COHORT_CACHE_TTL:
+            _cohort_cache.move_to_end(key)
+            _cohort_cache_stats['hits'] += 1
+            return entry[1]
+        _cohort_cache_stats['misses'] += 1
+
+    item = dynamo.batch_get(dynamo.COHORT_TABLE_NAME, 'cohortKey', [key], attributes=COHORT_ATTRIBUTES).get(key)
+    if item is not None:
+        item['cdf'] = unpack_cdf(item['cdf'])
+    if COHORT_CACHE_SIZE > 0:
+        with _cohort_cache_lock:
+            _cohort_cache[key] = (now, item)
+            _cohort_cache.move_to_end(key)
+            while len(_cohort_cache) > COHORT_CACHE_SIZE:
+                _cohort_cache.popitem(last=False)
+                _cohort_cache_stats['evictions'] += 1
+    return item
+
+
+def cohort_cache_stats():
+    with _cohort_cache_lock:
+        return dict(_cohort_cache_stats, size=len(_cohort_cache), capacity=COHORT_CACHE_SIZE)
+
+
+def clear_cohort_cache():
+    with _cohort_cache_lock:
+        _cohort_cache.clear()
+        for name in _cohort_cache_stats:
+            _cohort_cache_stats[name] = 0
+
+
+def cohort_percentile(grid, zscore):
+    """Cohort percentile at zscore, interpolated between the grid points around it"""
+    position = (zscore - Z_MIN) / Z_STEP
+    if position <= 0:
+        return round(grid[0], 2)
+    if position >= len(Z_GRID) - 1:
+        return round(grid[-1], 2)
+    i = int(position)
+    fraction = position - i
+    return round(grid[i] + (grid[i + 1] - grid[i]) * fraction, 2)
+
+
+@require_jwt_auth
+def lambda_handler(event, context):
+    """Lambda handler answering cohort percentile queries (see module docstring)"""
+    params = event.get('queryStringParameters') or {}
+    try:
+        measurement_type, sex, age_months, zscore = parse_cohort_request(params)
+        key = cohort_key(MEASUREMENT_INDICATORS[measurement_type], sex, age_months)
+        with metrics.phase('LoadTime'):
+            cohort = load_cohort(key)
+        if cohort is None or cohort.get('population', 0) < COHORT_MIN_POPULATION:
+            raise NotFound(f"Not enough {measurement_type} measurements of {sex} babies at {age_months} months")
+        payload = {
+            "cohortKey": key,
+            "measurementType": measurement_type,
+            "sex": sex,
+            "ageMonths": age_months,
+            "population": cohort['population'],
+            "quantiles": cohort.get('quantiles'),
+            "updatedAt": cohort.get('updatedAt'),
+            "success": True
+        }
+        if zscore is not None:
+            payload.update(zscore=zscore, cohortPercentile=cohort_percentile(cohort['cdf'], zscore))
+        return json_response(200, payload)
+    except NotFound as e:
+        return json_response(404, {"error": str(e), "success": False})
+    except ValueError as e:
+        return json_response(400, {"error": str(e), "success": False})
+    except Exception as e:
+        logger.error(f"Unable to load cohort for {params}: {str(e)}")
+        return json_response(500, {"error": "Unable to load the cohort", "success": False})
+
+
+warmup.warm_on_init(dynamodb=True)
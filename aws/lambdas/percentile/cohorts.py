@@ -0,0 +1,308 @@
+"""
+Cohort distributions of scored growth measurements, kept as quantile sketches.
+
+A cohort is the measurements of one indicator, sex and month of age
+(wfa#female#7). Each one is stored as a single CohortSketches item:
+  added       KLL sketch (sketches.py) of the z-scores that entered the cohort
+  removed     KLL sketch of the z-scores that left it (edits, deletions)
+  population  measurements in the cohort (added less removed)
+  cdf         float32 cohort percentile at each z-score of Z_GRID
+  quantiles   z-score at each of COHORT_PERCENTILES
+cdf and quantiles are recomputed on every write, so a cohort percentile query
+(cohort_rank.py) reads one small item and interpolates; it never touches the
+sketches or the measurements.
+
+The GrowthData stream keeps the cohorts current: a z-score written back by
+stream_handler enters its cohort, an edit that changes the z-score or moves
+the measurement to another month removes the old one and adds the new one,
+and a deletion removes it. The sketches of a stream batch are merged into the
+stored ones, so an update never rescans the table. Delivery is at least once:
+a record replayed after a partial failure counts again, and cohorts follow
+the baby's sex and date of birth as they were when each measurement was
+scored. aws/tools/build_cohorts.py rebuilds every cohort exactly from a
+parallel segmented scan or from exports, which also clears that drift.
+
+Writes are conditional on the cohort version, as in growth_summary.py.
+"""
+
+import logging
+import math
+import struct
+from datetime import datetime, timezone
+
+import dynamo
+import metrics
+import profiling
+from percentile_engine import age_in_days
+from sketches import KLLSketch
+from stream_handler import MEASUREMENT_INDICATORS, SEXES
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DAYS_PER_MONTH = 30.4375
+
+# Months of age with a cohort (the WHO 0-5 standard)
+MAX_AGE_MONTHS = 60
+
+# z-scores at which the cohort percentile is precomputed
+Z_MIN = -5.0
+Z_STEP = 0.05
+Z_POINTS = 201
+Z_GRID = tuple(round(Z_MIN + i * Z_STEP, 2) for i in range(Z_POINTS))
+
+# Cohort percentiles whose z-score is precomputed
+COHORT_PERCENTILES = (3, 10, 25, 50, 75, 90, 97)
+
+# Attempts to write a cohort that keeps changing under us
+MAX_WRITE_ATTEMPTS = 3
+
+INSERT_STATEMENT = (
+    'INSERT INTO "{table}" VALUE '
+    "{{'cohortKey': ?, 'indicator': ?, 'sex': ?, 'ageMonth': ?, 'population': ?, 'added': ?, "
+    "'removed': ?, 'cdf': ?, 'quantiles': ?, 'version': ?, 'updatedAt': ?}}"
+)
+UPDATE_STATEMENT = (
+    'UPDATE "{table}" SET "population" = ?, "added" = ?, "removed" = ?, "cdf" = ?, "quantiles" = ?, '
+    '"version" = ?, "updatedAt" = ? WHERE "cohortKey" = ? AND "version" = ?'
+)
+
+
+def cohort_key(indicator, sex, age_month):
+    return f'{indicator}#{sex}#{age_month}'
+
+
+def cohort_of(item, baby):
+    """(cohort key, zscore) of a scored GrowthData item, or None when it has no cohort"""
+    indicator = MEASUREMENT_INDICATORS.get(item.get('measurementType'))
+    zscore = item.get('zscore')
+    sex = SEXES.get((baby or {}).get('gender'))
+    if indicator is None or sex is None or not isinstance(zscore, (int, float)) or not math.isfinite(zscore):
+        return None
+    try:
+        age = age_in_days(baby.get('dateOfBirth'), item.get('measurementDate'))
+    except (TypeError, ValueError):
+        return None
+    month = int(age // DAYS_PER_MONTH)
+    if age < 0 or month > MAX_AGE_MONTHS:
+        return None
+    return cohort_key(indicator, sex, month), float(zscore)
+
+
+def sketch_items(pairs, sketches=None):
+    """
+    Add the z-scores of (item, baby) pairs to sketches ({cohort key:
+    KLLSketch}, created when None). Returns (sketches, items without a cohort).
+    """
+    sketches = {} if sketches is None else sketches
+    skipped = 0
+    for item, baby in pairs:
+        placed = cohort_of(item, baby)
+        if placed is None:
+            skipped += 1
+            continue
+        key, zscore = placed
+        sketch = sketches.get(key)
+        if sketch is None:
+            sketch = sketches[key] = KLLSketch()
+        sketch.update(zscore)
+    return sketches, skipped
+
+
+def empty_cohort(key):
+    indicator, sex, month = key.split('#')
+    return {
+        'cohortKey': key,
+        'indicator': indicator,
+        'sex': sex,
+        'ageMonth': int(month),
+        'added': KLLSketch(),
+        'removed': KLLSketch(),
+        'version': 0,
+    }
+
+
+def load_cohorts(keys):
+    """Stored cohorts of keys with their sketches, and empty ones for new cohorts"""
+    items = dynamo.batch_get(dynamo.COHORT_TABLE_NAME, 'cohortKey', keys,
+                             attributes=('indicator', 'sex', 'ageMonth', 'added', 'removed', 'version'))
+    cohorts = {}
+    for key in keys:
+        item = items.get(key)
+        if item is None:
+            cohorts[key] = empty_cohort(key)
+            continue
+        cohorts[key] = dict(item, added=KLLSketch.from_bytes(item['added']),
+                            removed=KLLSketch.from_bytes(item['removed']))
+    return cohorts
+
+
+def population(cohort):
+    return max(0, cohort['added'].count - cohort['removed'].count)
+
+
+def cdf(cohort):
+    """Cohort percentile at each z-score of Z_GRID"""
+    total = population(cohort)
+    if not total:
+        return [0.0] * Z_POINTS
+    added, removed = cohort['added'], cohort['removed']
+    grid = []
+    highest = 0.0
+    for z in Z_GRID:
+        # The two estimates err independently; keep the curve monotone
+        highest = max(highest, min(100.0, 100.0 * (added.rank(z) - removed.rank(z)) / total))
+        grid.append(highest)
+    return grid
+
+
+def quantiles(grid):
+    """{'p3': z, ...}: z-score at each of COHORT_PERCENTILES, interpolated on the cdf grid"""
+    result = {}
+    for p in COHORT_PERCENTILES:
+        i = next((i for i, value in enumerate(grid) if value >= p), None)
+        if i is None:
+            z = None
+        elif i == 0:
+            z = Z_GRID[i]
+        else:
+            z = Z_GRID[i - 1] + Z_STEP * (p - grid[i - 1]) / (grid[i] - grid[i - 1])
+        result[f'p{p}'] = None if z is None else round(z, 3)
+    return result
+
+
+def pack_cdf(grid):
+    return struct.pack(f'<{len(grid)}f', *grid)
+
+
+def unpack_cdf(data):
+    data = bytes(data)
+    return struct.unpack(f'<{len(data) // 4}f', data)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def write_statement(cohort):
+    """(statement, parameters) storing cohort, conditional on the version it was read at"""
+    grid = cdf(cohort)
+    fields = [population(cohort), cohort['added'].to_bytes(), cohort['removed'].to_bytes(), pack_cdf(grid),
+              quantiles(grid)]
+    version = cohort['version']
+    if version == 0:
+        statement = INSERT_STATEMENT.format(table=dynamo.COHORT_TABLE_NAME)
+        return statement, [cohort['cohortKey'], cohort['indicator'], cohort['sex'], cohort['ageMonth'],
+                           *fields, 1, _now()]
+    statement = UPDATE_STATEMENT.format(table=dynamo.COHORT_TABLE_NAME)
+    return statement, [*fields, version + 1, _now(), cohort['cohortKey'], version]
+
+
+def store_cohorts(deltas, replace=False):
+    """
+    Merge deltas ({cohort key: (added sketch or None, removed sketch or
+    None)}) into the stored cohorts, or with replace=True make the added
+    sketches the whole of each cohort. Returns ({cohort key: error}, counters):
+    error is None when the cohort was written.
+    """
+    stats = {'written': 0, 'conflicts': 0}
+    results = {}
+    pending = list(deltas)
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        if not pending:
+            break
+        cohorts = load_cohorts(pending)
+        writes = []
+        for key in pending:
+            cohort = cohorts[key]
+            added, removed = deltas[key]
+            if replace:
+                cohort['added'], cohort['removed'] = KLLSketch(), KLLSketch()
+            if added is not None:
+                cohort['added'].merge(added)
+            if removed is not None:
+                cohort['removed'].merge(removed)
+            writes.append((key, write_statement(cohort)))
+
+        pending = []
+        for (key, _), error in zip(writes, dynamo.batch_execute([write for _, write in writes])):
+            if error is None:
+                stats['written'] += 1
+                results[key] = None
+            elif error.get('Code') in ('ConditionalCheckFailed', 'DuplicateItem'):
+                # Written meanwhile by another invocation: reload and merge again
+                stats['conflicts'] += 1
+                pending.append(key)
+                results[key] = error
+            else:
+                logger.warning(f"Cohort write of {key} failed: {error.get('Code')} {error.get('Message')}")
+                results[key] = error
+    return results, stats
+
+
+def process_records(records):
+    """
+    Merge the z-scores entering and leaving cohorts in GrowthData stream
+    records into the stored cohorts. Returns (failed sequence numbers, counters dict).
+    """
+    changes = []
+    for record in records:
+        change = record.get('dynamodb', {})
+        old = dynamo.load_item(change['OldImage']) if change.get('OldImage') else None
+        new = dynamo.load_item(change['NewImage']) if change.get('NewImage') else None
+        if (old or {}).get('zscore') is None and (new or {}).get('zscore') is None:
+            continue
+        changes.append((change.get('SequenceNumber'), old, new))
+
+    baby_ids = sorted({item['babyId'] for _, old, new in changes for item in (old, new)
+                       if item and item.get('babyId')})
+    stats = {'records': len(records)}
+    try:
+        babies = dynamo.batch_get(dynamo.BABIES_TABLE_NAME, 'babyId', baby_ids,
+                                  attributes=('gender', 'dateOfBirth')) if baby_ids else {}
+    except Exception as e:
+        logger.error(f"Unable to load babies: {str(e)}")
+        stats['failed'] = len(changes)
+        return sorted(sequence for sequence, _, _ in changes), stats
+
+    deltas = {}
+    sequences = {}
+    for sequence, old, new in changes:
+        before = cohort_of(old, babies.get(old.get('babyId'))) if old else None
+        after = cohort_of(new, babies.get(new.get('babyId'))) if new else None
+        if before == after:
+            continue
+        # delta is [added, removed]
+        for placed, side in ((before, 1), (after, 0)):
+            if placed is None:
+                continue
+            key, zscore = placed
+            delta = deltas.setdefault(key, [None, None])
+            if delta[side] is None:
+                delta[side] = KLLSketch()
+            delta[side].update(zscore)
+            sequences.setdefault(key, []).append(sequence)
+
+    stats['cohorts'] = len(deltas)
+    if not deltas:
+        return [], stats
+    results, counters = store_cohorts(deltas)
+    stats.update(counters)
+    failed = sorted({sequence for key, error in results.items() if error is not None
+                     for sequence in sequences[key]})
+    return failed, stats
+
+
+def lambda_handler(event, context):
+    """
+    DynamoDB Streams handler for the GrowthData table keeping the cohorts.
+    Returns the partial batch response expected with ReportBatchItemFailures.
+    """
+    with metrics.request(__name__), profiling.sample(__name__):
+        with metrics.phase('ProcessTime'):
+            failed, stats = process_records(event.get('Records', []))
+        for name in ('records', 'cohorts', 'written', 'conflicts'):
+            metrics.count(name.capitalize(), stats.get(name, 0))
+        metrics.count('Failed', len(failed))
+    logger.info(f"Cohort batch: {stats}")
+    return {"batchItemFailures": [{"itemIdentifier": sequence} for sequence in failed]}
@@ -0,0 +1,208 @@
+"""
+Reference centile curves for growth charts.
+
+GET /percentile/curves returns, for one indicator and sex, the measurement at
+each requested centile over a grid of ages (or lengths/heights), computed from
+the WHO L/M/S columns with the inverse LMS transform. Reference data never
+changes between deployments, so every payload is serialized once per
+container, tagged with a strong ETag derived from its bytes and served with
+long-lived Cache-Control so API Gateway, CDNs and browsers can reuse it.
+
+Query parameters (all optional except sex):
+  indicator  code from indicators.INDICATORS (default wfa)
+  sex        'male' or 'female'
+  from, to   index range in days or cm (default: the whole table)
+  step       grid resolution in days or cm (default DEFAULT_STEPS)
+  centiles   comma-separated centiles (default 3,15,50,85,97)
+  format     response encoding (see encoding.py), else negotiated from Accept
+
+Each encoding (and its gzipped form, with Accept-Encoding: gzip) is cached
+and tagged separately.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import encoding
+import metrics
+import warmup
+from jwt_validator import require_jwt_auth
+from indicators import INDICATORS, get_table
+from lambda_function import RESPONSE_HEADERS, json_response
+from percentile_engine import centile_curves
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_CENTILES = (3, 15, 50, 85, 97)
+
+# Default grid resolution per index: weekly by age, half a centimetre by length/height
+DEFAULT_STEPS = {'age': 7, 'length': 0.5, 'height': 0.5}
+
+# Upper bound on grid points per curve
+MAX_CURVE_POINTS = int(os.environ.get('MAX_CURVE_POINTS', '2000'))
+
+# Serialized payloads kept per container (0 disables)
+CURVE_CACHE_SIZE = int(os.environ.get('CURVE_CACHE_SIZE', '256'))
+
+# Browsers and shared caches may keep a curve for a day
+CACHE_CONTROL = os.environ.get('CURVE_CACHE_CONTROL', 'public, max-age=86400')
+
+# Decimals of the returned measurements (curve values are for drawing only)
+CURVE_DECIMALS = 4
+
+INDEX_UNITS = {'age': 'days', 'length': 'cm', 'height': 'cm'}
+
+# ((indicator, sex, from, to, step, centiles), format, gzip) -> (body, etag, headers, isBase64Encoded)
+_curve_cache = OrderedDict()
+_curve_cache_lock = threading.Lock()
+
+
+def _number(params, name, default):
+    raw = params.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a number")
+
+
+def parse_curve_request(params):
+    """
+    Validate the query parameters and return the cache key
+    (indicator, sex, start, stop, step, centiles) with every default filled in.
+    """
+    code = params.get('indicator') or 'wfa'
+    if code not in INDICATORS:
+        raise ValueError(f"Unknown indicator '{code}', expected one of {', '.join(INDICATORS)}")
+    sex = params.get('sex')
+    if sex not in ("male", "female"):
+        raise ValueError("Sex must be 'male' or 'female'")
+    table = get_table(code, sex)
+    if table is None:
+        raise ValueError(f"{INDICATORS[code].name} reference table is not available")
+
+    first, last = table.x[0], table.x[-1]
+    start = _number(params, 'from', first)
+    stop = _number(params, 'to', last)
+    step = _number(params, 'step', DEFAULT_STEPS[INDICATORS[code].index])
+    if not first <= start <= stop <= last:
+        raise ValueError(f"Range must lie within the reference table ({first:g}-{last:g})")
+    if step <= 0:
+        raise ValueError("'step' must be positive")
+    if (stop - start) / step + 1 > MAX_CURVE_POINTS:
+        raise ValueError(f"Curve exceeds {MAX_CURVE_POINTS} points, use a larger step")
+
+    raw_centiles = params.get('centiles')
+    if raw_centiles:
+        try:
+            centiles = tuple(sorted({float(c) for c in raw_centiles.split(',')}))
+        except ValueError:
+            raise ValueError("'centiles' must be a comma-separated list of numbers")
+        if not all(0 < c < 100 for c in centiles):
+            raise ValueError("Centiles must be between 0 and 100")
+    else:
+        centiles = tuple(float(c) for c in DEFAULT_CENTILES)
+    return code, sex, start, stop, step, centiles
+
+
+def grid(start, stop, step):
+    """Index values from start to stop (inclusive when it falls on the grid)"""
+    count = int((stop - start) / step + 1e-9) + 1
+    return [round(start + i * step, 6) for i in range(count)]
+
+
+def _label(centile):
+    return f"P{centile:g}"
+
+
+def build_curves(code, sex, start, stop, step, centiles):
+    """Return the curves payload (a dict) for a validated request"""
+    indicator = INDICATORS[code]
+    xs = grid(start, stop, step)
+    curves = centile_curves(get_table(code, sex), centiles, xs)
+    return {
+        "indicator": code,
+        "name": indicator.name,
+        "sex": sex,
+        "index": indicator.index,
+        "index_unit": INDEX_UNITS[indicator.index],
+        "unit": indicator.unit,
+        "x": xs,
+        "centiles": {
+            _label(centile): [round(value, CURVE_DECIMALS) for value in curves[centile]]
+            for centile in centiles
+        },
+        "success": True
+    }
+
+
+def get_curves(key, name='json', use_gzip=False):
+    """
+    (body, strong ETag, content headers, isBase64Encoded) for a request key
+    in one encoding, memoized per container
+    """
+    cache_key = key, name, use_gzip
+    with _curve_cache_lock:
+        cached = _curve_cache.get(cache_key)
+        if cached is not None:
+            _curve_cache.move_to_end(cache_key)
+            metrics.count('CurveCacheHits')
+            return cached
+
+    metrics.count('CurveCacheMisses')
+    with metrics.phase('BuildTime'):
+        body, headers, binary = encoding.finish(encoding.serialize(build_curves(*key), name), name, use_gzip)
+    cached = body, '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"', headers, binary
+    if CURVE_CACHE_SIZE > 0:
+        with _curve_cache_lock:
+            _curve_cache[cache_key] = cached
+            while len(_curve_cache) > CURVE_CACHE_SIZE:
+                _curve_cache.popitem(last=False)
+    return cached
+
+
+def clear_curve_cache():
+    with _curve_cache_lock:
+        _curve_cache.clear()
+
+
+def _if_none_match(event):
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == 'if-none-match':
+            # If-None-Match uses the weak comparison, so W/ tags match too
+            return [tag.strip().removeprefix('W/') for tag in value.split(',')]
+    return []
+
+
+@require_jwt_auth
+def lambda_handler(event, context):
+    """
+    Lambda handler serving reference centile curves (see module docstring).
+    Answers 304 Not Modified when If-None-Match carries the current ETag.
+    """
+    params = event.get('queryStringParameters') or {}
+    try:
+        key = parse_curve_request(params)
+        name, use_gzip = encoding.negotiate(event)
+        body, etag, content_headers, binary = get_curves(key, name, use_gzip)
+    except Exception as e:
+        return json_response(400, {"error": str(e), "success": False})
+
+    headers = dict(RESPONSE_HEADERS)
+    headers.update(content_headers)
+    headers.update({"ETag": etag, "Cache-Control": CACHE_CONTROL, "Access-Control-Expose-Headers": "ETag"})
+    tags = _if_none_match(event)
+    if etag in tags or '*' in tags:
+        return {"statusCode": 304, "headers": headers, "body": ""}
+    response = {"statusCode": 200, "headers": headers, "body": body}
+    if binary:
+        response["isBase64Encoded"] = True
+    return response
+
+
+warmup.warm_on_init()
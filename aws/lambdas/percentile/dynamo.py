@@ -0,0 +1,203 @@
+"""
+Minimal DynamoDB helpers shared by the percentile handlers.
+
+boto3 is imported on first use (it is provided by the Lambda runtime and is
+not needed to score requests), and tests or local runs can install any object
+with the same client methods through set_client. Items are converted between
+DynamoDB JSON ({"N": "4500"}) and plain Python values here, so stream records
+and API responses share one code path.
+"""
+
+import base64
+import logging
+import os
+import time
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+GROWTH_TABLE_NAME = os.environ.get('GROWTH_TABLE_NAME', 'UpNest-GrowthData-dev')
+BABIES_TABLE_NAME = os.environ.get('BABIES_TABLE_NAME', 'UpNest-Babies-dev')
+SUMMARY_TABLE_NAME = os.environ.get('SUMMARY_TABLE_NAME', 'UpNest-GrowthSummary-dev')
+COHORT_TABLE_NAME = os.environ.get('COHORT_TABLE_NAME', 'UpNest-CohortSketches-dev')
+
+# GrowthData index by babyId (sorted by measurementDate)
+BABY_GROWTH_INDEX = 'BabyGrowthIndex'
+
+# Points boto3 at DynamoDB Local or another stand-in
+DYNAMODB_ENDPOINT_URL = os.environ.get('DYNAMODB_ENDPOINT_URL')
+
+# Connections kept open by the client (reused across warm invocations)
+MAX_POOL_CONNECTIONS = int(os.environ.get('DYNAMODB_MAX_POOL_CONNECTIONS', '10'))
+
+# BatchGetItem and BatchExecuteStatement request limits
+BATCH_GET_LIMIT = 100
+BATCH_STATEMENT_LIMIT = 25
+
+# Seconds before the first retry of unprocessed keys (doubles each attempt)
+RETRY_BASE_DELAY = 0.05
+
+_client = None
+
+
+def get_client():
+    """The DynamoDB client, created on first use and kept for the life of the container"""
+    global _client
+    if _client is None:
+        import boto3
+        from botocore.config import Config
+        config = Config(max_pool_connections=MAX_POOL_CONNECTIONS, tcp_keepalive=True,
+                        retries={'mode': 'standard'})
+        _client = boto3.client('dynamodb', endpoint_url=DYNAMODB_ENDPOINT_URL, config=config)
+    return _client
+
+
+def set_client(client):
+    """Install a client (a local stand-in in tests); None resets to boto3"""
+    global _client
+    _client = client
+
+
+def _number(raw):
+    if any(c in raw for c in '.eE'):
+        return float(raw)
+    return int(raw)
+
+
+def deserialize(value):
+    """Plain Python value of one DynamoDB JSON attribute value"""
+    (kind, raw), = value.items()
+    if kind == 'S':
+        return raw
+    if kind == 'B':
+        # boto3 returns bytes, stream records and exports base64 text
+        return base64.b64decode(raw) if isinstance(raw, str) else bytes(raw)
+    if kind == 'N':
+        return _number(raw)
+    if kind == 'BOOL':
+        return raw
+    if kind == 'NULL':
+        return None
+    if kind == 'M':
+        return {name: deserialize(item) for name, item in raw.items()}
+    if kind == 'L':
+        return [deserialize(item) for item in raw]
+    if kind == 'SS':
+        return set(raw)
+    if kind == 'NS':
+        return {_number(item) for item in raw}
+    raise ValueError(f"Unsupported DynamoDB type {kind}")
+
+
+def serialize(value):
+    """DynamoDB JSON attribute value of a plain Python value"""
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, (int, float, Decimal)):
+        return {'N': repr(value) if isinstance(value, float) else str(value)}
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, (bytes, bytearray)):
+        return {'B': bytes(value)}
+    if isinstance(value, dict):
+        return {'M': {name: serialize(item) for name, item in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [serialize(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        if all(isinstance(item, str) for item in value):
+            return {'SS': sorted(value)}
+        return {'NS': sorted(str(item) for item in value)}
+    raise ValueError(f"Cannot store {type(value).__name__} in DynamoDB")
+
+
+def load_item(item):
+    return {name: deserialize(value) for name, value in item.items()}
+
+
+def dump_item(item):
+    return {name: serialize(value) for name, value in item.items()}
+
+
+def batch_get(table_name, key_name, key_values, attributes=None):
+    """
+    Fetch items by partition key with BatchGetItem, retrying unprocessed keys.
+    Returns {key value: item} for the items that exist.
+    """
+    client = get_client()
+    key_values = list(dict.fromkeys(key_values))
+    found = {}
+    for start in range(0, len(key_values), BATCH_GET_LIMIT):
+        request = {'Keys': [{key_name: serialize(v)} for v in key_values[start:start + BATCH_GET_LIMIT]]}
+        if attributes:
+            names = {f'#a{i}': name for i, name in enumerate(dict.fromkeys([key_name, *attributes]))}
+            request['ProjectionExpression'] = ', '.join(names)
+            request['ExpressionAttributeNames'] = names
+        pending = {table_name: request}
+        attempt = 0
+        while pending:
+            if attempt:
+                time.sleep(min(RETRY_BASE_DELAY * 2 ** attempt, 1.0))
+            attempt += 1
+            response = client.batch_get_item(RequestItems=pending)
+            for item in response.get('Responses', {}).get(table_name, []):
+                item = load_item(item)
+                found[item[key_name]] = item
+            pending = response.get('UnprocessedKeys') or {}
+    return found
+
+
+def query(table_name, key_name, key_value, index_name=None, attributes=None, page_size=None):
+    """
+    Every item whose partition key (of the table or index_name) equals
+    key_value, following pagination (page_size items per request when set).
+    """
+    client = get_client()
+    names = {'#k': key_name}
+    request = {
+        'TableName': table_name,
+        'KeyConditionExpression': '#k = :v',
+        'ExpressionAttributeValues': {':v': serialize(key_value)},
+    }
+    if index_name:
+        request['IndexName'] = index_name
+    if attributes:
+        names.update({f'#a{i}': name for i, name in enumerate(attributes)})
+        request['ProjectionExpression'] = ', '.join(name for name in names if name.startswith('#a'))
+    request['ExpressionAttributeNames'] = names
+    if page_size:
+        request['Limit'] = page_size
+    items = []
+    while True:
+        response = client.query(**request)
+        items.extend(load_item(item) for item in response.get('Items', []))
+        if not response.get('LastEvaluatedKey'):
+            return items
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def batch_execute(statements):
+    """
+    Run PartiQL statements, given as (statement, [parameters]) pairs, with
+    BatchExecuteStatement. Returns one entry per statement in input order:
+    None on success or the error dict ({'Code', 'Message'}) DynamoDB reported.
+    """
+    client = get_client()
+    errors = []
+    for start in range(0, len(statements), BATCH_STATEMENT_LIMIT):
+        chunk = statements[start:start + BATCH_STATEMENT_LIMIT]
+        request = [
+            {'Statement': statement, 'Parameters': [serialize(p) for p in parameters]}
+            for statement, parameters in chunk
+        ]
+        try:
+            responses = client.batch_execute_statement(Statements=request)['Responses']
+        except Exception as e:
+            # Throttled or rejected as a whole: every statement in the chunk failed
+            logger.warning(f"BatchExecuteStatement failed: {str(e)}")
+            errors.extend({'Code': 'RequestFailed', 'Message': str(e)} for _ in chunk)
+            continue
+        errors.extend(response.get('Error') for response in responses)
+    return errors
@@ -0,0 +1,195 @@
+"""
+Negotiated response encodings for large results.
+
+A response body is one of:
+  json       application/json (default), compact separators
+  columnar   application/vnd.upnest.columnar+json: batch results as one
+             array per field instead of one object per measurement
+  ndjson     application/x-ndjson: a header line, then one line per result,
+             so a client can parse results as they arrive
+  msgpack    application/x-msgpack, when the msgpack package is installed
+chosen by a "format" query parameter (or body field), else by the Accept
+header. Bodies of GZIP_MIN_BYTES or more are gzipped when Accept-Encoding
+allows it. Binary bodies (gzip, msgpack) are returned base64-encoded, and
+API Gateway only decodes them when the first media type of the request's
+Accept header is one of the API's binary media types (BINARY_MEDIA_TYPES,
+kept in line with BinaryMediaTypes in template.yaml). Other requests get
+uncompressed text, so e.g. a browser's "Accept: application/json" never
+receives base64 it cannot read; clients opt in to gzip with
+"Accept: application/gzip" and to msgpack with "Accept: application/x-msgpack".
+
+Python Lambda functions cannot stream a response, so a body that would exceed
+the synchronous payload limit (6 MB) is answered 413 with a hint to request
+gzip, columnar or a smaller batch, instead of failing in the Lambda service.
+"""
+
+import base64
+import json
+import os
+
+import metrics
+
+FORMATS = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.upnest.columnar+json',
+    'ndjson': 'application/x-ndjson',
+    'msgpack': 'application/x-msgpack',
+}
+MEDIA_TYPES = {media_type: name for name, media_type in FORMATS.items()}
+BINARY_FORMATS = ('msgpack',)
+
+# Binary media types of the API; unset (local server, tests) allows binary bodies for any request
+BINARY_MEDIA_TYPES = tuple(t.strip().lower() for t in os.environ.get('BINARY_MEDIA_TYPES', '').split(',')
+                           if t.strip())
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = int(os.environ.get('GZIP_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '1'))
+
+# Lambda's synchronous response limit, less room for headers and the envelope
+MAX_RESPONSE_BYTES = int(os.environ.get('MAX_RESPONSE_BYTES', str(6 * 1024 * 1024 - 32 * 1024)))
+
+_msgpack_module = None
+
+
+def _msgpack():
+    """Import msgpack on first use; returns None when it is not installed"""
+    global _msgpack_module
+    if _msgpack_module is None:
+        try:
+            import msgpack
+            _msgpack_module = msgpack
+        except ImportError:
+            _msgpack_module = False
+    return _msgpack_module or None
+
+
+def available(name):
+    return name in FORMATS and (name != 'msgpack' or _msgpack() is not None)
+
+
+def header(event, name):
+    """Value of a request header (case-insensitive), or ''"""
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value or ''
+    return ''
+
+
+def _tokens(value):
+    """Media types or codings of an Accept-style header, in order, without those refused by q=0"""
+    tokens = []
+    for part in value.split(','):
+        token, *params = [p.strip() for p in part.split(';')]
+        if token and not any(p.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000') for p in params):
+            tokens.append(token.lower())
+    return tokens
+
+
+def _is_binary_media_type(media_type):
+    for binary in BINARY_MEDIA_TYPES:
+        if binary in (media_type, '*/*') or (binary.endswith('/*') and media_type.startswith(binary[:-1])):
+            return True
+    return False
+
+
+def binary_allowed(event):
+    """True when a base64-encoded (binary) response body reaches the client decoded"""
+    if not BINARY_MEDIA_TYPES:
+        return True
+    accepted = _tokens(header(event, 'accept'))
+    return bool(accepted) and _is_binary_media_type(accepted[0])
+
+
+def negotiate(event, requested=None):
+    """
+    (format, gzip) for a request. requested (a body field) or the format
+    query parameter wins over Accept; an unknown or unavailable requested
+    format is a ValueError. Binary formats and gzip are only chosen when
+    binary_allowed(event).
+    """
+    binary = binary_allowed(event)
+    requested = requested or (event.get('queryStringParameters') or {}).get('format')
+    if requested:
+        if not available(requested):
+            names = ', '.join(name for name in FORMATS if available(name))
+            raise ValueError(f"Format '{requested}' is not available, expected one of {names}")
+        if requested in BINARY_FORMATS and not binary:
+            raise ValueError(f"Format '{requested}' needs 'Accept: {FORMATS[requested]}'")
+        name = requested
+    else:
+        name = 'json'
+        for media_type in _tokens(header(event, 'accept')):
+            candidate = MEDIA_TYPES.get(media_type)
+            if candidate and available(candidate) and (binary or candidate not in BINARY_FORMATS):
+                name = candidate
+                break
+    return name, binary and 'gzip' in _tokens(header(event, 'accept-encoding'))
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def serialize(payload, name, rows_key=None):
+    """Body bytes of payload in format name; ndjson splits payload[rows_key] into lines"""
+    if name == 'msgpack':
+        return _msgpack().packb(payload, use_bin_type=True)
+    if name == 'ndjson':
+        rows = payload.get(rows_key) if rows_key else None
+        if not isinstance(rows, list):
+            return (_dumps(payload) + '\n').encode()
+        head = {key: value for key, value in payload.items() if key != rows_key}
+        return '\n'.join([_dumps(head), *map(_dumps, rows), '']).encode()
+    return _dumps(payload).encode()
+
+
+def finish(body, name, use_gzip):
+    """
+    (body string, extra headers, isBase64Encoded) for serialized body bytes:
+    gzipped when allowed and large enough, base64 when binary.
+    """
+    headers = {'Content-Type': FORMATS[name], 'Vary': 'Accept, Accept-Encoding'}
+    binary = name in BINARY_FORMATS
+    if use_gzip and len(body) >= GZIP_MIN_BYTES:
+        import gzip
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        headers['Content-Encoding'] = 'gzip'
+        binary = True
+    if binary:
+        return base64.b64encode(body).decode(), headers, True
+    return body.decode(), headers, False
+
+
+def response(status_code, payload, name, use_gzip, base_headers, rows_key=None):
+    """API Gateway response with payload encoded as negotiated (413 when too large)"""
+    with metrics.phase('SerializeTime'):
+        body, headers, binary = finish(serialize(payload, name, rows_key), name, use_gzip)
+    metrics.count('ResponseBytes', len(body), 'Bytes')
+    if len(body) > MAX_RESPONSE_BYTES:
+        error = (f"Response of {len(body)} bytes exceeds the {MAX_RESPONSE_BYTES} byte limit; "
+                 "request gzip (Accept-Encoding), the columnar format or split the batch")
+        return {
+            "statusCode": 413,
+            "headers": dict(base_headers),
+            "body": _dumps({"error": error, "success": False}),
+        }
+    result = {"statusCode": status_code, "headers": {**base_headers, **headers}, "body": body}
+    if binary:
+        result["isBase64Encoded"] = True
+    return result
+
+
+def request_body(event):
+    """The JSON request body of an API Gateway event (base64-decoded when binary media types apply)"""
+    body = event.get('body')
+    if not isinstance(body, str):
+        return None
+    if event.get('isBase64Encoded'):
+        raw = base64.b64decode(body)
+        if header(event, 'content-encoding').lower() == 'gzip':
+            import gzip
+            raw = gzip.decompress(raw)
+        body = raw.decode()
+    return json.loads(body)
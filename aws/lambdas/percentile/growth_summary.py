@@ -0,0 +1,475 @@
+"""
+Materialized per-baby growth summary, maintained from the GrowthData stream.
+
+One GrowthSummary item per baby holds, for each measurement type:
+  count    number of measurements
+  latest   [date, value, zscore, percentile, dataId] of the newest one
+  series   the chart series downsampled by age: the newest measurement of
+           each week up to 3 months, of each 30 days up to 2 years, then of
+           each 91 days (about 45 points for five years of data)
+  trend    z-score velocity and percentile change over the last TREND_DAYS
+Values are in the unit of the WHO tables (kg, cm). The dashboard reads this
+one item (GET /percentile/history?view=summary) instead of querying
+BabyGrowthIndex per measurement type.
+
+Replayed stream records must not be applied twice. The summary keeps the
+stream sequence number last applied for each of the APPLIED_WINDOW most
+recently changed dataIds; records of a dataId at or below it are skipped.
+Records of one item share a shard and arrive in order, and a batch is only
+replayed shortly after it was first delivered, so a small window suffices
+and the item stays the same size however many measurements the baby has.
+
+Every INSERT/MODIFY/REMOVE is applied incrementally: a new or edited
+measurement replaces the series point of its age bucket when it is newer,
+and the score write-back of stream_handler updates its point in place.
+Removing (or moving) a measurement that is shown in the series cannot be
+undone locally, so that measurement type is rebuilt from a BabyGrowthIndex
+query instead. A baby without a summary yet (measurements stored before the
+consumer was deployed) gets one built from the index on its first change,
+and tools/build_summaries.py runs the same build for every existing baby.
+Builds overlay the batch's own changes on the query, which the index may
+not reflect yet.
+
+Writes are conditional on the summary version (INSERT for a new summary,
+UPDATE ... WHERE version = ? otherwise). On a conflict with a concurrent
+writer the baby's summary is reloaded and the touched measurement types are
+rebuilt, since the other writer may already have counted the same items.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+import dynamo
+import metrics
+import profiling
+from indicators import INDICATORS, MEASUREMENT_DECIMALS
+from percentile_engine import age_in_days
+from stream_handler import MEASUREMENT_INDICATORS, reference_value
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Series resolution by age: (from age in days, bucket width in days)
+SERIES_RESOLUTION = ((0, 7), (91, 30), (731, 91))
+
+# Window of the trend, in days before the latest measurement
+TREND_DAYS = 90
+
+# Velocities below this (z-score per month) are reported as stable
+STABLE_VELOCITY = 0.1
+
+DAYS_PER_MONTH = 30.4375
+
+# Order of the fields of a stored point
+POINT_FIELDS = ('date', 'value', 'zscore', 'percentile', 'dataId')
+
+# Attempts to write a summary that keeps changing under us
+MAX_WRITE_ATTEMPTS = 3
+
+# dataIds whose last applied stream sequence number is kept, per summary
+APPLIED_WINDOW = 64
+
+INSERT_STATEMENT = (
+    'INSERT INTO "{table}" VALUE '
+    "{{'babyId': ?, 'userId': ?, 'dateOfBirth': ?, 'types': ?, 'applied': ?, 'version': ?, 'updatedAt': ?}}"
+)
+UPDATE_STATEMENT = (
+    'UPDATE "{table}" SET "types" = ?, "applied" = ?, "version" = ?, "updatedAt" = ? '
+    'WHERE "babyId" = ? AND "version" = ?'
+)
+
+
+def bucket(age_days):
+    """Age in days at which the series bucket containing age_days starts"""
+    start, width = SERIES_RESOLUTION[0]
+    for tier_start, tier_width in SERIES_RESOLUTION:
+        if age_days >= tier_start:
+            start, width = tier_start, tier_width
+    return start + (age_days - start) // width * width
+
+
+def to_point(item):
+    """(measurementType, point) for a GrowthData item, or None when it cannot be summarized"""
+    measurement_type = item.get('measurementType')
+    if measurement_type not in MEASUREMENT_INDICATORS or not item.get('measurementDate'):
+        return None
+    try:
+        value = reference_value(measurement_type, item.get('value'), item.get('unit'))
+    except (TypeError, ValueError):
+        return None
+    zscore, percentile = item.get('zscore'), item.get('percentile')
+    return measurement_type, [
+        item['measurementDate'],
+        round(value, MEASUREMENT_DECIMALS[measurement_type]),
+        zscore if isinstance(zscore, (int, float)) else None,
+        percentile if isinstance(percentile, (int, float)) else None,
+        item.get('dataId'),
+    ]
+
+
+def _order(point):
+    return point[0], point[4]
+
+
+def _age(summary, point):
+    try:
+        return age_in_days(summary['dateOfBirth'], point[0])
+    except ValueError:
+        return None
+
+
+def empty_summary(baby):
+    return {
+        'babyId': baby['babyId'],
+        'userId': baby.get('userId'),
+        'dateOfBirth': baby.get('dateOfBirth'),
+        'types': {},
+        'applied': [],
+        'version': 0,
+    }
+
+
+def _entry(summary, measurement_type):
+    entry = summary['types'].get(measurement_type)
+    if entry is None:
+        entry = summary['types'][measurement_type] = {
+            'unit': INDICATORS[MEASUREMENT_INDICATORS[measurement_type]].unit,
+            'count': 0,
+            'latest': None,
+            'series': [],
+            'trend': None,
+        }
+    return entry
+
+
+def _series_add(summary, entry, point):
+    """Make point the series point of its bucket when it is the newest there"""
+    age = _age(summary, point)
+    if age is None or age < 0:
+        return
+    key = bucket(age)
+    series = entry['series']
+    for i, other in enumerate(series):
+        other_age = _age(summary, other)
+        if other_age is not None and bucket(other_age) == key:
+            if _order(point) >= _order(other):
+                series[i] = point
+            return
+    series.append(point)
+    series.sort(key=_order)
+
+
+def _show(summary, entry, point):
+    _series_add(summary, entry, point)
+    if entry['latest'] is None or _order(point) >= _order(entry['latest']):
+        entry['latest'] = point
+
+
+def add(summary, measurement_type, point):
+    """Count and show a new measurement"""
+    entry = _entry(summary, measurement_type)
+    entry['count'] += 1
+    _show(summary, entry, point)
+
+
+def remove(summary, measurement_type, point):
+    """Remove a measurement; returns True when the type has to be rebuilt"""
+    entry = summary['types'].get(measurement_type)
+    if entry is None:
+        return False
+    entry['count'] = max(entry['count'] - 1, 0)
+    shown = any(other[4] == point[4] for other in entry['series'])
+    return shown or (entry['latest'] is not None and entry['latest'][4] == point[4])
+
+
+def replace(summary, measurement_type, point):
+    """Update a measurement whose date did not change (a score write-back, a value edit)"""
+    entry = _entry(summary, measurement_type)
+    entry['series'] = [point if other[4] == point[4] else other for other in entry['series']]
+    if entry['latest'] is not None and entry['latest'][4] == point[4]:
+        entry['latest'] = point
+    _show(summary, entry, point)
+
+
+def apply_change(summary, old, new):
+    """
+    Apply one GrowthData change (old/new items, either may be None).
+    Returns the measurement types that have to be rebuilt.
+    """
+    before = to_point(old) if old else None
+    after = to_point(new) if new else None
+    if before == after:
+        return set()
+    if before and after and before[0] == after[0] and before[1][0] == after[1][0]:
+        replace(summary, *after)
+        return set()
+    stale = set()
+    if before and remove(summary, *before):
+        stale.add(before[0])
+    if after:
+        add(summary, *after)
+    return stale
+
+
+def build_type(summary, measurement_type, items):
+    """Exact entry of one measurement type from all of the baby's GrowthData items"""
+    summary['types'].pop(measurement_type, None)
+    points = [p for t, p in filter(None, map(to_point, items)) if t == measurement_type]
+    for point in sorted(points, key=_order):
+        add(summary, measurement_type, point)
+    if measurement_type in summary['types']:
+        update_trend(summary['types'][measurement_type])
+
+
+def build_all(summary, items):
+    """Exact entries of every measurement type from all of the baby's GrowthData items"""
+    summary['types'] = {}
+    for measurement_type in {t for t, _ in filter(None, map(to_point, items))}:
+        build_type(summary, measurement_type, items)
+
+
+def current_items(baby_id, changes=()):
+    """
+    The baby's GrowthData items from BabyGrowthIndex, with changes ((old,
+    new, sequence), ...) of the batch applied over them: the index is
+    updated asynchronously and may not show them yet.
+    """
+    items = dynamo.query(dynamo.GROWTH_TABLE_NAME, 'babyId', baby_id, index_name=dynamo.BABY_GROWTH_INDEX)
+    by_id = {item.get('dataId'): item for item in items}
+    for old, new, _ in changes:
+        if new:
+            by_id[new.get('dataId')] = new
+        elif old:
+            by_id.pop(old.get('dataId'), None)
+    return list(by_id.values())
+
+
+def rebuild_types(summary, measurement_types, changes=()):
+    items = current_items(summary['babyId'], changes)
+    for measurement_type in measurement_types:
+        build_type(summary, measurement_type, items)
+
+
+def _data_id(old, new):
+    return (new or old or {}).get('dataId')
+
+
+def is_applied(summary, data_id, sequence):
+    """True when the stream record of data_id at sequence was applied already"""
+    if sequence is None:
+        return False
+    for applied_id, applied_sequence in summary['applied']:
+        if applied_id == data_id:
+            return int(applied_sequence) >= int(sequence)
+    return False
+
+
+def mark_applied(summary, data_id, sequence):
+    """Record sequence as applied for data_id, keeping the newest APPLIED_WINDOW dataIds"""
+    if sequence is None:
+        return
+    applied = [pair for pair in summary['applied'] if pair[0] != data_id]
+    applied.append([data_id, sequence])
+    summary['applied'] = applied[-APPLIED_WINDOW:]
+
+
+def update_trend(entry):
+    """Velocity over the last TREND_DAYS, from the latest point and the series"""
+    latest = entry['latest']
+    entry['trend'] = None
+    if latest is None or latest[2] is None:
+        return
+    latest_date = datetime.fromisoformat(latest[0])
+    earlier = None
+    for point in entry['series']:
+        if point[4] == latest[4] or point[2] is None or _order(point) >= _order(latest):
+            continue
+        days = (latest_date - datetime.fromisoformat(point[0])).days
+        if days <= 0:
+            continue
+        # The most recent point at least TREND_DAYS back, else the oldest one
+        if days >= TREND_DAYS or earlier is None:
+            earlier = (point, days)
+    if earlier is None:
+        return
+    point, days = earlier
+    velocity = (latest[2] - point[2]) / (days / DAYS_PER_MONTH)
+    entry['trend'] = {
+        'since': point[0],
+        'velocity': round(velocity, 4),
+        'percentileChange': round(latest[3] - point[3], 2) if latest[3] is not None and point[3] is not None else None,
+        'direction': 'stable' if abs(velocity) < STABLE_VELOCITY else 'up' if velocity > 0 else 'down',
+    }
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def write_statement(summary):
+    """(statement, parameters) storing summary, conditional on the version it was read at"""
+    version = summary['version']
+    if version == 0:
+        statement = INSERT_STATEMENT.format(table=dynamo.SUMMARY_TABLE_NAME)
+        return statement, [summary['babyId'], summary['userId'], summary['dateOfBirth'],
+                           summary['types'], summary['applied'], 1, _now()]
+    statement = UPDATE_STATEMENT.format(table=dynamo.SUMMARY_TABLE_NAME)
+    return statement, [summary['types'], summary['applied'], version + 1, _now(), summary['babyId'], version]
+
+
+def load_summaries(baby_ids):
+    """
+    Current summaries of baby_ids, with empty ones (version 0) for babies
+    that have none yet
+    """
+    summaries = dynamo.batch_get(dynamo.SUMMARY_TABLE_NAME, 'babyId', baby_ids)
+    for summary in summaries.values():
+        summary.setdefault('applied', [])
+        for entry in summary['types'].values():
+            # Summaries written before the applied window listed every dataId
+            entry.pop('ids', None)
+    missing = [baby_id for baby_id in baby_ids if baby_id not in summaries]
+    if missing:
+        babies = dynamo.batch_get(dynamo.BABIES_TABLE_NAME, 'babyId', missing,
+                                  attributes=('userId', 'dateOfBirth'))
+        summaries.update({baby_id: empty_summary(baby) for baby_id, baby in babies.items()})
+    return summaries
+
+
+def update_summaries(changes, build=None):
+    """
+    Apply changes ({babyId: [(old, new, sequence), ...]}) to the stored
+    summaries, or with build(summary) rebuild them. Returns ({babyId: error},
+    counters): error is None when the summary was written or had nothing to
+    apply.
+    """
+    stats = {'written': 0, 'rebuilt': 0, 'orphaned': 0, 'conflicts': 0, 'replayed': 0}
+    results = {}
+    pending = list(changes)
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        if not pending:
+            break
+        summaries = load_summaries(pending)
+        writes = []
+        for baby_id in pending:
+            summary = summaries.get(baby_id)
+            if summary is None:
+                logger.warning(f"Not summarizing growth data of unknown baby {baby_id}")
+                stats['orphaned'] += 1
+                results[baby_id] = None
+                continue
+            if build is not None:
+                build(summary)
+                stats['rebuilt'] += 1
+            else:
+                batch = [(old, new, sequence) for old, new, sequence in changes[baby_id]
+                         if not is_applied(summary, _data_id(old, new), sequence)]
+                stats['replayed'] += len(changes[baby_id]) - len(batch)
+                if not batch:
+                    results[baby_id] = None
+                    continue
+                if summary['version'] == 0:
+                    # No summary yet: the baby may have measurements from before the consumer
+                    build_all(summary, current_items(baby_id, batch))
+                    stats['rebuilt'] += 1
+                elif apply_batch(summary, batch, rebuild_touched=attempt > 0):
+                    stats['rebuilt'] += 1
+                for old, new, sequence in batch:
+                    mark_applied(summary, _data_id(old, new), sequence)
+            writes.append((baby_id, write_statement(summary)))
+
+        pending = []
+        for (baby_id, _), error in zip(writes, dynamo.batch_execute([write for _, write in writes])):
+            if error is None:
+                stats['written'] += 1
+                results[baby_id] = None
+            elif error.get('Code') in ('ConditionalCheckFailed', 'DuplicateItem'):
+                # Written meanwhile by another invocation: reload and apply again
+                stats['conflicts'] += 1
+                pending.append(baby_id)
+                results[baby_id] = error
+            else:
+                logger.warning(f"Summary write of {baby_id} failed: {error.get('Code')} {error.get('Message')}")
+                results[baby_id] = error
+    return results, stats
+
+
+def apply_batch(summary, batch, rebuild_touched=False):
+    """
+    Apply a baby's changes to its summary. With rebuild_touched (a retry after
+    a concurrent write, which may have counted the same items) every touched
+    measurement type is rebuilt instead of updated. Returns True when a type
+    was rebuilt.
+    """
+    stale = set()
+    touched = set()
+    for old, new, _ in batch:
+        touched |= {p[0] for p in (to_point(old) if old else None, to_point(new) if new else None) if p}
+        if not rebuild_touched:
+            stale |= apply_change(summary, old, new)
+    if rebuild_touched:
+        stale = touched
+    if stale:
+        rebuild_types(summary, stale, batch)
+    for measurement_type in touched - stale:
+        if measurement_type in summary['types']:
+            update_trend(summary['types'][measurement_type])
+    return bool(stale)
+
+
+def process_records(records):
+    """
+    Apply GrowthData stream records to the summaries of their babies.
+    Returns (failed sequence numbers, counters dict).
+    """
+    changes = {}
+    sequences = {}
+    for record in records:
+        change = record.get('dynamodb', {})
+        old = dynamo.load_item(change['OldImage']) if change.get('OldImage') else None
+        new = dynamo.load_item(change['NewImage']) if change.get('NewImage') else None
+        if (old and to_point(old)) is None and (new and to_point(new)) is None:
+            continue
+        old_baby, new_baby = (old or {}).get('babyId'), (new or {}).get('babyId')
+        if old_baby and new_baby and old_baby != new_baby:
+            # Moved to another baby: a removal for one, an insert for the other
+            pairs = [(old_baby, old, None), (new_baby, None, new)]
+        else:
+            pairs = [(old_baby or new_baby, old, new)]
+        for baby_id, before, after in pairs:
+            if baby_id:
+                changes.setdefault(baby_id, []).append((before, after, change.get('SequenceNumber')))
+                sequences.setdefault(baby_id, []).append(change.get('SequenceNumber'))
+
+    stats = {'records': len(records), 'babies': len(changes)}
+    if not changes:
+        return [], stats
+    results, counters = update_summaries(changes)
+    stats.update(counters)
+    failed = sorted({sequence for baby_id, error in results.items() if error is not None
+                     for sequence in sequences[baby_id]})
+    return failed, stats
+
+
+def rebuild_babies(baby_ids):
+    """Rebuild the summaries of baby_ids from all their GrowthData items"""
+    def build(summary):
+        build_all(summary, current_items(summary['babyId']))
+    results, stats = update_summaries({baby_id: [] for baby_id in baby_ids}, build=build)
+    stats['failed'] = sum(1 for error in results.values() if error is not None)
+    return stats
+
+
+def lambda_handler(event, context):
+    """
+    DynamoDB Streams handler for the GrowthData table keeping the summaries.
+    Returns the partial batch response expected with ReportBatchItemFailures.
+    """
+    with metrics.request(__name__), profiling.sample(__name__):
+        with metrics.phase('ProcessTime'):
+            failed, stats = process_records(event.get('Records', []))
+        for name in ('records', 'babies', 'written', 'rebuilt', 'conflicts', 'replayed'):
+            metrics.count(name.capitalize(), stats.get(name, 0))
+        metrics.count('Failed', len(failed))
+    logger.info(f"Summary batch: {stats}")
+    return {"batchItemFailures": [{"itemIdentifier": sequence} for sequence in failed]}
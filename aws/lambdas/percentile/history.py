@@ -0,0 +1,163 @@
+"""
+Scored measurement history of one baby, read server-side.
+
+GET /percentile/history?babyId=...[&measurementType=weight] checks that the
+baby belongs to the caller (the JWT sub), reads all of its GrowthData items
+from BabyGrowthIndex (following pagination, on the client kept by dynamo
+across invocations) and scores them in one vectorized pass with the sex and
+date of birth stored on the baby. The browser no longer fetches the
+measurements and posts them back one by one.
+
+The response holds one series per measurementType, sorted by date. Items
+that cannot be scored (unknown unit, dated before birth, ...) are listed
+under "unscorable" with the reason. A baby that does not exist and one that
+belongs to another user are both answered 404, so ids cannot be probed.
+
+With view=summary the baby's GrowthSummary item (growth_summary.py) is
+returned instead: count, latest point, downsampled series and trend per
+measurement type, read in one GetItem for the dashboard. A baby whose
+summary was not built yet gets one built from BabyGrowthIndex for the
+response (the summary consumer or tools/build_summaries.py stores it).
+"""
+
+import logging
+import os
+
+import dynamo
+import growth_summary
+import metrics
+import warmup
+from jwt_validator import require_jwt_auth
+from lambda_function import json_response
+from stream_handler import MEASUREMENT_INDICATORS, SEXES, score_items
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Items per BabyGrowthIndex query page (None: DynamoDB's 1 MB pages)
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', '0')) or None
+
+# GrowthData attributes read for scoring and returned
+HISTORY_ATTRIBUTES = ('dataId', 'babyId', 'measurementType', 'measurementDate', 'value', 'unit')
+
+# GrowthSummary attributes returned with view=summary
+SUMMARY_ATTRIBUTES = ('types', 'updatedAt')
+
+VIEWS = ('series', 'summary')
+
+
+class NotFound(Exception):
+    pass
+
+
+def parse_history_request(params):
+    """(babyId, measurementType or None, view) from the query string"""
+    baby_id = (params.get('babyId') or '').strip()
+    if not baby_id:
+        raise ValueError("Missing required parameter: babyId")
+    measurement_type = params.get('measurementType') or None
+    if measurement_type is not None and measurement_type not in MEASUREMENT_INDICATORS:
+        raise ValueError(f"measurementType must be one of {', '.join(MEASUREMENT_INDICATORS)}")
+    view = params.get('view') or 'series'
+    if view not in VIEWS:
+        raise ValueError(f"view must be one of {', '.join(VIEWS)}")
+    return baby_id, measurement_type, view
+
+
+def load_baby(baby_id, user_id):
+    """The baby, if it belongs to user_id; NotFound otherwise"""
+    babies = dynamo.batch_get(dynamo.BABIES_TABLE_NAME, 'babyId', [baby_id],
+                              attributes=('userId', 'gender', 'dateOfBirth'))
+    baby = babies.get(baby_id)
+    if baby is None or user_id is None or baby.get('userId') != user_id:
+        raise NotFound(f"Baby {baby_id} not found")
+    return baby
+
+
+def load_items(baby_id, measurement_type=None):
+    items = dynamo.query(dynamo.GROWTH_TABLE_NAME, 'babyId', baby_id, index_name=dynamo.BABY_GROWTH_INDEX,
+                         attributes=HISTORY_ATTRIBUTES, page_size=HISTORY_PAGE_SIZE)
+    return [item for item in items
+            if item.get('measurementType') in MEASUREMENT_INDICATORS
+            and (measurement_type is None or item['measurementType'] == measurement_type)]
+
+
+def score_history(baby, items):
+    """Payload of the scored items: series by measurementType, and the unscorable ones"""
+    scored = score_items([(item, baby) for item in items])
+    series = {}
+    unscorable = []
+    for item, (percentile, zscore, error) in zip(items, scored):
+        point = {
+            "dataId": item.get('dataId'),
+            "date": item.get('measurementDate'),
+            "value": item.get('value'),
+            "unit": item.get('unit'),
+        }
+        if error is not None:
+            unscorable.append(dict(point, measurementType=item.get('measurementType'), error=error))
+            continue
+        point.update(zscore=zscore, percentile=percentile)
+        series.setdefault(item['measurementType'], []).append(point)
+    for points in series.values():
+        points.sort(key=lambda point: (point['date'], point['dataId'] or ''))
+    return {
+        "babyId": baby['babyId'],
+        "sex": SEXES.get(baby.get('gender')),
+        "dateOfBirth": baby.get('dateOfBirth'),
+        "count": len(items),
+        "series": series,
+        "unscorable": unscorable,
+        "success": True
+    }
+
+
+def load_summary(baby, measurement_type=None):
+    """Payload of the baby's stored growth summary (built from the index when there is none yet)"""
+    baby_id = baby['babyId']
+    summary = dynamo.batch_get(dynamo.SUMMARY_TABLE_NAME, 'babyId', [baby_id],
+                               attributes=SUMMARY_ATTRIBUTES).get(baby_id)
+    if summary is None:
+        summary = growth_summary.empty_summary(baby)
+        growth_summary.build_all(summary, growth_summary.current_items(baby_id))
+    types = summary.get('types') or {}
+    for entry in types.values():
+        entry.pop('ids', None)
+    if measurement_type is not None:
+        types = {t: entry for t, entry in types.items() if t == measurement_type}
+    return {
+        "babyId": baby_id,
+        "sex": SEXES.get(baby.get('gender')),
+        "dateOfBirth": baby.get('dateOfBirth'),
+        "types": types,
+        "updatedAt": summary.get('updatedAt'),
+        "success": True
+    }
+
+
+@require_jwt_auth
+def lambda_handler(event, context):
+    """Lambda handler scoring a baby's stored measurements (see module docstring)"""
+    params = event.get('queryStringParameters') or {}
+    try:
+        baby_id, measurement_type, view = parse_history_request(params)
+        user_id = event.get('user', {}).get('sub')
+        with metrics.phase('LoadTime'):
+            baby = load_baby(baby_id, user_id)
+            if view == 'summary':
+                return json_response(200, load_summary(baby, measurement_type))
+            items = load_items(baby_id, measurement_type)
+        metrics.count('BatchSize', len(items))
+        with metrics.phase('ScoreTime'):
+            payload = score_history(baby, items)
+        return json_response(200, payload)
+    except NotFound as e:
+        return json_response(404, {"error": str(e), "success": False})
+    except ValueError as e:
+        return json_response(400, {"error": str(e), "success": False})
+    except Exception as e:
+        logger.error(f"Unable to load history of {params.get('babyId')}: {str(e)}")
+        return json_response(500, {"error": "Unable to load the measurement history", "success": False})
+
+
+warmup.warm_on_init(dynamodb=True)
@@ -0,0 +1,163 @@
+"""
+Registry of WHO growth indicators scored by the percentile Lambda.
+
+Every indicator reads its LMS tables from the precompiled artifact
+(see build_tables.py), keyed by the WHO file prefix and sex. Age-indexed
+indicators look up the age in days; length-indexed ones look up the
+length (under 2 years) or standing height (2 years and over) in cm.
+A table that is not installed is reported per indicator instead of
+failing the whole measurement. Tables of the other reference standards
+come from their packs (see references.py).
+"""
+
+import logging
+import math
+import os
+import time
+from collections import namedtuple
+
+import metrics
+import references
+from lms_tables import ArtifactError, find_sources, load_artifact, read_xlsx_table
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+# WHO switches from recumbent length to standing height at 24 months
+HEIGHT_FROM_DAYS = 730
+
+# Measurement fields accepted in a request, in kg, cm, cm and kg/m2
+MEASUREMENT_FIELDS = ('weight', 'height', 'head_circumference', 'bmi')
+
+# Decimals each measurement is quantized to (grams, millimetres, 0.01 kg/m2),
+# so equal readings map to the same cached result
+MEASUREMENT_DECIMALS = {'weight': 3, 'height': 1, 'head_circumference': 1, 'bmi': 2}
+
+# code is the WHO file prefix; index is 'age', 'length' or 'height'
+Indicator = namedtuple('Indicator', ['code', 'name', 'measurement', 'unit', 'index'])
+
+INDICATORS = {
+    indicator.code: indicator for indicator in (
+        Indicator('wfa', 'Weight-for-age', 'weight', 'kg', 'age'),
+        Indicator('lhfa', 'Length/height-for-age', 'height', 'cm', 'age'),
+        Indicator('hcfa', 'Head circumference-for-age', 'head_circumference', 'cm', 'age'),
+        Indicator('bfa', 'BMI-for-age', 'bmi', 'kg/m2', 'age'),
+        Indicator('wfl', 'Weight-for-length', 'weight', 'kg', 'length'),
+        Indicator('wfh', 'Weight-for-height', 'weight', 'kg', 'height'),
+    )
+}
+
+# Map the precompiled OMS tables at import time.
+# The xlsx sources are only parsed if the artifact is missing or corrupt.
+_load_start = time.perf_counter()
+try:
+    LMS_TABLES = load_artifact()
+except ArtifactError as e:
+    logger.warning(f"Falling back to xlsx tables: {str(e)}")
+    LMS_TABLES = {}
+metrics.record_init('TableLoadTime', (time.perf_counter() - _load_start) * 1000)
+
+# WHO 0-5 tables resolved so far, keyed by (code, sex); None when not installed
+TABLES = {}
+
+
+def get_table(code, sex, standard=None):
+    """Return the LMSTable for an indicator and sex, or None if it is not installed"""
+    if standard is not None and standard != references.DEFAULT_STANDARD:
+        return references.get_table(code, sex, standard)
+    key = (code, sex)
+    if key not in TABLES:
+        table = LMS_TABLES.get(key)
+        if table is None:
+            # Fallback only: pulls in pandas/openpyxl on first use
+            for indicator, source_sex, path in find_sources(data_dir):
+                if (indicator, source_sex) == key:
+                    table = read_xlsx_table(indicator, source_sex, path)
+                    break
+        TABLES[key] = table
+    return TABLES[key]
+
+
+def measurement_values(body):
+    """
+    Collect the measurement fields present in body as floats quantized to
+    their measurement precision, deriving BMI from weight and height when it
+    is not given.
+    """
+    values = {}
+    for field in MEASUREMENT_FIELDS:
+        raw = body.get(field)
+        if raw is not None and raw != '':
+            value = float(raw)
+            values[field] = round(value, MEASUREMENT_DECIMALS[field]) if math.isfinite(value) else value
+    for field, value in values.items():
+        if not math.isfinite(value) or value <= 0:
+            raise ValueError(f"{field} must be a positive number")
+    if 'bmi' not in values and 'weight' in values and 'height' in values:
+        values['bmi'] = round(values['weight'] / (values['height'] / 100) ** 2, MEASUREMENT_DECIMALS['bmi'])
+    return values
+
+
+def index_value(indicator, age_days, values):
+    """The table index for an indicator, or None when it does not apply"""
+    if indicator.index == 'age':
+        return age_days
+    if 'height' not in values:
+        return None
+    if indicator.index == 'length' and age_days < HEIGHT_FROM_DAYS:
+        return values['height']
+    if indicator.index == 'height' and age_days >= HEIGHT_FROM_DAYS:
+        return values['height']
+    return None
+
+
+def plan(sex, age_days, values, placement=None):
+    """
+    List what to score for one measurement.
+    Returns (rows, errors): rows are (code, value, table, x) tuples and errors
+    maps indicator code to a message for applicable indicators that cannot be scored.
+    placement (see references.place) selects another standard than WHO 0-5;
+    length- and height-indexed indicators only exist in WHO 0-5.
+    """
+    standard = placement.standard if placement is not None else None
+    default = standard is None or standard.code == references.DEFAULT_STANDARD
+    if placement is not None:
+        age_days = placement.age_days
+    rows = []
+    errors = {}
+    for indicator in INDICATORS.values():
+        if indicator.measurement not in values:
+            continue
+        if indicator.index != 'age' and not default:
+            continue
+        x = index_value(indicator, age_days, values)
+        if x is None:
+            continue
+        if indicator.index == 'age' and not default:
+            x = placement.x
+        table = get_table(indicator.code, sex, standard and standard.code)
+        if table is None:
+            errors[indicator.code] = f"{indicator.name} reference table is not available" + (
+                '' if default else f" in the {standard.name}")
+            continue
+        if indicator.index != 'age' and not _in_range(table, x):
+            errors[indicator.code] = (
+                f"{indicator.index.capitalize()} {x} cm is outside the {indicator.name} "
+                f"reference range ({table.x[0]}-{table.x[-1]} cm)"
+            )
+            continue
+        if not default and not _in_range(table, x):
+            errors[indicator.code] = (
+                f"Age {x} {standard.unit} is outside the {indicator.name} range of the {standard.name} "
+                f"({table.x[0]:g}-{table.x[-1]:g} {standard.unit})"
+            )
+            continue
+        rows.append((indicator.code, values[indicator.measurement], table, x))
+    return rows, errors
+
+
+def _in_range(table, x):
+    tolerance = table.step / 2
+    return table.x[0] - tolerance <= x <= table.x[-1] + tolerance
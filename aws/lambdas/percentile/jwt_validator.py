@@ -3,17 +3,46 @@ JWT Validation Module for AWS Lambda Functions
 
 This module provides JWT token validation for AWS Cognito User Pool tokens.
 It includes token extraction, JWKS caching, and signature verification.
+
+Public keys are parsed once per kid and cached. The JWKS is refreshed when
+JWKS_CACHE_TTL expires or a token carries an unknown kid (concurrent misses
+share one fetch), and can be pre-warmed at init from JWKS_FILE or JWKS_JSON.
+After a failed refresh the cached keys are used without another fetch for
+JWKS_MIN_REFRESH_INTERVAL, so an unreachable endpoint does not add a
+blocking fetch to every request.
+
+Verified tokens are remembered in a bounded LRU keyed by a SHA-256 of the
+token, so a warm container skips signature checks for a token it has already
+accepted until shortly before it expires or its kid leaves the JWKS.
+
+With AUTH_MODE=authorizer the API is trusted to have verified the token with
+a Cognito (REST) or JWT (HTTP API) authorizer: the user is built from the
+claims it passes in requestContext, after checking their issuer, audience
+(or client_id for access tokens), token_use and expiry. Requests without
+authorizer claims fall back to full verification. Only enable it when every
+route to the function goes through such an authorizer.
 """
 
+import hashlib
 import json
 import jwt
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
-import requests
 import os
 import logging
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 
+try:
+    import metrics
+    import profiling
+    import warmup
+except ImportError:
+    # Imported as aws.lambdas.percentile.jwt_validator (tests, tools)
+    from . import metrics, profiling, warmup
+
 # Configure logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -23,19 +52,130 @@ COGNITO_REGION = os.environ.get('COGNITO_REGION', 'us-east-1')
 COGNITO_USER_POOL_ID = os.environ.get('COGNITO_USER_POOL_ID')
 COGNITO_CLIENT_ID = os.environ.get('COGNITO_CLIENT_ID')
 
+# JWKS configuration
+JWKS_URL = os.environ.get('JWKS_URL')  # overrides the Cognito URL (local stand-ins)
+JWKS_FILE = os.environ.get('JWKS_FILE')  # bundled JWKS used to pre-warm the key cache
+JWKS_JSON = os.environ.get('JWKS_JSON')  # same, inline
+JWKS_CACHE_TTL = float(os.environ.get('JWKS_CACHE_TTL', '3600'))
+JWKS_CONNECT_TIMEOUT = float(os.environ.get('JWKS_CONNECT_TIMEOUT', '1.0'))
+JWKS_READ_TIMEOUT = float(os.environ.get('JWKS_READ_TIMEOUT', '2.0'))
+# An unknown kid or a failed fetch allows at most one refresh per interval (seconds)
+JWKS_MIN_REFRESH_INTERVAL = float(os.environ.get('JWKS_MIN_REFRESH_INTERVAL', '10'))
+
+# 'verify' checks every token here; 'authorizer' trusts API Gateway authorizer claims
+AUTH_MODES = ('verify', 'authorizer')
+AUTH_MODE = os.environ.get('AUTH_MODE', 'verify').lower()
+if AUTH_MODE not in AUTH_MODES:
+    logger.warning(f"Unknown AUTH_MODE {AUTH_MODE!r}, verifying tokens")
+    AUTH_MODE = 'verify'
+
+# token_use values accepted from an authorizer
+AUTHORIZER_TOKEN_USES = ('id', 'access')
+
+# Verified token cache: entries (0 disables) and seconds before exp to stop serving one
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '1024'))
+TOKEN_CACHE_SKEW = float(os.environ.get('TOKEN_CACHE_SKEW', '30'))
+
 # Cache for JWKS
 _jwks_cache = None
+_jwks_fetched_at = 0.0
+_last_fetch_attempt = float('-inf')
+_last_fetch_failure = float('-inf')
+_public_keys = {}
+_jwks_lock = threading.Lock()
+
+# Verified token cache: sha256(token) -> (cache until, kid, decoded claims)
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+_token_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'revoked': 0}
+
+def __getattr__(name):
+    # requests is only needed to fetch JWKS; keep it off the import path
+    if name == 'requests':
+        import requests
+        return requests
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_jwks_url():
+    if JWKS_URL:
+        return JWKS_URL
+    return f'https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}/.well-known/jwks.json'
+
+def fetch_jwks():
+    """Download the JWKS document with bounded connect/read timeouts"""
+    import requests
+    response = requests.get(get_jwks_url(), timeout=(JWKS_CONNECT_TIMEOUT, JWKS_READ_TIMEOUT))
+    response.raise_for_status()
+    return response.json()
+
+def set_jwks(jwks, fetched_at=None):
+    """Install a JWKS document and parse its public keys by kid"""
+    global _jwks_cache, _jwks_fetched_at, _public_keys
+    public_keys = {}
+    for jwk in jwks.get('keys', []):
+        try:
+            public_keys[jwk['kid']] = jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(jwk))
+        except Exception as e:
+            logger.warning(f"Skipping unusable JWK {jwk.get('kid')}: {str(e)}")
+    _public_keys = public_keys
+    _jwks_cache = jwks
+    _jwks_fetched_at = time.monotonic() if fetched_at is None else fetched_at
+
+def refresh_jwks():
+    """
+    Fetch the JWKS again. Callers that queue up behind an in-flight fetch
+    reuse its result, or its failure, instead of fetching once more
+    (single-flight).
+    """
+    global _last_fetch_attempt, _last_fetch_failure
+    seen, attempted = _jwks_fetched_at, _last_fetch_attempt
+    with _jwks_lock:
+        if _jwks_fetched_at == seen and _last_fetch_attempt == attempted:
+            _last_fetch_attempt = time.monotonic()
+            metrics.count('JwksFetches')
+            try:
+                with metrics.phase('JwksFetchTime'):
+                    jwks = fetch_jwks()
+            except Exception:
+                _last_fetch_failure = time.monotonic()
+                raise
+            set_jwks(jwks)
+    return _jwks_cache
+
+def _jwks_expired():
+    return time.monotonic() - _jwks_fetched_at >= JWKS_CACHE_TTL
+
+def _recently_attempted():
+    return time.monotonic() - _last_fetch_attempt < JWKS_MIN_REFRESH_INTERVAL
+
+def _recently_failed():
+    """True within JWKS_MIN_REFRESH_INTERVAL of a failed fetch"""
+    return time.monotonic() - _last_fetch_failure < JWKS_MIN_REFRESH_INTERVAL
 
 def get_jwks():
-    """Fetch JWKS from Cognito"""
-    global _jwks_cache
+    """Fetch JWKS from Cognito (cached until JWKS_CACHE_TTL expires)"""
+    if _jwks_cache is None or (_jwks_expired() and not _recently_failed()):
+        refresh_jwks()
     if _jwks_cache is None:
-        jwks_url = f'https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}/.well-known/jwks.json'
-        response = requests.get(jwks_url)
-        response.raise_for_status()
-        _jwks_cache = response.json()
+        raise ValueError("JWKS unavailable")
     return _jwks_cache
 
+def prewarm_jwks():
+    """Seed the key cache from JWKS_JSON or JWKS_FILE, if configured"""
+    try:
+        if JWKS_JSON:
+            set_jwks(json.loads(JWKS_JSON))
+        elif JWKS_FILE:
+            with open(JWKS_FILE) as f:
+                set_jwks(json.load(f))
+        else:
+            return False
+    except Exception as e:
+        logger.warning(f"Unable to pre-warm JWKS: {str(e)}")
+        return False
+    logger.info(f"JWKS pre-warmed with {len(_public_keys)} keys")
+    return True
+
 def find_jwk_by_kid(kid):
     """Find the correct JWK by key ID"""
     jwks = get_jwks()
@@ -44,21 +184,96 @@ def find_jwk_by_kid(kid):
             return key
     raise ValueError(f"Unable to find JWK with kid: {kid}")
 
+def get_public_key(kid):
+    """
+    Return the parsed public key for kid. Refreshes the JWKS when the cache
+    has expired (keeping the cached key if that refresh fails) or when kid is
+    unknown (at most once per JWKS_MIN_REFRESH_INTERVAL). Within
+    JWKS_MIN_REFRESH_INTERVAL of a failed fetch nothing is fetched: an
+    expired cache keeps serving its keys and an unknown kid, or a cold cache,
+    is rejected without calling Cognito again.
+    """
+    public_key = _public_keys.get(kid)
+    if public_key is not None:
+        if _jwks_expired() and not _recently_failed():
+            try:
+                refresh_jwks()
+            except Exception as e:
+                logger.warning(f"JWKS refresh failed, using cached keys: {str(e)}")
+            public_key = _public_keys.get(kid, public_key)
+        return public_key
+
+    if not _recently_failed() and (_jwks_cache is None or not _recently_attempted()):
+        refresh_jwks()
+    public_key = _public_keys.get(kid)
+    if public_key is None:
+        raise ValueError(f"Unable to find JWK with kid: {kid}")
+    return public_key
+
+def _cached_claims(cache_key):
+    """Claims of a previously verified token, or None on a miss"""
+    with _token_cache_lock:
+        entry = _token_cache.get(cache_key)
+        if entry is None:
+            _token_cache_stats['misses'] += 1
+            return None
+        cache_until, kid, claims = entry
+        if time.time() >= cache_until:
+            reason = 'expired'
+        elif kid not in _public_keys:
+            reason = 'revoked'
+        else:
+            _token_cache.move_to_end(cache_key)
+            _token_cache_stats['hits'] += 1
+            return dict(claims)
+        del _token_cache[cache_key]
+        _token_cache_stats[reason] += 1
+        _token_cache_stats['misses'] += 1
+        return None
+
+def _cache_claims(cache_key, kid, claims):
+    exp = claims.get('exp')
+    if TOKEN_CACHE_SIZE <= 0 or not isinstance(exp, (int, float)):
+        return
+    with _token_cache_lock:
+        _token_cache[cache_key] = (exp - TOKEN_CACHE_SKEW, kid, claims)
+        _token_cache.move_to_end(cache_key)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+            _token_cache_stats['evictions'] += 1
+
+def token_cache_stats():
+    """Counters of the verified token cache, plus its current size"""
+    with _token_cache_lock:
+        return dict(_token_cache_stats, size=len(_token_cache), capacity=TOKEN_CACHE_SIZE)
+
+def clear_token_cache():
+    with _token_cache_lock:
+        _token_cache.clear()
+        for name in _token_cache_stats:
+            _token_cache_stats[name] = 0
+
 def validate_jwt_token(token):
     """
     Validate JWT token from AWS Cognito
     Returns decoded token payload if valid, raises exception if invalid
     """
+    cache_key = None
+    if TOKEN_CACHE_SIZE > 0:
+        cache_key = hashlib.sha256(token.encode()).digest()
+        claims = _cached_claims(cache_key)
+        if claims is not None:
+            metrics.count('TokenCacheHits')
+            return claims
+        metrics.count('TokenCacheMisses')
+
     try:
         # Decode header to get key ID
         header = jwt.get_unverified_header(token)
         kid = header['kid']
         
-        # Find the correct JWK
-        jwk = find_jwk_by_kid(kid)
-        
-        # Convert JWK to public key
-        public_key = jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(jwk))
+        # Cached public key for this kid
+        public_key = get_public_key(kid)
         
         # Decode and verify token
         decoded_token = jwt.decode(
@@ -69,6 +284,8 @@ def validate_jwt_token(token):
             issuer=f'https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}'
         )
         
+        if cache_key is not None:
+            _cache_claims(cache_key, kid, dict(decoded_token))
         return decoded_token
         
     except ExpiredSignatureError:
@@ -105,21 +322,91 @@ def extract_token_from_event(event):
     
     return token
 
+def authorizer_claims(event):
+    """Claims passed by a Cognito authorizer (REST API) or JWT authorizer (HTTP API), or None"""
+    authorizer = (event.get('requestContext') or {}).get('authorizer') or {}
+    claims = authorizer.get('claims')
+    if claims is None:
+        claims = (authorizer.get('jwt') or {}).get('claims')
+    return claims if isinstance(claims, dict) and claims else None
+
+def _claim_values(value):
+    """A claim that may be a list, or a list flattened to "[a b]" by the HTTP API"""
+    if isinstance(value, list):
+        return [str(v) for v in value]
+    value = str(value or '')
+    if value.startswith('[') and value.endswith(']'):
+        return value[1:-1].split()
+    return [value]
+
+def _expiry(value):
+    """exp as epoch seconds: numeric, or the REST authorizer's "Fri Oct 17 10:00:00 UTC 2026"; None if unknown"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.strptime(str(value), '%a %b %d %H:%M:%S UTC %Y').replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+def check_authorizer_claims(claims):
+    """Raise ValueError unless claims are from our user pool, for our client, and unexpired"""
+    issuer = f'https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}'
+    if claims.get('iss') != issuer:
+        raise ValueError("Invalid token: issuer does not match the user pool")
+    token_use = claims.get('token_use')
+    if token_use not in AUTHORIZER_TOKEN_USES:
+        raise ValueError(f"Invalid token: unsupported token_use {token_use!r}")
+    audience = claims.get('aud') if token_use == 'id' else claims.get('client_id')
+    if COGNITO_CLIENT_ID not in _claim_values(audience):
+        raise ValueError("Invalid token: audience does not match the app client")
+    if not claims.get('sub'):
+        raise ValueError("Invalid token: missing sub")
+    exp = _expiry(claims.get('exp'))
+    if exp is None:
+        raise ValueError("Invalid token: missing exp")
+    if exp <= time.time():
+        raise ValueError("Token has expired")
+
+def authenticate(event):
+    """Claims of the caller: from the authorizer in authorizer mode, else from the verified token"""
+    if AUTH_MODE == 'authorizer':
+        claims = authorizer_claims(event)
+        if claims is not None:
+            check_authorizer_claims(claims)
+            metrics.count('AuthorizerClaims')
+            return claims
+        metrics.count('AuthorizerFallbacks')
+    return validate_jwt_token(extract_token_from_event(event))
+
 def require_jwt_auth(f):
     """
     Decorator to require JWT authentication for Lambda handlers
     Includes security logging and metrics for monitoring
+    Warm pings (see warmup.py) are answered before any of it runs
     """
     @wraps(f)
     def decorated_function(event, context):
+        if warmup.is_warm_ping(event):
+            return warmup.ping_response()
+        with metrics.request(f.__module__), profiling.sample(f.__module__):
+            request_id = getattr(context, 'aws_request_id', None)
+            if request_id:
+                metrics.set_property('RequestId', request_id)
+            response = _authenticate_and_call(event, context)
+            metrics.set_property('StatusCode', response.get('statusCode') if isinstance(response, dict) else None)
+            return response
+
+    def _authenticate_and_call(event, context):
         try:
             # Log authentication attempt with IP if available
             client_ip = event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'unknown')
             logger.info(f"JWT authentication attempt from IP: {client_ip}")
             
-            # Extract and validate token
-            token = extract_token_from_event(event)
-            decoded_token = validate_jwt_token(token)
+            # Extract and validate token (or trust the API's authorizer, see AUTH_MODE)
+            with metrics.phase('AuthTime'):
+                decoded_token = authenticate(event)
             
             # Add user info to event for use in handler
             event['user'] = {
@@ -171,3 +458,5 @@ def require_jwt_auth(f):
             }
     
     return decorated_function
+
+prewarm_jwks()
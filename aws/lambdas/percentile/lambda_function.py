@@ -1,105 +1,239 @@
 import json
 import os
-import math
-import pandas as pd
-from scipy.stats import norm
+import logging
+import encoding
+import metrics
+import microbatch
+import warmup
 from jwt_validator import require_jwt_auth
+from indicators import INDICATORS, get_table, measurement_values, plan
+from references import gestational_weeks, place
+from percentile_engine import (  # noqa: F401
+    age_in_days, calculate_zscore, clear_result_cache, result_cache_stats, score_batch_cached, zscore_to_percentile
+)
 
-data_dir = os.path.join(os.path.dirname(__file__), 'data')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
-# Preload OMS tables (cache between invocations)
-TABLES = {}
+# Upper bound on measurements per batch request
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '5000'))
+
+RESPONSE_HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type,Authorization",
+    "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS"
+}
 
 def load_table(sex):
-    if sex == "male":
-        key = "wfa-boys-zscore-expanded-tables.xlsx"
-    else:
-        key = "wfa-girls-zscore-expanded-tables.xlsx"
-    if key not in TABLES:
-        TABLES[key] = pd.read_excel(os.path.join(data_dir, 'weight', key))
-    return TABLES[key]
-
-def calculate_zscore(value, L, M, S):
-    if L == 0:
-        return math.log(value / M) / S
-    else:
-        return ((value / M) ** L - 1) / (L * S)
-
-def zscore_to_percentile(z):
-    return norm.cdf(z) * 100
+    """Weight-for-age table for sex (see indicators.get_table for other indicators)"""
+    return get_table('wfa', sex)
+
+def json_response(status_code, payload):
+    with metrics.phase('SerializeTime'):
+        body = json.dumps(payload)
+    return {
+        "statusCode": status_code,
+        "headers": dict(RESPONSE_HEADERS),
+        "body": body
+    }
+
+def encoded_response(status_code, payload, name, use_gzip, rows_key=None):
+    """json_response in the negotiated encoding (see encoding.py)"""
+    return encoding.response(status_code, payload, name, use_gzip, RESPONSE_HEADERS, rows_key)
+
+def parse_measurement(body):
+    """
+    Validate one measurement and return (sex, age_days, values), where
+    values maps each measurement field present (weight, height, ...) to a float.
+    """
+    date_birth = body.get('date_birth')
+    date_measurement = body.get('date_measurement')
+    sex = body.get('sex')
+    values = measurement_values(body)
+    if not all([date_birth, date_measurement, sex]) or not values:
+        raise ValueError("Missing one or more required fields")
+    if sex not in ("male", "female"):
+        raise ValueError("Sex must be 'male' or 'female'")
+    return sex, age_in_days(date_birth, date_measurement), values
+
+def parse_placement(body, age_days):
+    """Reference standard and age to score a measurement at (see references.py)"""
+    standard = body.get('standard') or None
+    if standard is not None and not isinstance(standard, str):
+        raise ValueError("standard must be a string")
+    return place(age_days, gestational_weeks(body.get('gestational_age_weeks')), standard)
+
+def score_measurements(measurements):
+    """
+    Score every applicable indicator of a batch of measurements in one
+    vectorized pass. Invalid items get their own error entry, indicators that
+    cannot be scored get theirs, and results keep the input order.
+    """
+    metrics.count('BatchSize', len(measurements))
+    with metrics.phase('PlanTime'):
+        results, rows = _plan_measurements(measurements)
+
+    with metrics.phase('ScoreTime'):
+        scored, hits = microbatch.score([r[2] for r in rows], [r[3] for r in rows], [r[4] for r in rows])
+    metrics.count('ResultCacheHits', hits)
+    metrics.count('ResultCacheMisses', len(rows) - hits)
+    stats = result_cache_stats()
+    logger.info(
+        f"Result cache: {hits}/{len(rows)} hits this request, "
+        f"{stats['hits']} hits / {stats['misses']} misses in this container"
+    )
+    with metrics.phase('FormatTime'):
+        _format_results(results, rows, scored)
+    return results
+
+def _plan_measurements(measurements):
+    """Validate every measurement; returns (results with errors filled in, rows to score)"""
+    results = [None] * len(measurements)
+    rows = []
+    for i, item in enumerate(measurements):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Measurement must be an object")
+            sex, age_days, values = parse_measurement(item)
+            placement = parse_placement(item, age_days)
+            item_rows, errors = plan(sex, age_days, values, placement)
+        except Exception as e:
+            results[i] = {"index": i, "error": str(e), "success": False}
+            continue
+        results[i] = {
+            "index": i,
+            "standard": placement.standard.code,
+            "indicators": {code: {"error": error, "success": False} for code, error in errors.items()},
+            "success": True
+        }
+        if placement.corrected_days is not None:
+            results[i]["corrected_age_days"] = placement.corrected_days
+        rows.extend((i,) + row for row in item_rows)
+    return results, rows
+
+def _format_results(results, rows, scored):
+    for (i, code, value, table, x), (zscore, percentile, (L, M, S)) in zip(rows, scored):
+        result = {
+            "percentile": round(percentile, 2),
+            "zscore": zscore,
+            "LMS": {"L": L, "M": M, "S": S}
+        }
+        results[i]["indicators"][code] = {
+            "name": INDICATORS[code].name,
+            "value": value,
+            "unit": INDICATORS[code].unit,
+            **result,
+            "success": True
+        }
+        if code == 'wfa':
+            # Top-level fields keep the original weight-for-age contract
+            results[i].update(result)
+    for result in results:
+        if "indicators" in result:
+            indicators = result["indicators"]
+            result["indicators"] = {code: indicators[code] for code in INDICATORS if code in indicators}
+
+def columnar_results(results):
+    """
+    Batch results as parallel arrays, one entry per measurement: top-level
+    success/error, then per indicator value/percentile/zscore/L/M/S/error
+    (None where the measurement has no such entry).
+    """
+    count = len(results)
+    columns = {
+        "success": [r["success"] for r in results],
+        "error": [r.get("error") for r in results],
+        "standard": [r.get("standard") for r in results],
+    }
+    indicators = {}
+    for i, result in enumerate(results):
+        for code, entry in result.get("indicators", {}).items():
+            if code not in indicators:
+                indicators[code] = {
+                    "name": INDICATORS[code].name,
+                    "unit": INDICATORS[code].unit,
+                    **{field: [None] * count for field in ("value", "percentile", "zscore", "L", "M", "S", "error")},
+                }
+            column = indicators[code]
+            if entry["success"]:
+                column["value"][i] = entry["value"]
+                column["percentile"][i] = entry["percentile"]
+                column["zscore"][i] = entry["zscore"]
+                for name in ("L", "M", "S"):
+                    column[name][i] = entry["LMS"][name]
+            else:
+                column["error"][i] = entry["error"]
+    columns["indicators"] = {code: indicators[code] for code in INDICATORS if code in indicators}
+    return columns
 
 @require_jwt_auth
 def lambda_handler(event, context):
     """
-    Lambda handler to compute weight percentile from OMS tables.
+    Lambda handler to compute growth percentiles from OMS tables.
     Expects:
-      - weight (kg)
+      - one or more of weight (kg), height (cm), head_circumference (cm), bmi
       - date_birth, date_measurement (YYYY-MM-DD)
       - sex ('male' or 'female')
+    Optional per measurement: gestational_age_weeks (preterm babies are
+    scored on Fenton, then at corrected age) and standard (see references.py).
+    Every applicable indicator is scored and returned under "indicators";
+    weight-for-age is also returned at the top level (percentile, zscore, LMS).
+    Or, in batch mode, a "measurements" array of such objects (mixed sexes
+    and dates allowed), scored in one pass with one result per item.
+    Optional: "format" (see encoding.py; "columnar" applies to batches) and
+    "echo": true to get the request back under "input".
     """
     try:
         # Parse event body if it's a string (API Gateway)
         if isinstance(event.get("body"), str):
-            body = json.loads(event["body"])
+            with metrics.phase('ParseTime'):
+                body = encoding.request_body(event)
         else:
             body = event
-            
-        # Basic validation   
-        weight = float(body.get('weight'))
-        date_birth = body.get('date_birth')
-        date_measurement = body.get('date_measurement')
-        sex = body.get('sex')
-        if not all([weight, date_birth, date_measurement, sex]):
-            raise ValueError("Missing one or more required fields")
-        if sex not in ("male", "female"):
-            raise ValueError("Sex must be 'male' or 'female'")
-
-        # Load table and calculate age
-        df = load_table(sex)
-        age_days = (pd.to_datetime(date_measurement) - pd.to_datetime(date_birth)).days
-
-        # Find exact or closest row
-        row = df.loc[df['Day'] == age_days]
-        if row.empty:
-            # Find the closest age if the exact day is not present
-            idx = (df['Day'] - age_days).abs().idxmin()
-            row = df.loc[[idx]]
-
-        L, M, S = float(row['L'].iloc[0]), float(row['M'].iloc[0]), float(row['S'].iloc[0])
-    
-        zscore = calculate_zscore(weight, L, M, S)
-        percentile = round(zscore_to_percentile(zscore), 2)
-
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization",
-                "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS"
-            },
-            "body": json.dumps({
-                "input": body,
-                "percentile": percentile,
-                "zscore": zscore,
-                "LMS": {"L": L, "M": M, "S": S},
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        echo = {"input": body} if body.get("echo") is True else {}
+        name, use_gzip = encoding.negotiate(event, body.get("format"))
+
+        if "measurements" in body:
+            measurements = body["measurements"]
+            if not isinstance(measurements, list):
+                raise ValueError("'measurements' must be an array")
+            if len(measurements) > MAX_BATCH_SIZE:
+                raise ValueError(f"Batch exceeds {MAX_BATCH_SIZE} measurements")
+            results = score_measurements(measurements)
+            failed = sum(1 for r in results if not r["success"])
+            payload = {
+                **echo,
+                "count": len(results),
+                "failed": failed,
                 "user_id": event.get('user', {}).get('sub'),
                 "success": True
-            })
-        }
+            }
+            if name == "columnar":
+                with metrics.phase('FormatTime'):
+                    payload["columns"] = columnar_results(results)
+            else:
+                payload["results"] = results
+            return encoded_response(200, payload, name, use_gzip, rows_key="results")
+
+        result = score_measurements([body])[0]
+        if not result["success"]:
+            raise ValueError(result["error"])
+        del result["index"]
+
+        return encoded_response(200, {
+            **echo,
+            **result,
+            "user_id": event.get('user', {}).get('sub'),
+            "success": True
+        }, "json" if name == "columnar" else name, use_gzip)
     except Exception as e:
-        return {
-            "statusCode": 400,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization",
-                "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS"
-            },
-            "body": json.dumps({
-                "input": body if 'body' in locals() else event,
-                "error": str(e),
-                "success": False
-            })
-        }
+        return json_response(400, {
+            **(echo if 'echo' in locals() else {}),
+            "error": str(e),
+            "success": False
+        })
 
+warmup.warm_on_init()
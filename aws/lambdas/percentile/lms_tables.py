@@ -0,0 +1,219 @@
+"""
+Precompiled LMS table artifact for the percentile Lambda.
+
+The WHO expanded tables are compiled once by build_tables.py into a single
+binary file (data/lms_tables.bin) that is memory-mapped at import time, so
+cold containers never parse the xlsx sources. The other reference standards
+(see references.py) are compiled the same way into one pack each under
+data/packs/, from xlsx or CSV sources.
+
+File layout (little-endian):
+  header     MAGIC, format version, table count, CRC32 of the payload, payload size
+  directory  one entry per table: indicator, sex, index column, row count,
+             offset and grid step (0 when the index is not evenly spaced)
+  payload    per table, four contiguous float64 columns: index (x), L, M, S
+"""
+
+import csv
+import mmap
+import os
+import re
+import struct
+import zlib
+from collections import namedtuple
+
+MAGIC = b'UPNLMS\x00\x00'
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct('<8sHHII')
+ENTRY = struct.Struct('<16s8s8sIId')
+COLUMNS = ('x', 'L', 'M', 'S')
+
+ARTIFACT_PATH = os.path.join(os.path.dirname(__file__), 'data', 'lms_tables.bin')
+PACK_DIR = os.path.join(os.path.dirname(__file__), 'data', 'packs')
+
+# WHO source naming: <indicator>-<boys|girls>-zscore-expanded-table[s].xlsx
+SOURCE_PATTERN = re.compile(r'^(?P<indicator>[a-z]+)-(?P<sex>boys|girls)-zscore-expanded-tables?\.xlsx$')
+SEXES = {'boys': 'male', 'girls': 'female'}
+
+# Pack sources: <indicator>-<boys|girls>[-anything].<xlsx|csv>, e.g. the WHO
+# 2007 files hfa-boys-z-who-2007-exp.xlsx or a converted fenton/wfa-girls.csv
+PACK_SOURCE_PATTERN = re.compile(r'^(?P<indicator>[a-z]+)-(?P<sex>boys|girls)(?:-[\w.-]+)?\.(?P<format>xlsx|csv)$')
+# Source file prefixes that differ from the indicator codes of indicators.py
+# (WHO 2007 hfa/bmi files, and plain names for converted preterm charts)
+INDICATOR_ALIASES = {'hfa': 'lhfa', 'bmi': 'bfa', 'weight': 'wfa', 'length': 'lhfa', 'hc': 'hcfa'}
+
+# Relative tolerance when deciding whether an index column is an even grid
+GRID_TOLERANCE = 1e-6
+
+# One LMS reference table. x is the index column (age in days, or length/height
+# in cm) and every column is a read-only float64 view over the mapped file.
+# step is the grid spacing of x when it is evenly spaced (dense), else 0.0.
+# standard is the reference standard of a pack table, None for the WHO 0-5 tables.
+LMSTable = namedtuple('LMSTable', ['indicator', 'sex', 'index_name', 'x', 'L', 'M', 'S', 'step', 'standard'],
+                      defaults=(None,))
+
+
+class ArtifactError(ValueError):
+    """Raised when the compiled table artifact is missing, stale or corrupt"""
+
+
+def _pad(value, size):
+    encoded = value.encode('ascii')
+    if len(encoded) > size:
+        raise ValueError(f"'{value}' does not fit in {size} bytes")
+    return encoded.ljust(size, b'\x00')
+
+
+def _unpad(raw):
+    return raw.rstrip(b'\x00').decode('ascii')
+
+
+def grid_step(xs):
+    """Spacing of xs if it is an evenly spaced ascending grid, else 0.0"""
+    if len(xs) < 2:
+        return 0.0
+    start = xs[0]
+    step = (xs[-1] - start) / (len(xs) - 1)
+    if step <= 0:
+        return 0.0
+    tolerance = step * GRID_TOLERANCE
+    for i, x in enumerate(xs):
+        if abs(x - (start + i * step)) > tolerance:
+            return 0.0
+    return step
+
+
+def pack_tables(tables):
+    """
+    Serialize an iterable of LMSTable or (indicator, sex, index_name, x, L, M, S)
+    tuples. Column values may be any sequence of numbers; they are stored as
+    float64 and the grid step is recomputed from x.
+    """
+    tables = sorted(tables, key=lambda t: (t[0], t[1]))
+    directory_size = ENTRY.size * len(tables)
+    data_start = HEADER.size + directory_size
+    data_start += -data_start % 8
+
+    entries = []
+    blocks = []
+    offset = data_start
+    for table in tables:
+        indicator, sex, index_name, *columns = table[:3 + len(COLUMNS)]
+        rows = len(columns[0])
+        if any(len(column) != rows for column in columns):
+            raise ValueError(f"Ragged columns in table {indicator}/{sex}")
+        entries.append(ENTRY.pack(
+            _pad(indicator, 16), _pad(sex, 8), _pad(index_name, 8), rows, offset, grid_step(columns[0])
+        ))
+        for column in columns:
+            blocks.append(struct.pack(f'<{rows}d', *column))
+        offset += rows * 8 * len(COLUMNS)
+
+    payload = b''.join(entries).ljust(data_start - HEADER.size, b'\x00') + b''.join(blocks)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(tables), zlib.crc32(payload), len(payload))
+    return header + payload
+
+
+def read_tables(buffer, verify=True, standard=None):
+    """
+    Build LMSTable views over an artifact buffer (bytes or mmap) without copying.
+    Returns a dict keyed by (indicator, sex).
+    """
+    view = memoryview(buffer)
+    if len(view) < HEADER.size:
+        raise ArtifactError("Table artifact is truncated")
+    magic, version, count, checksum, payload_size = HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ArtifactError("Not an LMS table artifact")
+    if version != FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported table artifact version {version}, expected {FORMAT_VERSION}")
+    if len(view) != HEADER.size + payload_size:
+        raise ArtifactError("Table artifact is truncated")
+    if verify and zlib.crc32(view[HEADER.size:]) != checksum:
+        raise ArtifactError("Table artifact checksum mismatch")
+
+    tables = {}
+    for i in range(count):
+        indicator, sex, index_name, rows, offset, step = ENTRY.unpack_from(view, HEADER.size + i * ENTRY.size)
+        columns = []
+        for c in range(len(COLUMNS)):
+            start = offset + c * rows * 8
+            columns.append(view[start:start + rows * 8].cast('d'))
+        key = (_unpad(indicator), _unpad(sex))
+        tables[key] = LMSTable(key[0], key[1], _unpad(index_name), *columns, step, standard)
+    return tables
+
+
+def find_sources(root):
+    """Yield (indicator, sex, path) for every WHO source table under root"""
+    for dirpath, _, filenames in sorted(os.walk(root)):
+        for filename in sorted(filenames):
+            match = SOURCE_PATTERN.match(filename)
+            if match:
+                yield match['indicator'], SEXES[match['sex']], os.path.join(dirpath, filename)
+
+
+def find_pack_sources(root):
+    """Yield (indicator, sex, path) for every pack source table under root"""
+    for dirpath, _, filenames in sorted(os.walk(root)):
+        for filename in sorted(filenames):
+            match = PACK_SOURCE_PATTERN.match(filename)
+            if match:
+                indicator = INDICATOR_ALIASES.get(match['indicator'], match['indicator'])
+                yield indicator, SEXES[match['sex']], os.path.join(dirpath, filename)
+
+
+def read_csv_table(indicator, sex, path):
+    """Parse one CSV source table: the first column is the index, L, M and S are read by name"""
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        index_name = reader.fieldnames[0]
+        rows = [row for row in reader if row[index_name].strip()]
+    x = [float(row[index_name]) for row in rows]
+    columns = [[float(row[name]) for row in rows] for name in ('L', 'M', 'S')]
+    return LMSTable(indicator, sex, index_name, x, *columns, grid_step(x))
+
+
+def read_source_table(indicator, sex, path):
+    """read_csv_table or read_xlsx_table, by file extension"""
+    if path.endswith('.csv'):
+        return read_csv_table(indicator, sex, path)
+    return read_xlsx_table(indicator, sex, path)
+
+
+def read_xlsx_table(indicator, sex, path):
+    """
+    Parse one WHO source table with pandas (imported lazily, build and
+    fallback path only). The first column is the index: Day, Length or Height.
+    """
+    import pandas as pd
+
+    df = pd.read_excel(path)
+    index_name = df.columns[0]
+    x = df[index_name].astype(float).tolist()
+    return LMSTable(
+        indicator,
+        sex,
+        index_name,
+        x,
+        df['L'].astype(float).tolist(),
+        df['M'].astype(float).tolist(),
+        df['S'].astype(float).tolist(),
+        grid_step(x),
+    )
+
+
+def pack_path(code):
+    """Path of the compiled pack of a reference standard"""
+    return os.path.join(PACK_DIR, f'{code}.bin')
+
+
+def load_artifact(path=ARTIFACT_PATH, verify=True, standard=None):
+    """Memory-map the compiled artifact and return its tables keyed by (indicator, sex)"""
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise ArtifactError(f"Unable to map table artifact {path}: {e}")
+    return read_tables(mapped, verify=verify, standard=standard)
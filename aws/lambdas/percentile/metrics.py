@@ -0,0 +1,167 @@
+"""
+Per-request latency metrics in CloudWatch Embedded Metric Format (EMF).
+
+A handler invocation opens a request scope (require_jwt_auth does this for
+the API handlers). Code on the request path times its phases with
+
+    with metrics.phase('ScoreTime'):
+        ...
+
+and adds counters with metrics.count('TokenCacheHits'). When the scope
+closes, one EMF JSON line with every metric, the cold-start flag and the
+status code is written to stdout, where CloudWatch Logs extracts the
+metrics: no API calls and no extra latency.
+
+Outside a request scope, or with METRICS_ENABLED=false, phase() returns a
+shared no-op context manager and count() returns immediately.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'UpNest/Percentile')
+
+DIMENSIONS = [['Handler'], ['Handler', 'ColdStart']]
+
+_local = threading.local()
+_cold_start = True
+_cold_start_lock = threading.Lock()
+
+# Measured during init (table load, ...), reported with the first request
+_init_metrics = {}
+
+
+class _Scope:
+    __slots__ = ('handler', 'values', 'units', 'properties')
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.values = {}
+        self.units = {}
+        self.properties = {}
+
+    def add(self, name, value, unit):
+        self.values[name] = self.values.get(name, 0) + value
+        self.units[name] = unit
+
+
+class _NoOp:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoOp()
+
+
+class _Phase:
+    __slots__ = ('scope', 'name', 'start')
+
+    def __init__(self, scope, name):
+        self.scope = scope
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # Repeated phases (one per chunk, ...) add up
+        self.scope.add(self.name, (time.perf_counter() - self.start) * 1000, 'Milliseconds')
+        return False
+
+
+def current():
+    """The active request scope of this thread, or None"""
+    return getattr(_local, 'scope', None)
+
+
+def phase(name):
+    """Context manager timing a phase of the current request, in milliseconds"""
+    scope = getattr(_local, 'scope', None) if METRICS_ENABLED else None
+    if scope is None:
+        return _NOOP
+    return _Phase(scope, name)
+
+
+def count(name, value=1, unit='Count'):
+    """Add value to a counter of the current request"""
+    if not METRICS_ENABLED:
+        return
+    scope = getattr(_local, 'scope', None)
+    if scope is not None:
+        scope.add(name, value, unit)
+
+
+def set_property(name, value):
+    """Attach a non-metric field (searchable in Logs Insights) to the current request"""
+    scope = getattr(_local, 'scope', None)
+    if scope is not None:
+        scope.properties[name] = value
+
+
+def record_init(name, milliseconds):
+    """Record an init-time duration, reported with the first request of the container"""
+    _init_metrics[name] = milliseconds
+
+
+def _take_cold_start():
+    global _cold_start
+    with _cold_start_lock:
+        cold, _cold_start = _cold_start, False
+    return cold
+
+
+def emf_document(scope, cold_start, timestamp=None):
+    """The EMF log record for a finished request scope"""
+    metrics = [{'Name': name, 'Unit': scope.units[name]} for name in scope.values]
+    document = {
+        '_aws': {
+            'Timestamp': int((timestamp or time.time()) * 1000),
+            'CloudWatchMetrics': [{'Namespace': METRICS_NAMESPACE, 'Dimensions': DIMENSIONS, 'Metrics': metrics}],
+        },
+        'Handler': scope.handler,
+        'ColdStart': 'true' if cold_start else 'false',
+    }
+    document.update(scope.properties)
+    document.update({name: round(value, 3) for name, value in scope.values.items()})
+    return document
+
+
+def emit(document):
+    sys.stdout.write(json.dumps(document, separators=(',', ':'), default=str) + '\n')
+    sys.stdout.flush()
+
+
+@contextmanager
+def request(handler):
+    """
+    Request scope for one invocation of handler. Nested scopes (a handler
+    calling another) are absorbed by the outer one.
+    """
+    if not METRICS_ENABLED or getattr(_local, 'scope', None) is not None:
+        yield current()
+        return
+    scope = _Scope(handler)
+    _local.scope = scope
+    start = time.perf_counter()
+    try:
+        yield scope
+    finally:
+        _local.scope = None
+        scope.add('TotalTime', (time.perf_counter() - start) * 1000, 'Milliseconds')
+        cold_start = _take_cold_start()
+        if cold_start:
+            for name, value in _init_metrics.items():
+                scope.add(name, value, 'Milliseconds')
+            _init_metrics.clear()
+        emit(emf_document(scope, cold_start))
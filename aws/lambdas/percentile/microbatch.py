@@ -0,0 +1,211 @@
+"""
+Adaptive micro-batching of concurrent scoring calls in the long-running
+server mode (aws/tools/local_server.py --microbatch).
+
+In Lambda each container handles one request at a time, so there is nothing
+to batch and this module stays disabled: score() is score_batch_cached. A
+threaded server handles many single-measurement requests at once. With a
+Collector enabled, concurrent score() calls join an open batch; the last
+active caller to join (or the one that brings it to MICROBATCH_MAX_ROWS
+rows) scores the whole batch as one score_batch_cached call, vectorized
+once it reaches VECTORIZE_MIN_BATCH rows, and wakes every other caller with
+its own slice. No caller waits more than MICROBATCH_WINDOW_US: one that
+times out scores the batch it is in itself.
+
+The batching adapts to load, and to whether it pays off. A thread counts as
+an active caller for ACTIVE_WINDOWS windows after its last call; with one
+active caller, calls are scored inline, so idle latency does not grow.
+Calls are counted in epochs of EPOCH_CALLS, each either batched or inline,
+and the collector keeps to the mode that completes more calls per second
+(batching must win by BATCHING_MARGIN), re-trying the other mode every
+EXPLORE_EVERY epochs. Under CPython's GIL the wake-ups of the waiting
+callers tend to cost more than the shared scoring call saves
+(aws/benchmarks/bench_microbatch.py), in which case the collector settles on
+inline scoring.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from percentile_engine import score_batch_cached
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+MICROBATCH_ENABLED = os.environ.get('MICROBATCH_ENABLED', 'false').lower() in ('1', 'true', 'yes', 'on')
+MICROBATCH_WINDOW_US = int(os.environ.get('MICROBATCH_WINDOW_US', '1000'))
+MICROBATCH_MAX_ROWS = int(os.environ.get('MICROBATCH_MAX_ROWS', '256'))
+
+# A thread counts as an active caller this many windows after its last call
+ACTIVE_WINDOWS = 10
+# Calls per epoch, the factor by which batched epochs must beat inline ones
+# in calls per second, and how often the losing mode gets another epoch
+EPOCH_CALLS = 256
+BATCHING_MARGIN = 1.05
+EXPLORE_EVERY = 8
+
+
+class _Call:
+    """One caller's rows, and its results once its batch has been scored"""
+
+    __slots__ = ('values', 'tables', 'xs', 'results', 'hits', 'error', 'ready')
+
+    def __init__(self):
+        # Held by the caller; whoever scores its batch releases it when the results are in
+        self.ready = threading.Lock()
+        self.ready.acquire()
+
+    def submit(self, values, tables, xs):
+        self.values, self.tables, self.xs = values, tables, xs
+        self.results = self.error = None
+        self.hits = 0
+
+
+class Collector:
+    """Collects concurrent score() calls into shared score_batch_cached calls"""
+
+    def __init__(self, window_us=MICROBATCH_WINDOW_US, max_rows=MICROBATCH_MAX_ROWS, score=score_batch_cached,
+                 epoch_calls=EPOCH_CALLS):
+        self.window = window_us / 1e6
+        self.max_rows = max_rows
+        self.epoch_calls = epoch_calls
+        self._score = score
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._open = []
+        self._open_rows = 0
+        # Thread ident -> time of its last call, pruned every ACTIVE_WINDOWS windows
+        self._callers = {}
+        self._pruned = time.perf_counter()
+        # The first epoch batches; calls per second of each mode, once measured
+        self.batching = True
+        self._rates = {True: None, False: None}
+        self._epochs = 0
+        self._epoch_calls = 0
+        self._epoch_start = self._pruned
+        self.stats = {'inline': 0, 'batches': 0, 'requests': 0, 'rows': 0, 'batching_epochs': 0, 'inline_epochs': 0}
+
+    def score(self, values, tables, xs):
+        """score_batch_cached(values, tables, xs), possibly as part of a larger batch"""
+        with self._lock:
+            now = time.perf_counter()
+            self._callers[threading.get_ident()] = now
+            horizon = ACTIVE_WINDOWS * self.window
+            if now - self._pruned > horizon:
+                self._callers = {ident: last for ident, last in self._callers.items() if now - last <= horizon}
+                self._pruned = now
+            self._epoch_calls += 1
+            if self._epoch_calls >= self.epoch_calls:
+                self._end_epoch(now)
+            if not self.batching or len(self._callers) <= 1 or len(values) >= self.max_rows:
+                self.stats['inline'] += 1
+                batch = None
+                call = None
+            else:
+                call = getattr(self._local, 'call', None)
+                if call is None:
+                    call = self._local.call = _Call()
+                call.submit(values, tables, xs)
+                self._open.append(call)
+                self._open_rows += len(values)
+                # The last active caller to join closes the batch and scores it
+                batch = self._close() if len(self._open) >= len(self._callers) or \
+                    self._open_rows >= self.max_rows else None
+        if call is None:
+            return self._score(values, tables, xs)
+        if batch is not None:
+            self._run_batch(batch)
+        elif not call.ready.acquire(timeout=self.window):
+            # Nobody closed it in time: the caller still waiting scores the batch itself
+            with self._lock:
+                batch = self._close() if call in self._open else None
+            if batch is not None:
+                self._run_batch(batch)
+            else:
+                call.ready.acquire()
+        # The lock is held again, ready for the caller's next call
+        if call.error is not None:
+            raise call.error
+        return call.results, call.hits
+
+    def _end_epoch(self, now):
+        """Record the epoch's calls per second and pick the next epoch's mode (called with the lock held)"""
+        rate = self._epoch_calls / max(now - self._epoch_start, 1e-9)
+        previous = self._rates[self.batching]
+        self._rates[self.batching] = rate if previous is None else (previous + rate) / 2
+        self.stats['batching_epochs' if self.batching else 'inline_epochs'] += 1
+        self._epochs += 1
+        self._epoch_calls = 0
+        self._epoch_start = now
+        batched, inline = self._rates[True], self._rates[False]
+        # Until inline scoring has been measured too, the next epoch tries it
+        best = inline is not None and batched > inline * BATCHING_MARGIN
+        self.batching = not best if self._epochs % EXPLORE_EVERY == 0 else best
+
+    def _close(self):
+        """Take the open batch (called with the lock held)"""
+        batch, self._open, self._open_rows = self._open, [], 0
+        self.stats['batches'] += 1
+        self.stats['requests'] += len(batch)
+        self.stats['rows'] += sum(len(call.values) for call in batch)
+        return batch
+
+    def _run_batch(self, calls):
+        if len(calls) == 1:
+            values, tables, xs = calls[0].values, calls[0].tables, calls[0].xs
+        else:
+            values = [value for call in calls for value in call.values]
+            tables = [table for call in calls for table in call.tables]
+            xs = [x for call in calls for x in call.xs]
+        try:
+            results, hits = self._score(values, tables, xs)
+        except Exception as e:
+            results, hits, error = None, 0, e
+        else:
+            error = None
+        start = 0
+        me = getattr(self._local, 'call', None)
+        for call in calls:
+            end = start + len(call.values)
+            call.error = error
+            call.results = results[start:end] if error is None else None
+            # Cache hits of the batch, apportioned to the callers by rows
+            call.hits = (hits * end // len(values) - hits * start // len(values)) if values and error is None else 0
+            start = end
+            if call is not me:
+                call.ready.release()
+
+
+_collector = None
+
+
+def enable(window_us=MICROBATCH_WINDOW_US, max_rows=MICROBATCH_MAX_ROWS):
+    """Batch concurrent requests from now on (the server calls this before serving)"""
+    global _collector
+    disable()
+    _collector = Collector(window_us, max_rows)
+    logger.info(f"Micro-batching enabled: window up to {window_us} us, up to {max_rows} rows")
+    return _collector
+
+
+def disable():
+    global _collector
+    _collector = None
+
+
+def collector():
+    return _collector
+
+
+def score(values, tables, xs):
+    """score_batch_cached, through the collector when enabled"""
+    current = _collector
+    if current is None:
+        return score_batch_cached(values, tables, xs)
+    return current.score(values, tables, xs)
+
+
+if MICROBATCH_ENABLED:
+    enable()
@@ -0,0 +1,157 @@
+"""
+Sampled CPU and memory profiling of handler invocations.
+
+With PROFILE_SAMPLE_RATE > 0 (1 profiles every invocation), a sampled
+invocation runs under cProfile and tracemalloc and a compact summary is
+logged: wall time, the functions with the highest cumulative time and the
+peak traced memory with its top allocation sites. With PROFILE_DIR set, the
+raw cProfile stats (.prof, readable with pstats or snakeviz) and the summary
+(.json) are also written there.
+
+require_jwt_auth profiles the API handlers; other handlers wrap their body
+in `with profiling.sample(__name__):`. Unsampled invocations only pay a
+float comparison (and one random() call when the rate is between 0 and 1).
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    import metrics
+except ImportError:
+    # Imported as aws.lambdas.percentile.profiling (tests, tools)
+    from . import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '')
+PROFILE_TOP = int(os.environ.get('PROFILE_TOP', '15'))
+PROFILE_MEMORY = os.environ.get('PROFILE_MEMORY', 'true').lower() not in ('0', 'false', 'no', 'off')
+
+_NOOP = nullcontext()
+
+# cProfile and tracemalloc are process-wide in practice: one sampled invocation at a time
+_profile_lock = threading.Lock()
+
+
+def sample(name):
+    """Context manager profiling this invocation of handler name when it is sampled"""
+    rate = PROFILE_SAMPLE_RATE
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return _NOOP
+    if not _profile_lock.acquire(blocking=False):
+        return _NOOP
+    return _Profile(name)
+
+
+class _Profile:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        import cProfile
+        import tracemalloc
+
+        self.tracing = False
+        self.profiler = None
+        try:
+            self.tracing = PROFILE_MEMORY and not tracemalloc.is_tracing()
+            if self.tracing:
+                tracemalloc.start()
+            profiler = cProfile.Profile()
+            self.start = time.perf_counter()
+            profiler.enable()
+            self.profiler = profiler
+        except Exception as e:
+            # e.g. another profiler is active: run unprofiled, and let the next sample try again
+            if self.tracing:
+                tracemalloc.stop()
+            _profile_lock.release()
+            logger.warning(f"Unable to start profiling: {str(e)}")
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler is None:
+            return False
+        self.profiler.disable()
+        wall_ms = (time.perf_counter() - self.start) * 1000
+        try:
+            snapshot = peak = None
+            if self.tracing:
+                import tracemalloc
+                _, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+            summary = summarize(self.name, wall_ms, self.profiler, snapshot, peak)
+            metrics.set_property('Profiled', True)
+            write(summary, self.profiler)
+        except Exception as e:
+            # Profiling never fails the invocation
+            logger.warning(f"Unable to write profile: {str(e)}")
+        finally:
+            _profile_lock.release()
+        return False
+
+
+def _location(filename, line, function=None):
+    location = f"{os.path.basename(filename)}:{line}"
+    return f"{location}({function})" if function else location
+
+
+def summarize(name, wall_ms, profiler, snapshot=None, peak=None, top=None):
+    """Compact JSON-serializable summary of one profiled invocation"""
+    import pstats
+
+    top = PROFILE_TOP if top is None else top
+    stats = pstats.Stats(profiler).stats
+    functions = sorted(stats.items(), key=lambda entry: entry[1][3], reverse=True)[:top]
+    summary = {
+        'handler': name,
+        'wallMs': round(wall_ms, 3),
+        'functions': [
+            {
+                'function': _location(filename, line, function),
+                'calls': calls,
+                'ownMs': round(own * 1000, 3),
+                'cumulativeMs': round(cumulative * 1000, 3),
+            }
+            for (filename, line, function), (_, calls, own, cumulative, _) in functions
+        ],
+    }
+    if snapshot is not None:
+        import tracemalloc
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        summary['memory'] = {
+            'peakBytes': peak,
+            'top': [
+                {'location': _location(stat.traceback[0].filename, stat.traceback[0].lineno),
+                 'bytes': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:top]
+            ],
+        }
+    return summary
+
+
+def write(summary, profiler=None):
+    """Log the summary; with PROFILE_DIR, also save it and the raw stats there"""
+    logger.info(f"Profile: {json.dumps(summary, separators=(',', ':'))}")
+    if not PROFILE_DIR:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{summary['handler']}-{time.time_ns()}-{os.getpid()}")
+    with open(base + '.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+    if profiler is not None:
+        profiler.dump_stats(base + '.prof')
+    return base
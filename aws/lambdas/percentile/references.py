@@ -0,0 +1,200 @@
+"""
+Registry of growth reference standards and the choice of standard per measurement.
+
+The WHO Child Growth Standards (0-5 years) are the default and stay mapped
+from data/lms_tables.bin at import (see indicators.py). Every other standard
+is compiled by build_tables.py --standard CODE into its own pack,
+data/packs/<code>.bin, in the same artifact format. A pack is mapped on the
+first measurement that needs it and kept in an LRU bounded by
+PACK_MEMORY_BUDGET_MB, so the Lambda memory setting does not have to grow
+with the number of standards installed. A pack that is not installed is
+reported per indicator, like a missing WHO table.
+
+Standards index their tables by age in their own unit: days (WHO 0-5),
+months (WHO 5-19, CDC 2-20) or weeks of postmenstrual age (Fenton). A measurement is scored on:
+  - Fenton, for a preterm baby (gestational_age_weeks below 37) up to 50
+    weeks postmenstrual age
+  - else the requested standard ("standard"), when it covers the age
+  - else WHO 0-5 up to 1856 days and WHO 5-19 after that
+Past Fenton, a preterm baby's age is corrected for prematurity (age minus
+40 weeks less the gestational age) until 2 years of chronological age.
+Fenton and WHO 5-19 are only chosen automatically when their pack is
+installed; otherwise WHO 0-5 scores the measurement as it always has.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import metrics
+from lms_tables import ARTIFACT_PATH, ArtifactError, load_artifact, pack_path
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+PACK_MEMORY_BUDGET_MB = float(os.environ.get('PACK_MEMORY_BUDGET_MB', '32'))
+
+DAYS_PER_WEEK = 7
+DAYS_PER_MONTH = 30.4375
+
+# Gestational ages (weeks) accepted, below which a birth is preterm, and term
+MIN_GESTATION_WEEKS = 22
+MAX_GESTATION_WEEKS = 44
+PRETERM_WEEKS = 37
+TERM_WEEKS = 40
+# Age is corrected for prematurity until this chronological age
+CORRECT_AGE_UNTIL_DAYS = 730
+
+# first and last are the age range covered, in unit; basis is 'age' (since
+# birth) or 'postmenstrual' (gestational age at birth plus age)
+Standard = namedtuple('Standard', ['code', 'name', 'artifact', 'unit', 'unit_days', 'first', 'last', 'basis'])
+
+DEFAULT_STANDARD = 'who-0-5'
+
+STANDARDS = {
+    standard.code: standard for standard in (
+        Standard('who-0-5', 'WHO Child Growth Standards (0-5 years)', ARTIFACT_PATH, 'days', 1, 0, 1856, 'age'),
+        Standard('who-5-19', 'WHO Growth Reference (5-19 years)', pack_path('who-5-19'), 'months',
+                 DAYS_PER_MONTH, 61, 228, 'age'),
+        Standard('cdc-2-20', 'CDC Growth Charts (2-20 years)', pack_path('cdc-2-20'), 'months',
+                 DAYS_PER_MONTH, 24, 240.5, 'age'),
+        Standard('fenton', 'Fenton Preterm Growth Charts (2013)', pack_path('fenton'), 'weeks',
+                 DAYS_PER_WEEK, 22, 50, 'postmenstrual'),
+    )
+}
+
+# Standards chosen by age alone, in order
+AGE_STANDARDS = ('who-0-5', 'who-5-19')
+
+# Where a measurement is scored: x is the table index (age in standard.unit),
+# age_days the age in days used for length/height routing, corrected_days the
+# age corrected for prematurity (None when not corrected)
+Placement = namedtuple('Placement', ['standard', 'x', 'age_days', 'corrected_days'])
+
+# Loaded packs by code, least recently used first: (tables, bytes)
+_packs = OrderedDict()
+_packs_lock = threading.Lock()
+_pack_stats = {'loads': 0, 'hits': 0, 'evictions': 0}
+
+
+def _age_in(standard, days):
+    if standard.unit_days == 1:
+        return days
+    return round(days / standard.unit_days, 2)
+
+
+def _covers(standard, x):
+    return standard.first <= x <= standard.last
+
+
+def gestational_weeks(value):
+    """Gestational age at birth in weeks from a request field, or None"""
+    if value is None or value == '':
+        return None
+    try:
+        weeks = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("gestational_age_weeks must be a number of weeks")
+    if not MIN_GESTATION_WEEKS <= weeks <= MAX_GESTATION_WEEKS:
+        raise ValueError(
+            f"gestational_age_weeks must be between {MIN_GESTATION_WEEKS} and {MAX_GESTATION_WEEKS}"
+        )
+    return weeks
+
+
+def place(age_days, gestation=None, requested=None):
+    """The Placement of a measurement at age_days (see the module docstring for the rules)"""
+    if requested is not None and requested not in STANDARDS:
+        raise ValueError(f"Unknown standard '{requested}', expected one of {', '.join(STANDARDS)}")
+    corrected = None
+    if gestation is not None and gestation < PRETERM_WEEKS:
+        fenton = STANDARDS['fenton']
+        postmenstrual = round(gestation + age_days / DAYS_PER_WEEK, 2)
+        if requested in (None, 'fenton') and postmenstrual <= fenton.last and installed('fenton'):
+            return Placement(fenton, postmenstrual, age_days, None)
+        if age_days < CORRECT_AGE_UNTIL_DAYS:
+            corrected = max(0, age_days - round((TERM_WEEKS - gestation) * DAYS_PER_WEEK))
+            age_days = corrected
+
+    if requested is not None:
+        standard = STANDARDS[requested]
+        x = _age_in(standard, age_days)
+        if standard.basis == 'age' and _covers(standard, x):
+            return Placement(standard, x, age_days, corrected)
+    oldest = STANDARDS[DEFAULT_STANDARD]
+    for code in AGE_STANDARDS:
+        if not installed(code):
+            continue
+        oldest = STANDARDS[code]
+        x = _age_in(oldest, age_days)
+        if x <= oldest.last:
+            return Placement(oldest, x, age_days, corrected)
+    # Older than every installed standard: the oldest reports the ages it covers
+    return Placement(oldest, _age_in(oldest, age_days), age_days, corrected)
+
+
+def _budget_bytes():
+    return int(PACK_MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+def load_pack(code):
+    """
+    Tables of a standard's pack keyed by (indicator, sex), mapped on first
+    use; {} when the pack is not installed (remembered like a loaded pack).
+    """
+    with _packs_lock:
+        entry = _packs.get(code)
+        if entry is not None:
+            _packs.move_to_end(code)
+            _pack_stats['hits'] += 1
+            return entry[0]
+
+    standard = STANDARDS[code]
+    start = time.perf_counter()
+    try:
+        tables = load_artifact(standard.artifact, standard=code)
+        size = os.path.getsize(standard.artifact)
+    except (ArtifactError, OSError) as e:
+        logger.warning(f"Reference standard {code} is not installed: {str(e)}")
+        tables, size = {}, 0
+    elapsed = (time.perf_counter() - start) * 1000
+    metrics.count('PackLoadTime', elapsed, 'Milliseconds')
+    logger.info(f"Loaded reference standard {code} ({size} bytes) in {elapsed:.1f} ms")
+
+    with _packs_lock:
+        if code not in _packs:
+            _pack_stats['loads'] += 1
+        _packs[code] = (tables, size)
+        _packs.move_to_end(code)
+        # The pack just loaded stays even when it alone exceeds the budget
+        while len(_packs) > 1 and sum(size for _, size in _packs.values()) > _budget_bytes():
+            evicted, _ = _packs.popitem(last=False)
+            _pack_stats['evictions'] += 1
+            logger.info(f"Evicted reference standard {evicted} to stay under {PACK_MEMORY_BUDGET_MB} MB")
+    return tables
+
+
+def installed(code):
+    """True when a standard's tables are available (loads its pack)"""
+    return code == DEFAULT_STANDARD or bool(load_pack(code))
+
+
+def get_table(code, sex, standard):
+    """The LMSTable of an indicator in a non-default standard, or None"""
+    return load_pack(standard).get((code, sex))
+
+
+def pack_stats():
+    """Counters of the pack cache, plus the packs and bytes currently loaded"""
+    with _packs_lock:
+        return dict(_pack_stats, packs=list(_packs), bytes=sum(size for _, size in _packs.values()),
+                    budget=_budget_bytes())
+
+
+def clear_packs():
+    with _packs_lock:
+        _packs.clear()
+        for name in _pack_stats:
+            _pack_stats[name] = 0
@@ -0,0 +1,155 @@
+"""
+KLL quantile sketch (Karnin, Lang and Liberty, 2016).
+
+A bounded, mergeable summary of a stream of numbers from which any rank or
+quantile can be read to within about 1.7/k of the count, however long the
+stream. Level h holds items that each stand for 2**h inputs. When the
+sketch is full, the lowest level over its capacity is sorted and half its
+items, every other one from a random start, move up a level with doubled
+weight. Capacities shrink by 2/3 per level below the top, so about 3k items
+are retained in all. Merging concatenates the levels and compacts, so
+sketches built over scan segments, export files or stream batches combine
+into the sketch of their union without revisiting the data.
+
+to_bytes/from_bytes give the compact float32 form stored in DynamoDB.
+"""
+
+import math
+import random
+import struct
+from bisect import bisect_right
+
+DEFAULT_K = 200
+CAPACITY_RATIO = 2 / 3
+
+MAGIC = b'KLL\x01'
+# magic, k, levels, count
+HEADER = struct.Struct('<4sHHQ')
+LEVEL_SIZE = struct.Struct('<I')
+
+
+class KLLSketch:
+    """
+        sketch = KLLSketch()
+        for value in values:
+            sketch.update(value)
+        sketch.rank(0.5) / sketch.count, sketch.quantile(0.9)
+    """
+
+    __slots__ = ('k', 'count', 'levels', '_retained', '_max_retained', '_random', '_sorted')
+
+    def __init__(self, k=DEFAULT_K, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = []
+        self._retained = 0
+        self._random = random.Random(seed)
+        self._sorted = None
+        self._grow()
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * CAPACITY_RATIO ** depth))
+
+    def _grow(self):
+        self.levels.append([])
+        self._max_retained = sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def _compress(self):
+        while self._retained >= self._max_retained:
+            for h, level in enumerate(self.levels):
+                if len(level) >= self._capacity(h):
+                    if h + 1 == len(self.levels):
+                        self._grow()
+                    level.sort()
+                    # An odd item out stays at this level
+                    keep = len(level) % 2
+                    self.levels[h + 1].extend(level[keep + self._random.getrandbits(1)::2])
+                    del level[keep:]
+                    break
+            self._retained = sum(len(level) for level in self.levels)
+
+    def update(self, value):
+        self.levels[0].append(float(value))
+        self.count += 1
+        self._retained += 1
+        self._sorted = None
+        if self._retained >= self._max_retained:
+            self._compress()
+
+    def merge(self, other):
+        """Add other's stream to this sketch (other is left unchanged)"""
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge a k={other.k} sketch into a k={self.k} sketch")
+        while len(self.levels) < len(other.levels):
+            self._grow()
+        for h, level in enumerate(other.levels):
+            self.levels[h].extend(level)
+        self.count += other.count
+        self._retained = sum(len(level) for level in self.levels)
+        self._sorted = None
+        self._compress()
+        return self
+
+    def __len__(self):
+        """Items retained (not the stream length, which is count)"""
+        return self._retained
+
+    def _weighted(self):
+        """(sorted items, cumulative weights)"""
+        if self._sorted is None:
+            pairs = sorted((x, 1 << h) for h, level in enumerate(self.levels) for x in level)
+            cumulative = []
+            total = 0
+            for _, weight in pairs:
+                total += weight
+                cumulative.append(total)
+            self._sorted = ([x for x, _ in pairs], cumulative)
+        return self._sorted
+
+    def rank(self, value):
+        """Estimated number of stream items <= value"""
+        items, cumulative = self._weighted()
+        i = bisect_right(items, value)
+        return cumulative[i - 1] if i else 0
+
+    def quantile(self, q):
+        """Estimated q-quantile (0 <= q <= 1) of the stream, or None when empty"""
+        items, cumulative = self._weighted()
+        if not items:
+            return None
+        target = q * cumulative[-1]
+        i = bisect_right(cumulative, target) if target < cumulative[-1] else len(items) - 1
+        return items[min(i, len(items) - 1)]
+
+    def to_bytes(self):
+        parts = [HEADER.pack(MAGIC, self.k, len(self.levels), self.count)]
+        for level in self.levels:
+            parts.append(LEVEL_SIZE.pack(len(level)))
+            parts.append(struct.pack(f'<{len(level)}f', *level))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data, seed=None):
+        data = bytes(data)
+        if len(data) < HEADER.size:
+            raise ValueError("Sketch is truncated")
+        magic, k, levels, count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a KLL sketch")
+        sketch = cls(k, seed)
+        offset = HEADER.size
+        for h in range(levels):
+            if h:
+                sketch._grow()
+            if len(data) < offset + LEVEL_SIZE.size:
+                raise ValueError("Sketch is truncated")
+            size, = LEVEL_SIZE.unpack_from(data, offset)
+            offset += LEVEL_SIZE.size
+            if len(data) < offset + 4 * size:
+                raise ValueError("Sketch is truncated")
+            sketch.levels[h] = list(struct.unpack_from(f'<{size}f', data, offset))
+            offset += 4 * size
+        sketch.count = count
+        sketch._retained = sum(len(level) for level in sketch.levels)
+        return sketch
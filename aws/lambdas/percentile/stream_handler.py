@@ -0,0 +1,216 @@
+"""
+DynamoDB Streams consumer that scores growth measurements on write.
+
+Every INSERT or MODIFY on the GrowthData table whose scoring inputs changed
+is scored against the age-indexed WHO indicator for its measurementType
+(weight-for-age, length/height-for-age, ...), using the baby's sex and date
+of birth from the Babies table. A stream batch is scored in one vectorized
+pass and percentile/zscore are written back with BatchExecuteStatement.
+
+Write-backs are conditional on the measurement still holding the scored
+value and date, so an edit made meanwhile is never overwritten (its own
+stream record scores it). The MODIFY records produced by the write-back have
+unchanged inputs and are skipped, as are records already holding the
+computed score. Writes that fail are reported as partial batch failures
+(ReportBatchItemFailures) so only those records are retried.
+"""
+
+import logging
+import math
+
+import dynamo
+import metrics
+import profiling
+from indicators import INDICATORS, MEASUREMENT_DECIMALS, plan
+from percentile_engine import age_in_days, score_batch, score_batch_cached
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Age-indexed indicator scored for each measurementType
+MEASUREMENT_INDICATORS = {'weight': 'wfa', 'height': 'lhfa', 'head_circumference': 'hcfa', 'bmi': 'bfa'}
+
+# Factor from each accepted unit to the unit of the WHO tables (kg, cm, kg/m2)
+UNIT_SCALES = {
+    'weight': {'kg': 1.0, 'g': 0.001, 'grams': 0.001, 'lb': 0.45359237, 'lbs': 0.45359237},
+    'height': {'cm': 1.0, 'mm': 0.1, 'm': 100.0, 'in': 2.54},
+    'head_circumference': {'cm': 1.0, 'mm': 0.1, 'in': 2.54},
+    'bmi': {'kg/m2': 1.0},
+}
+
+# Unit of the WHO tables of each measurement type
+REFERENCE_UNITS = {'weight': 'kg', 'height': 'cm', 'head_circumference': 'cm', 'bmi': 'kg/m2'}
+
+# Babies.gender values (the app stores M/F)
+SEXES = {'M': 'male', 'F': 'female', 'male': 'male', 'female': 'female'}
+
+# A change to any of these attributes needs a new score
+SCORING_FIELDS = ('babyId', 'measurementDate', 'measurementType', 'value', 'unit')
+
+# Scores equal to the stored ones within this tolerance are not written again
+SCORE_TOLERANCE = 1e-9
+
+UPDATE_STATEMENT = (
+    'UPDATE "{table}" SET percentile = ?, zscore = ? '
+    'WHERE "dataId" = ? AND "value" = ? AND "measurementDate" = ?'
+)
+
+
+def needs_scoring(record):
+    """True for INSERT/MODIFY records whose scoring inputs changed (or were never scored)"""
+    if record.get('eventName') not in ('INSERT', 'MODIFY'):
+        return False
+    change = record.get('dynamodb', {})
+    new = change.get('NewImage')
+    if not new:
+        return False
+    old = change.get('OldImage')
+    if old and all(old.get(field) == new.get(field) for field in SCORING_FIELDS):
+        # Our own write-back, or an edit of notes and the like
+        return 'zscore' not in new or 'NULL' in new['zscore']
+    return True
+
+
+def reference_value(measurement_type, value, unit):
+    """value converted to the unit of the WHO tables for measurement_type"""
+    scales = UNIT_SCALES.get(measurement_type)
+    if scales is None:
+        raise ValueError(f"Unsupported measurementType '{measurement_type}'")
+    # Without a unit the value is taken to be in the table's unit
+    scale = scales.get(unit.strip().lower()) if unit else 1.0
+    if scale is None:
+        raise ValueError(f"Unsupported unit '{unit}' for {measurement_type}")
+    value = float(value) * scale
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"{measurement_type} must be a positive number")
+    return value
+
+
+def plan_item(item, baby):
+    """The (code, value, table, x) row to score for one GrowthData item"""
+    if baby is None:
+        raise ValueError(f"Baby {item.get('babyId')} not found")
+    sex = SEXES.get(baby.get('gender'))
+    if sex is None:
+        raise ValueError(f"No WHO reference for gender {baby.get('gender')!r}")
+    measurement_type = item.get('measurementType')
+    value = reference_value(measurement_type, item.get('value'), item.get('unit'))
+    value = round(value, MEASUREMENT_DECIMALS[measurement_type])
+    age_days = age_in_days(baby.get('dateOfBirth'), item.get('measurementDate'))
+    if age_days < 0:
+        raise ValueError("Measurement is dated before birth")
+    code = MEASUREMENT_INDICATORS[measurement_type]
+    rows, errors = plan(sex, age_days, {measurement_type: value})
+    for row in rows:
+        if row[0] == code:
+            return row
+    raise ValueError(errors.get(code, f"{INDICATORS[code].name} cannot be scored"))
+
+
+def score_items(pairs, cached=True):
+    """
+    Score (item, baby) pairs in one vectorized pass. Returns one
+    (percentile, zscore, error) per pair: error is None when the item was
+    scored, else the reason it cannot be (percentile and zscore are then None).
+    Bulk jobs that rarely repeat a value pass cached=False to skip the result cache.
+    """
+    results = [None] * len(pairs)
+    positions = []
+    rows = []
+    for position, (item, baby) in enumerate(pairs):
+        try:
+            rows.append(plan_item(item, baby))
+        except Exception as e:
+            results[position] = (None, None, str(e))
+            continue
+        positions.append(position)
+
+    columns = [r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows]
+    scored = score_batch_cached(*columns)[0] if cached else score_batch(*columns)
+    for position, (zscore, percentile, _) in zip(positions, scored):
+        results[position] = (round(percentile, 2), zscore, None)
+    return results
+
+
+def score_unchanged(item, percentile, zscore):
+    """True when item already stores this percentile and zscore"""
+    stored_percentile, stored_zscore = item.get('percentile'), item.get('zscore')
+    return (
+        isinstance(stored_percentile, (int, float)) and isinstance(stored_zscore, (int, float))
+        and abs(stored_percentile - percentile) <= SCORE_TOLERANCE
+        and abs(stored_zscore - zscore) <= SCORE_TOLERANCE
+    )
+
+
+def update_statement(item, percentile, zscore):
+    """(statement, parameters) writing a score back to item, if it still holds the scored inputs"""
+    statement = UPDATE_STATEMENT.format(table=dynamo.GROWTH_TABLE_NAME)
+    return statement, [percentile, zscore, item['dataId'], item['value'], item['measurementDate']]
+
+
+def process_records(records):
+    """
+    Score and write back a list of stream records.
+    Returns (failed sequence numbers, counters dict).
+    """
+    # Latest record per measurement: an INSERT and its edits in one batch score once
+    latest = {}
+    for record in records:
+        if needs_scoring(record):
+            item = dynamo.load_item(record['dynamodb']['NewImage'])
+            latest[item.get('dataId')] = (record['dynamodb']['SequenceNumber'], item)
+    stats = {'records': len(records), 'scored': 0, 'skipped': len(records) - len(latest),
+             'unchanged': 0, 'unscorable': 0, 'conflicts': 0, 'failed': 0}
+    if not latest:
+        return [], stats
+
+    try:
+        babies = dynamo.batch_get(
+            dynamo.BABIES_TABLE_NAME, 'babyId',
+            [item.get('babyId') for _, item in latest.values() if item.get('babyId')],
+            attributes=('gender', 'dateOfBirth'),
+        )
+    except Exception as e:
+        logger.error(f"Unable to load babies: {str(e)}")
+        stats['failed'] = len(latest)
+        return [sequence for sequence, _ in latest.values()], stats
+
+    items = [item for _, item in latest.values()]
+    scored = score_items([(item, babies.get(item.get('babyId'))) for item in items])
+    writes = []
+    for (sequence, item), (percentile, zscore, error) in zip(latest.values(), scored):
+        if error is not None:
+            logger.warning(f"Not scoring {item.get('dataId')}: {error}")
+            stats['unscorable'] += 1
+        elif score_unchanged(item, percentile, zscore):
+            stats['unchanged'] += 1
+        else:
+            writes.append((sequence, item['dataId'], update_statement(item, percentile, zscore)))
+
+    failed = []
+    errors = dynamo.batch_execute([write[2] for write in writes])
+    for (sequence, data_id, _), error in zip(writes, errors):
+        if error is None:
+            stats['scored'] += 1
+        elif error.get('Code') == 'ConditionalCheckFailed':
+            # Edited or deleted since this record; a newer record carries the change
+            stats['conflicts'] += 1
+        else:
+            logger.warning(f"Write-back of {data_id} failed: {error.get('Code')} {error.get('Message')}")
+            stats['failed'] += 1
+            failed.append(sequence)
+    return failed, stats
+
+
+def lambda_handler(event, context):
+    """
+    DynamoDB Streams handler for the GrowthData table.
+    Returns the partial batch response expected with ReportBatchItemFailures.
+    """
+    with metrics.request(__name__), profiling.sample(__name__):
+        with metrics.phase('ProcessTime'):
+            failed, stats = process_records(event.get('Records', []))
+        for name in ('records', 'scored', 'unchanged', 'unscorable', 'conflicts', 'failed'):
+            metrics.count(name.capitalize(), stats[name])
+    logger.info(f"Stream batch: {stats}")
+    return {"batchItemFailures": [{"itemIdentifier": sequence} for sequence in failed]}
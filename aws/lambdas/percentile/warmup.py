@@ -0,0 +1,140 @@
+"""
+Init-phase warmup and the warm-ping fast path.
+
+A cold container otherwise pays on its first real request for resolving the
+LMS tables, importing NumPy for the vectorized path, fetching the JWKS and
+parsing its RSA keys, and the first RSA verification. initialize() does all
+of that up front. With WARMUP_ON_INIT=true the handler modules call it at
+import, i.e. during the Lambda init phase, which provisioned concurrency and
+SnapStart run before any request arrives. The time it took is reported as
+WarmupTime with the first request's metrics.
+
+A warm ping ({"warmup": true}, or an EventBridge "Scheduled Event") is
+answered by require_jwt_auth before authentication, metrics or any handler
+code run. The first ping of a container that was not initialized at import
+initializes it. Pings can only come from direct invocations: API Gateway
+events carry the request in "body" and cannot set top-level keys.
+"""
+
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+WARMUP_ON_INIT = os.environ.get('WARMUP_ON_INIT', 'false').lower() in ('1', 'true', 'yes', 'on')
+
+# Key of a warm-ping event
+WARM_PING_KEY = 'warmup'
+
+PING_RESPONSE = {'statusCode': 200, 'body': '{"warm": true}'}
+
+_initialized = False
+_dynamodb_initialized = False
+# Time spent in initialize() so far, reported as WarmupTime
+_warmup_ms = 0.0
+
+
+def is_warm_ping(event):
+    """True for a warm-ping event (never for an API Gateway request)"""
+    if not isinstance(event, dict):
+        return False
+    if event.get(WARM_PING_KEY) is True:
+        return True
+    return event.get('source') == 'aws.events' and event.get('detail-type') == 'Scheduled Event'
+
+
+def ping_response():
+    """Response to a warm ping; initializes the container on its first ping"""
+    if not _initialized:
+        initialize()
+    return dict(PING_RESPONSE)
+
+
+def _warm_tables():
+    from indicators import INDICATORS, get_table
+    return sum(1 for code in INDICATORS for sex in ('male', 'female') if get_table(code, sex) is not None)
+
+
+def _warm_scoring():
+    """Run the scalar and the vectorized scoring paths once (without touching the result cache)"""
+    from indicators import INDICATORS, get_table
+    from percentile_engine import VECTORIZE_MIN_BATCH, age_in_days, score_batch
+    age_in_days('2025-01-01', '2025-03-01')
+    for code in INDICATORS:
+        table = get_table(code, 'female')
+        if table is not None:
+            x = table.x[len(table.x) // 2]
+            M = table.M[len(table.M) // 2]
+            score_batch([M], [table], [x])
+            score_batch([M] * VECTORIZE_MIN_BATCH, [table] * VECTORIZE_MIN_BATCH, [x] * VECTORIZE_MIN_BATCH)
+            return
+
+
+def _warm_auth():
+    """
+    Load the JWKS (fetching it when it was not pre-warmed) and run one RSA
+    verification. In authorizer mode tokens are rarely verified here, so the
+    JWKS is only fetched if a request needs it.
+    """
+    import jwt_validator
+    fetch = jwt_validator.AUTH_MODE == 'verify' and (jwt_validator.JWKS_URL or jwt_validator.COGNITO_USER_POOL_ID)
+    if not jwt_validator._public_keys and fetch:
+        try:
+            jwt_validator.refresh_jwks()
+        except Exception as e:
+            logger.warning(f"Warmup could not fetch the JWKS: {str(e)}")
+    keys = list(jwt_validator._public_keys.values())
+    if keys:
+        from jwt.algorithms import RSAAlgorithm
+        # Fails (a bogus signature), but loads and runs the OpenSSL verify path
+        RSAAlgorithm(RSAAlgorithm.SHA256).verify(b'warmup', keys[0], b'\0' * 256)
+    return len(keys)
+
+
+def _warm_dynamodb():
+    import dynamo
+    dynamo.get_client()
+
+
+def initialize(dynamodb=False):
+    """
+    Preload everything the first request would otherwise load. Idempotent and
+    never raises: a step that fails is logged and left to the first request.
+    The DynamoDB step is tracked on its own, so a handler module that needs it
+    still gets it after another module it imports has initialized the rest.
+    Returns {step: milliseconds} of the steps that ran.
+    """
+    global _initialized, _dynamodb_initialized, _warmup_ms
+    steps = []
+    if not _initialized:
+        steps += [('tables', _warm_tables), ('scoring', _warm_scoring), ('auth', _warm_auth)]
+    if dynamodb and not _dynamodb_initialized:
+        steps.append(('dynamodb', _warm_dynamodb))
+    if not steps:
+        return {}
+    import metrics
+
+    timings = {}
+    start = time.perf_counter()
+    for name, step in steps:
+        step_start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warmup step {name} failed: {str(e)}")
+        timings[name] = round((time.perf_counter() - step_start) * 1000, 2)
+    total = (time.perf_counter() - start) * 1000
+    _warmup_ms += total
+    metrics.record_init('WarmupTime', _warmup_ms)
+    _initialized = True
+    _dynamodb_initialized = _dynamodb_initialized or dynamodb
+    logger.info(f"Warmup took {total:.1f} ms: {timings}")
+    return timings
+
+
+def warm_on_init(dynamodb=False):
+    """Called at the end of each handler module: initialize during the init phase when enabled"""
+    if WARMUP_ON_INIT:
+        initialize(dynamodb=dynamodb)
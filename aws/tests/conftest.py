@@ -0,0 +1,72 @@
+"""
+Shared fixtures for the tests that run against the in-memory DynamoDB
+stand-in (aws/tools/local_dynamodb.py): the `db` fixture and the helpers
+that seed and read its tables. Modules that need seeded babies override
+`db` with a fixture of the same name that requests this one.
+"""
+
+import os
+import sys
+from datetime import date as Date
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+if lambda_dir not in sys.path:
+    sys.path.append(lambda_dir)
+
+import dynamo  # noqa: E402
+import stream_handler  # noqa: E402
+from aws.tools.local_dynamodb import LocalDynamoDB  # noqa: E402
+
+GROWTH = dynamo.GROWTH_TABLE_NAME
+BABIES = dynamo.BABIES_TABLE_NAME
+SUMMARY = dynamo.SUMMARY_TABLE_NAME
+COHORTS = dynamo.COHORT_TABLE_NAME
+
+TABLES = {GROWTH: 'dataId', BABIES: 'babyId', SUMMARY: 'babyId', COHORTS: 'cohortKey'}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Every table, installed as the dynamo client, with retries that do not sleep"""
+    db = LocalDynamoDB(TABLES)
+    dynamo.set_client(db)
+    monkeypatch.setattr(dynamo, 'RETRY_BASE_DELAY', 0)
+    yield db
+    dynamo.set_client(None)
+
+
+def put_baby(db, baby_id, gender, date_of_birth, user_id='user-1'):
+    db.put_item(TableName=BABIES, Item=dynamo.dump_item(
+        {'babyId': baby_id, 'userId': user_id, 'gender': gender, 'dateOfBirth': str(date_of_birth)}))
+
+
+def put_growth(db, data_id, date='2025-06-22', value=5350, unit='grams', kind='weight', baby_id='baby-f',
+               **extra):
+    if isinstance(date, Date):
+        date = date.isoformat()
+    item = {'dataId': data_id, 'babyId': baby_id, 'userId': 'user-1', 'measurementDate': date,
+            'measurementType': kind, 'value': value, 'unit': unit, **extra}
+    db.put_item(TableName=GROWTH, Item=dynamo.dump_item(item))
+
+
+def stored(db, table, key):
+    """The stored item of table under key, or None"""
+    item = db.items[table].get(key)
+    return dynamo.load_item(item) if item else None
+
+
+def stored_items(db, table):
+    """Every stored item of table, by key"""
+    return {key: dynamo.load_item(item) for key, item in db.items[table].items()}
+
+
+def sync(db, consumer):
+    """Run the enrichment worker and a stream consumer on the pending stream, as deployed"""
+    for _ in range(3):
+        records = db.stream_records(GROWTH)
+        if not records:
+            return
+        assert stream_handler.lambda_handler({'Records': records}, None) == {'batchItemFailures': []}
+        assert consumer.lambda_handler({'Records': records}, None) == {'batchItemFailures': []}
@@ -0,0 +1,130 @@
+"""
+Tests for the growth analytics endpoint: velocities and conditional gains
+match the scoring path, centile crossings, the vectorized path, and that
+appending to a returned state gives the same answer as a full recomputation.
+"""
+
+import json
+import math
+import os
+import sys
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import analytics  # noqa: E402
+import lambda_function  # noqa: E402
+
+handler = analytics.lambda_handler.__wrapped__
+
+# A girl born on the median who drifts down through three centile lines
+SERIES = [
+    {'date': '2025-01-01', 'value': 3.2},
+    {'date': '2025-02-01', 'value': 4.5},
+    {'date': '2025-04-01', 'value': 5.4},
+    {'date': '2025-06-01', 'value': 6.0},
+    {'date': '2025-08-01', 'value': 6.4},
+]
+
+
+def request(series, **extra):
+    body = {'sex': 'female', 'date_birth': '2025-01-01', 'series': series, **extra}
+    return analytics.analyze(*analytics.parse_analytics_request(body))
+
+
+def zscore(value, date):
+    return lambda_function.score_measurements(
+        [{'weight': value, 'date_birth': '2025-01-01', 'date_measurement': date, 'sex': 'female'}])[0]['zscore']
+
+
+def test_channels_and_crossed_lines():
+    assert analytics.channel(0) == 0 and analytics.channel(-0.01) == -1
+    assert analytics.channel(2 / 3) == 1 and analytics.channel(5) == 4 and analytics.channel(-5) == -5
+    assert analytics.crossed_lines(-1, 1) == [50, 75]
+    assert analytics.crossed_lines(1, -2) == [75, 50, 25]
+
+
+def test_series_analytics():
+    result = request(list(reversed(SERIES)))
+    assert [p['date'] for p in result['points']] == [p['date'] for p in SERIES]
+    z = [zscore(p['value'], p['date']) for p in SERIES]
+    assert [p['zscore'] for p in result['points']] == pytest.approx(z)
+
+    first = result['intervals'][0]
+    months = 31 / analytics.DAYS_PER_MONTH
+    assert first['days'] == 31
+    assert first['velocity'] == pytest.approx((z[1] - z[0]) / months, abs=1e-4)
+    r = math.exp(-months / analytics.CORRELATION_MONTHS)
+    assert first['conditionalGain'] == pytest.approx((z[1] - r * z[0]) / math.sqrt(1 - r * r), abs=1e-4)
+
+    assert [(c['direction'], c['centiles']) for c in result['crossings']] == [
+        ('up', [50]), ('down', [50]), ('down', [25]), ('down', [9])]
+    summary = result['summary']
+    assert summary['count'] == 5 and summary['latest']['date'] == '2025-08-01'
+    assert summary['spacesBelowPeak'] == 3 and summary['faltering']
+
+
+def test_short_intervals_have_no_gain_and_duplicates_collapse():
+    result = request([{'date': '2025-02-01', 'value': 4.4}, {'date': '2025-02-08', 'value': 4.6},
+                      {'date': '2025-02-08', 'value': 4.7}])
+    assert [p['value'] for p in result['points']] == [4.4, 4.7]
+    assert result['intervals'][0]['conditionalGain'] is None
+
+
+def test_appending_to_state_matches_full_series():
+    full = request(SERIES)
+    head = request(SERIES[:2])
+    tail = request(SERIES[2:], state=json.loads(json.dumps(head['state'])))
+    assert tail['summary'] == full['summary']
+    assert tail['state'] == full['state']
+    assert tail['points'] == full['points'][2:]
+    assert tail['intervals'] == full['intervals'][1:]
+    assert tail['crossings'] == full['crossings'][1:]
+
+
+def test_vectorized_path_matches_scalar(monkeypatch):
+    series = [{'date': f'2025-{month:02d}-{day:02d}', 'value': 3.5 + month * 0.5 + day * 0.01}
+              for month in range(1, 13) for day in (1, 10, 20)]
+    scalar = request(series)
+    monkeypatch.setattr(analytics, 'VECTORIZE_MIN_BATCH', 2)
+    vectorized = request(series)
+    for a, b in zip(scalar['intervals'], vectorized['intervals']):
+        assert a['velocity'] == pytest.approx(b['velocity'], abs=1e-4)
+        assert (a['conditionalGain'] is None) == (b['conditionalGain'] is None)
+        if a['conditionalGain'] is not None:
+            assert a['conditionalGain'] == pytest.approx(b['conditionalGain'], abs=1e-4)
+
+
+def test_units_and_growth_data_rows():
+    grams = request([{'measurementDate': p['date'], 'value': p['value'] * 1000, 'unit': 'grams'} for p in SERIES])
+    assert grams['points'] == request(SERIES)['points']
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'sex': 'female', 'date_birth': '2025-01-01', 'series': []}, 'must not be empty'),
+    ({'sex': 'female', 'date_birth': '2025-01-01', 'series': SERIES, 'indicator': 'wfl'}, 'Indicator must be'),
+    ({'sex': 'female', 'date_birth': '2025-03-01', 'series': SERIES}, 'before birth'),
+    ({'sex': 'female', 'date_birth': '2025-01-01', 'series': [{'date': '2025-02-01', 'value': -1}]}, 'positive'),
+    ({'sex': 'female', 'date_birth': '2025-01-01', 'series': SERIES, 'state': {'version': 0}}, 'Unsupported'),
+])
+def test_invalid_requests(body, error):
+    response = handler({'body': json.dumps(body)}, None)
+    assert response['statusCode'] == 400
+    assert error in json.loads(response['body'])['error']
+
+
+def test_state_must_match_and_precede_new_points():
+    state = request(SERIES)['state']
+    with pytest.raises(ValueError, match='later than the state'):
+        request(SERIES[-1:], state=state)
+    with pytest.raises(ValueError, match='another indicator'):
+        request([{'date': '2025-09-01', 'value': 6.6}], state=state, sex='male')
+
+
+def test_handler():
+    response = handler({'body': json.dumps({'sex': 'female', 'date_birth': '2025-01-01', 'series': SERIES})}, None)
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['success'] and len(body['intervals']) == 4
@@ -0,0 +1,110 @@
+"""
+Tests for AUTH_MODE=authorizer: the user comes from API Gateway authorizer
+claims (REST and HTTP API shapes) without verifying the token again, claims
+from another pool, client or token type are refused, and requests without
+claims fall back to full verification.
+"""
+
+import json
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from aws.lambdas.percentile import jwt_validator
+from aws.tools.local_jwks import SigningKey, id_token_claims, jwks_document
+
+POOL_ID = 'us-east-1_local'
+CLIENT_ID = 'local-client'
+ISSUER = f'https://cognito-idp.us-east-1.amazonaws.com/{POOL_ID}'
+
+
+@pytest.fixture(scope='module')
+def key():
+    return SigningKey('key-1')
+
+
+@pytest.fixture
+def validator(monkeypatch, key):
+    monkeypatch.setattr(jwt_validator, 'AUTH_MODE', 'authorizer')
+    monkeypatch.setattr(jwt_validator, 'COGNITO_REGION', 'us-east-1')
+    monkeypatch.setattr(jwt_validator, 'COGNITO_USER_POOL_ID', POOL_ID)
+    monkeypatch.setattr(jwt_validator, 'COGNITO_CLIENT_ID', CLIENT_ID)
+    monkeypatch.setattr(jwt_validator, 'JWKS_URL', 'http://127.0.0.1:9/unreachable')
+    jwt_validator.set_jwks(jwks_document([key]))
+    jwt_validator.clear_token_cache()
+    calls = []
+    original = jwt_validator.validate_jwt_token
+    monkeypatch.setattr(jwt_validator, 'validate_jwt_token', lambda token: calls.append(token) or original(token))
+    yield calls
+    jwt_validator.clear_token_cache()
+
+
+@jwt_validator.require_jwt_auth
+def whoami(event, context):
+    return {'statusCode': 200, 'body': json.dumps({'sub': event['user']['sub'], 'email': event['user']['email']})}
+
+
+def rest_claims(**overrides):
+    """Claims as a REST API Cognito authorizer passes them: every value a string (None drops a claim)"""
+    expires = datetime.fromtimestamp(time.time() + 3600, timezone.utc)
+    claims = {
+        'sub': 'user-1', 'aud': CLIENT_ID, 'iss': ISSUER, 'token_use': 'id', 'email': 'user-1@example.com',
+        'cognito:username': 'user-1', 'exp': expires.strftime('%a %b %d %H:%M:%S UTC %Y'),
+    }
+    claims.update(overrides)
+    return {name: value for name, value in claims.items() if value is not None}
+
+
+def rest_event(claims):
+    return {'headers': {}, 'requestContext': {'authorizer': {'claims': claims}}}
+
+
+def http_event(claims):
+    return {'headers': {}, 'requestContext': {'authorizer': {'jwt': {'claims': claims, 'scopes': None}}}}
+
+
+def test_rest_authorizer_claims_are_trusted(validator):
+    response = whoami(rest_event(rest_claims()), None)
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == {'sub': 'user-1', 'email': 'user-1@example.com'}
+    assert validator == []
+
+
+def test_http_api_claims_and_access_tokens(validator):
+    claims = rest_claims(aud=f'[other {CLIENT_ID}]', exp=str(int(time.time()) + 60))
+    assert whoami(http_event(claims), None)['statusCode'] == 200
+    access = rest_claims(token_use='access', client_id=CLIENT_ID)
+    del access['aud']
+    assert whoami(http_event(access), None)['statusCode'] == 200
+    assert validator == []
+
+
+@pytest.mark.parametrize('overrides, error', [
+    ({'iss': 'https://cognito-idp.us-east-1.amazonaws.com/us-east-1_other'}, 'issuer'),
+    ({'aud': 'other-client'}, 'audience'),
+    ({'token_use': 'refresh'}, 'token_use'),
+    ({'token_use': 'access', 'client_id': 'other-client'}, 'audience'),
+    ({'sub': ''}, 'sub'),
+    ({'exp': 'Mon Jan 01 00:00:00 UTC 2024'}, 'expired'),
+    ({'exp': str(int(time.time()) - 1)}, 'expired'),
+    ({'exp': None}, 'missing exp'),
+    ({'exp': 'tomorrow'}, 'missing exp'),
+])
+def test_foreign_or_stale_claims_are_refused(validator, overrides, error):
+    response = whoami(rest_event(rest_claims(**overrides)), None)
+    assert response['statusCode'] == 401
+    assert error in json.loads(response['body'])['message']
+
+
+def test_missing_claims_fall_back_to_verification(validator, key):
+    token = key.sign(id_token_claims(ISSUER, CLIENT_ID, sub='user-2'))
+    response = whoami({'headers': {'Authorization': f'Bearer {token}'}, 'requestContext': {}}, None)
+    assert response['statusCode'] == 200 and json.loads(response['body'])['sub'] == 'user-2'
+    assert validator == [token]
+    assert whoami({'headers': {}}, None)['statusCode'] == 401
+
+
+def test_verify_mode_ignores_authorizer_claims(validator, monkeypatch):
+    monkeypatch.setattr(jwt_validator, 'AUTH_MODE', 'verify')
+    assert whoami(rest_event(rest_claims()), None)['statusCode'] == 401
@@ -0,0 +1,53 @@
+"""
+Tests for the benchmark suite: the regression check against baselines and a
+quick smoke run of the benchmarks themselves (timings are not asserted here,
+run python -m aws.benchmarks.suite for that).
+"""
+
+import json
+
+from aws.benchmarks import suite
+
+
+def test_compare_scales_by_calibration():
+    baseline = {'benchmarks': {
+        'fast': {'us': 10.0, 'calibration_us': 1000.0},
+        'noisy': {'us': 10.0, 'calibration_us': 1000.0, 'threshold': 1.0},
+    }}
+    # A machine twice as slow: 25 us is 1.25x of the expected 20 us
+    results = {'fast': (25e-6, 2000e-6), 'noisy': (35e-6, 2000e-6), 'new': (1e-6, 2000e-6)}
+    rows = {row[0]: row for row in suite.compare(results, baseline)}
+    assert rows['fast'][2] == 20.0 and abs(rows['fast'][3] - 1.25) < 1e-9 and not rows['fast'][4]
+    assert not rows['noisy'][4]
+    assert rows['new'][2] is None
+    rows = {row[0]: row for row in suite.compare(results, baseline, threshold=0.2)}
+    assert rows['fast'][4] and not rows['noisy'][4]
+
+
+def test_save_baseline_keeps_thresholds(tmp_path):
+    path = str(tmp_path / 'baselines.json')
+    previous = {'benchmarks': {'a': {'us': 1.0, 'calibration_us': 1.0, 'threshold': 0.5},
+                               'b': {'us': 2.0, 'calibration_us': 1.0}}}
+    suite.save_baseline({'a': (3e-6, 4e-6)}, path, previous)
+    saved = json.loads(open(path).read())['benchmarks']
+    assert saved['a'] == {'us': 3.0, 'calibration_us': 4.0, 'threshold': 0.5}
+    assert saved['b'] == previous['benchmarks']['b']
+
+
+def test_quick_run_fails_on_regression(tmp_path, capsys):
+    path = tmp_path / 'baselines.json'
+    assert suite.main(['--quick', '--only', 'zscore', 'jwt_cached', '--update-baseline',
+                       '--baseline', str(path)]) == 0
+    baseline = json.loads(path.read_text())
+    assert set(baseline['benchmarks']) == {'zscore_scalar', 'jwt_cached'}
+
+    baseline['benchmarks']['zscore_scalar']['us'] /= 100
+    path.write_text(json.dumps(baseline))
+    assert suite.main(['--quick', '--only', 'zscore', '--baseline', str(path)]) == 1
+    assert 'REGRESSION' in capsys.readouterr().out
+
+
+def test_every_benchmark_runs():
+    results = suite.run(quick=True)
+    assert set(results) == set(suite.BENCHMARKS)
+    assert all(seconds > 0 and calibration > 0 for seconds, calibration in results.values())
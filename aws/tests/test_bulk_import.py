@@ -0,0 +1,204 @@
+"""
+Tests for the bulk import endpoint against the in-memory DynamoDB stand-in:
+long and wide CSV layouts with units, per-row validation, scoring,
+deduplication against stored and re-uploaded measurements, retried writes,
+rows read a chunk at a time, and the file import tool.
+"""
+
+import base64
+import gzip
+import io
+import json
+import os
+import sys
+from datetime import date
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import bulk_import  # noqa: E402
+import dynamo  # noqa: E402
+import lambda_function  # noqa: E402
+from aws.tests.conftest import BABIES, GROWTH, put_baby, put_growth, stored, stored_items  # noqa: E402
+from aws.tools import import_growth  # noqa: E402
+
+handler = bulk_import.lambda_handler.__wrapped__
+
+LONG_CSV = """measurementDate,measurementType,value,unit,notes
+2025-04-25,weight,4100,grams,clinic
+2025-05-24,weight,4.9,kg,
+2025-05-24,height,57.1,cm,
+2025-05-24,shoe_size,3,,
+24/05/2025,weight,5.0,kg,
+2025-06-22,weight,-1,kg,
+2025-02-01,weight,3.2,kg,
+2025-06-22,weight,12,stone,
+"""
+
+
+@pytest.fixture
+def db(db):
+    put_baby(db, 'baby-f', 'F', '2025-03-25')
+    put_baby(db, 'baby-x', 'M', '2025-01-01', user_id='user-2')
+    return db
+
+
+def upload(body, params=None, sub='user-1', headers=None, gzipped=False):
+    event = {'queryStringParameters': {'babyId': 'baby-f', **(params or {})}, 'user': {'sub': sub},
+             'headers': dict(headers or {}), 'body': body}
+    if gzipped:
+        event['body'] = base64.b64encode(gzip.compress(body.encode())).decode()
+        event['isBase64Encoded'] = True
+        event['headers']['Content-Encoding'] = 'gzip'
+    response = handler(event, None)
+    return response['statusCode'], response
+
+
+def report(response):
+    return json.loads(response['body'])
+
+
+def test_long_csv_rows_are_validated_scored_and_written(db):
+    status, response = upload(LONG_CSV, headers={'Content-Type': 'text/csv'})
+    body = report(response)
+    assert status == 200
+    assert body['counts'] == {'imported': 3, 'duplicate': 0, 'invalid': 5, 'failed': 0}
+    # Only the rows that were not imported, or were imported without a score, are listed
+    rows = body['rows']
+    assert [(r['row'], r['status']) for r in rows] == [
+        (4, 'imported'), (5, 'invalid'), (6, 'invalid'), (7, 'invalid'), (8, 'invalid'), (9, 'invalid')]
+    assert 'percentile' not in rows[0] and rows[0]['warning']
+    errors = [r['error'] for r in rows[1:]]
+    assert 'measurementType must be one of' in errors[0] and 'Invalid date' in errors[1]
+    assert 'positive' in errors[2] and 'before birth' in errors[3] and "Unsupported unit 'stone'" in errors[4]
+    assert body['omitted'] == 0
+
+    first, = [item for item in stored_items(db, GROWTH).values() if item.get('notes') == 'clinic']
+    assert first['value'] == 4100 and first['unit'] == 'grams'
+    assert first['userId'] == 'user-1' and first['source'] == 'import'
+    expected = lambda_function.score_measurements(
+        [{'weight': 4.1, 'date_birth': '2025-03-25', 'date_measurement': '2025-04-25', 'sex': 'female'}])[0]
+    assert first['percentile'] == round(expected['percentile'], 2)
+
+
+def test_wide_rows_with_units_in_headers(db):
+    body = 'Date,Weight (g),Length [cm],hc_cm,weight_percentile\n2025-04-25,4100,53.2,36.1,40\n2025-05-24,4900,,,\n'
+    status, response = upload(body)
+    assert status == 200 and report(response)['counts']['imported'] == 4
+    items = {(item['measurementDate'], item['measurementType']): item for item in stored_items(db, GROWTH).values()}
+    assert sorted(items) == [('2025-04-25', 'head_circumference'), ('2025-04-25', 'height'),
+                             ('2025-04-25', 'weight'), ('2025-05-24', 'weight')]
+    assert items['2025-04-25', 'weight']['unit'] == 'g' and items['2025-04-25', 'head_circumference']['unit'] == 'cm'
+    assert items['2025-04-25', 'weight']['value'] == 4100 and items['2025-04-25', 'height']['value'] == 53.2
+    assert 'zscore' in items['2025-05-24', 'weight']
+
+
+def test_duplicates_of_stored_and_reuploaded_measurements(db):
+    # Entered in the app in grams; the upload has the same weight in kg
+    put_growth(db, 'app-1', '2025-04-25', 4100, 'grams')
+    body = ('{"measurementDate": "2025-04-25T09:30:00Z", "measurementType": "weight", "value": 4.1, "unit": "kg"}\n'
+            '{"date": "2025-05-24", "weight": 4.9}\n'
+            'not json\n'
+            '{"date": "2025-05-24", "weight": 4.9}\n')
+    status, response = upload(body, gzipped=True)
+    first = report(response)
+    assert status == 200
+    assert [(r['row'], r['status']) for r in first['rows']] == [
+        (1, 'duplicate'), (3, 'invalid'), (4, 'duplicate')]
+    assert first['counts'] == {'imported': 1, 'duplicate': 2, 'invalid': 1, 'failed': 0}
+    # The row without a unit is stored in the unit of the WHO tables
+    assert sorted(item['unit'] for item in stored_items(db, GROWTH).values()) == ['grams', 'kg']
+
+    second = report(upload(body, gzipped=True)[1])
+    assert second['counts'] == {'imported': 0, 'duplicate': 3, 'invalid': 1, 'failed': 0}
+    assert len(db.items[GROWTH]) == 2
+
+
+def test_unscorable_rows_are_imported_with_a_warning(db):
+    db.put_item(TableName=BABIES, Item=dynamo.dump_item(
+        {'babyId': 'baby-u', 'userId': 'user-1', 'dateOfBirth': '2025-03-25'}))
+    entry, = report(upload('date,weight\n2025-04-25,4.1\n', params={'babyId': 'baby-u'})[1])['rows']
+    assert entry['status'] == 'imported' and 'percentile' not in entry
+    assert 'No WHO reference' in entry['warning']
+    assert 'zscore' not in stored_items(db, GROWTH)[entry['dataId']]
+
+
+def test_future_dates_are_invalid(db):
+    body = 'date,weight\n2031-06-01,20\n'
+    entry, = report(upload(body)[1])['rows']
+    assert entry['status'] == 'invalid' and 'future' in entry['error']
+    baby = stored(db, BABIES, 'baby-f')
+    entry, = bulk_import.import_rows(baby, 'user-1', bulk_import.read_rows(io.BytesIO(body.encode())),
+                                     today=date(2032, 1, 1))
+    assert entry['status'] == 'imported'
+
+
+def test_throttled_writes_are_retried_and_failures_reported(db):
+    db.throttle['batch_execute_statement'] = 2
+    body = report(upload('date,weight\n2025-04-25,4.1\n2025-05-24,4.9\n')[1])
+    assert body['counts']['imported'] == 2 and body['rows'] == []
+    assert db.calls.count('batch_execute_statement') == 3
+
+    item = bulk_import.validate({'babyId': 'baby-f', 'dateOfBirth': '2025-03-25'},
+                                ('weight', '2025-06-22', '5.3', 'kg', None))
+    db.failing_keys.add(bulk_import.data_id(item))
+    status, response = upload('date,weight\n2025-06-22,5.3\n2025-06-01,5.1\n')
+    body = report(response)
+    assert status == 200 and body['counts']['failed'] == 1 and body['counts']['imported'] == 1
+    assert body['rows'][0]['error'] == 'Internal server error'
+
+
+def test_rows_are_read_a_chunk_at_a_time(db):
+    consumed = []
+
+    def rows():
+        for i in range(1000):
+            consumed.append(i)
+            yield i + 2, {'date': '2025-04-25', 'weight': str(4 + i / 1000)}
+
+    baby = stored(db, BABIES, 'baby-f')
+    entries = bulk_import.import_rows(baby, 'user-1', rows(), chunk_size=50)
+    next(entries)
+    assert len(consumed) == 50
+    assert sum(1 for _ in entries) == 999 and len(db.items[GROWTH]) == 1000
+
+
+def test_ownership_and_request_errors(db):
+    assert upload('date,weight\n2025-04-25,4.1\n', sub='user-2')[0] == 404
+    assert upload('date,weight\n2025-04-25,4.1\n', params={'babyId': ''})[0] == 400
+    assert upload('')[0] == 400
+    status, response = upload('date,weight\n2025-04-25,4.1\n2031-06-01,20\n',
+                              headers={'Accept': 'application/x-ndjson'})
+    head, *lines = response['body'].splitlines()
+    assert status == 200 and json.loads(head)['counts']['imported'] == 1 and len(lines) == 1
+    assert json.loads(lines[0])['status'] == 'invalid'
+
+
+def test_report_lists_a_bounded_number_of_rows(db, monkeypatch):
+    monkeypatch.setattr(bulk_import, 'IMPORT_REPORT_MAX_ROWS', 2)
+    body = report(upload('date,weight\n2025-04-25,4.1\n' + '2031-06-01,20\n' * 4)[1])
+    assert body['counts'] == {'imported': 1, 'duplicate': 0, 'invalid': 4, 'failed': 0}
+    assert [r['row'] for r in body['rows']] == [3, 4] and body['omitted'] == 2
+
+
+def test_body_is_decoded_as_it_is_read(db, monkeypatch):
+    monkeypatch.setattr(bulk_import, 'BODY_BLOCK_SIZE', 8)
+    assert report(upload(LONG_CSV, gzipped=True)[1])['counts']['imported'] == 3
+    assert report(upload(LONG_CSV.replace('clinic', 'clinic é'))[1])['counts']['duplicate'] == 3
+
+
+def test_import_tool_writes_the_report_as_it_goes(db, tmp_path, capsys):
+    path = tmp_path / 'scale.csv.gz'
+    with gzip.open(path, 'wt') as f:
+        f.write(LONG_CSV)
+    report_path = tmp_path / 'report.jsonl'
+    counts = import_growth.import_file(str(path), 'baby-f', str(report_path), chunk_size=3, progress=None)
+    assert counts['rows'] == 8 and counts['imported'] == 3 and counts['invalid'] == 5
+    assert len(report_path.read_text().splitlines()) == 8
+
+    assert import_growth.main([str(path), '--baby-id', 'baby-f']) == 0
+    assert json.loads(capsys.readouterr().out)['duplicate'] == 3
+    with pytest.raises(ValueError, match='not found'):
+        import_growth.import_file(str(path), 'missing')
@@ -0,0 +1,256 @@
+"""
+Tests for the cohort distributions: KLL sketch accuracy, merging and storage,
+cohorts kept from the GrowthData stream (inserts, score write-backs, edits and
+deletions) matching a rebuild, conditional writes, the cohort percentile
+query and the rebuild tool, against the in-memory DynamoDB stand-in.
+"""
+
+import csv
+import json
+import os
+import random
+import sys
+from bisect import bisect_right
+from datetime import date, timedelta
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import cohort_rank  # noqa: E402
+import cohorts  # noqa: E402
+import stream_handler  # noqa: E402
+from aws.tests.conftest import COHORTS, GROWTH, put_baby, put_growth, stored, sync  # noqa: E402
+from aws.tools import build_cohorts  # noqa: E402
+from sketches import KLLSketch  # noqa: E402
+
+BIRTH = date(2025, 1, 1)
+COHORT = 'wfa#female#3'
+
+handler = cohort_rank.lambda_handler.__wrapped__
+
+
+def exact_rank(values, x):
+    return bisect_right(sorted(values), x)
+
+
+def test_sketch_ranks_within_error_bound():
+    rng = random.Random(7)
+    values = [rng.gauss(0, 1) for _ in range(50000)]
+    sketch = KLLSketch(seed=1)
+    for value in values:
+        sketch.update(value)
+    assert sketch.count == 50000 and len(sketch) < 4 * sketch.k
+    for x in (-2, -1, 0, 0.5, 1.5):
+        assert abs(sketch.rank(x) - exact_rank(values, x)) / len(values) < 0.02
+    assert abs(sketch.quantile(0.5)) < 0.05
+
+
+def test_merged_sketches_match_the_union():
+    rng = random.Random(3)
+    parts = [[rng.gauss(mean, 1) for _ in range(8000)] for mean in (-1, 0, 1, 2)]
+    merged = KLLSketch(seed=2)
+    for i, values in enumerate(parts):
+        sketch = KLLSketch(seed=i)
+        for value in values:
+            sketch.update(value)
+        merged.merge(sketch)
+    union = [value for values in parts for value in values]
+    assert merged.count == len(union)
+    for x in (-1, 0.5, 2):
+        assert abs(merged.rank(x) - exact_rank(union, x)) / len(union) < 0.02
+    with pytest.raises(ValueError, match='k=100'):
+        merged.merge(KLLSketch(k=100))
+
+
+def test_sketch_bytes_round_trip():
+    sketch = KLLSketch(seed=5)
+    for i in range(3000):
+        sketch.update(i / 100)
+    restored = KLLSketch.from_bytes(sketch.to_bytes())
+    assert restored.count == sketch.count and len(restored) == len(sketch)
+    assert restored.rank(12.5) == sketch.rank(12.5)
+    restored.update(1.0)
+    assert restored.count == 3001
+    with pytest.raises(ValueError, match='truncated'):
+        KLLSketch.from_bytes(sketch.to_bytes()[:-4])
+
+
+@pytest.fixture
+def db(db, monkeypatch):
+    monkeypatch.setattr(cohort_rank, 'COHORT_MIN_POPULATION', 5)
+    cohort_rank.clear_cohort_cache()
+    yield db
+    cohort_rank.clear_cohort_cache()
+
+
+def add_babies(db, count, gender='F'):
+    for i in range(count):
+        put_baby(db, f'baby-{i}', gender, BIRTH)
+
+
+def on_day(day):
+    return BIRTH + timedelta(days=day)
+
+
+def stored_cohort(db, key=COHORT):
+    return stored(db, COHORTS, key)
+
+
+def stored_zscores(db, count):
+    return [stored(db, GROWTH, f'w{i}')['zscore'] for i in range(count)]
+
+
+def test_stream_keeps_cohorts_of_scored_measurements(db):
+    add_babies(db, 30)
+    for i in range(30):
+        put_growth(db, f'w{i}', on_day(100), 5.0 + i * 0.05, 'kg', baby_id=f'baby-{i}')
+    # Month 7 and a measurement dated before birth have other cohorts, or none
+    put_growth(db, 'late', on_day(220), 7.5, 'kg', baby_id='baby-0')
+    put_growth(db, 'early', on_day(-3), 3.0, 'kg', baby_id='baby-1')
+    sync(db, cohorts)
+
+    cohort = stored_cohort(db)
+    assert cohort['population'] == 30 and cohort['version'] == 1
+    assert stored_cohort(db, 'wfa#female#7')['population'] == 1
+    zscores = sorted(stored_zscores(db, 30))
+    grid = cohorts.unpack_cdf(cohort['cdf'])
+    for z in (zscores[5], zscores[20]):
+        expected = 100 * exact_rank(zscores, z) / 30
+        assert cohort_rank.cohort_percentile(grid, z) == pytest.approx(expected, abs=4)
+    assert zscores[0] <= cohort['quantiles']['p50'] <= zscores[-1]
+
+
+def test_edits_and_deletes_match_a_rebuild(db):
+    add_babies(db, 20)
+    for i in range(20):
+        put_growth(db, f'w{i}', on_day(100), 5.0 + i * 0.1, 'kg', baby_id=f'baby-{i}')
+    sync(db, cohorts)
+    # A value edit, a move to another month and two deletions
+    put_growth(db, 'w3', on_day(100), 7.2, 'kg', baby_id='baby-3')
+    put_growth(db, 'w4', on_day(160), 6.0, 'kg', baby_id='baby-4')
+    db.delete_item(TableName=GROWTH, Key={'dataId': {'S': 'w5'}})
+    db.delete_item(TableName=GROWTH, Key={'dataId': {'S': 'w6'}})
+    sync(db, cohorts)
+
+    incremental = stored_cohort(db)
+    assert incremental['population'] == 17
+    assert stored_cohort(db, 'wfa#female#5')['population'] == 1
+
+    sketches, report = build_cohorts.sketch_table(segments=3, page_size=4, progress=None)
+    assert report['rows'] == 18 and report['scored'] == 18
+    assert build_cohorts.store(sketches) == {'written': 2, 'conflicts': 0, 'failed': 0}
+    rebuilt = stored_cohort(db)
+    assert rebuilt['population'] == 17 and rebuilt['version'] == incremental['version'] + 1
+    assert rebuilt['quantiles'] == pytest.approx(incremental['quantiles'], abs=0.05)
+
+
+def test_concurrent_write_is_retried(db, monkeypatch):
+    add_babies(db, 2)
+    put_growth(db, 'w0', on_day(100), 5.5, 'kg', baby_id='baby-0')
+    sync(db, cohorts)
+    put_growth(db, 'w1', on_day(100), 6.0, 'kg', baby_id='baby-1')
+    records = db.stream_records(GROWTH)
+    stream_handler.lambda_handler({'Records': records}, None)
+    records = db.stream_records(GROWTH)
+
+    original = cohorts.load_cohorts
+    raced = []
+
+    def load_then_race(keys):
+        loaded = original(keys)
+        if not raced:
+            # Another invocation merges its batch between our read and our write
+            raced.append(1)
+            other = KLLSketch()
+            other.update(0.25)
+            cohorts.store_cohorts({COHORT: (other, None)})
+        return loaded
+
+    monkeypatch.setattr(cohorts, 'load_cohorts', load_then_race)
+    failed, stats = cohorts.process_records(records)
+    assert failed == [] and stats['conflicts'] == 1
+    assert stored_cohort(db)['population'] == 3 and stored_cohort(db)['version'] == 3
+
+
+def test_failed_write_reports_the_cohorts_records(db):
+    add_babies(db, 2)
+    put_growth(db, 'w0', on_day(100), 5.5, 'kg', baby_id='baby-0')
+    put_growth(db, 'w1', on_day(220), 7.5, 'kg', baby_id='baby-1')
+    stream_handler.lambda_handler({'Records': db.stream_records(GROWTH)}, None)
+    records = db.stream_records(GROWTH)
+    db.failing_keys.add(COHORT)
+    failed, stats = cohorts.process_records(records)
+    assert failed == [records[0]['dynamodb']['SequenceNumber']]
+    assert stats['written'] == 1
+
+
+
+def test_throttled_baby_lookup_fails_every_record(db):
+    add_babies(db, 2)
+    put_growth(db, 'w0', on_day(100), 5.5, 'kg', baby_id='baby-0')
+    put_growth(db, 'w1', on_day(100), 6.0, 'kg', baby_id='baby-1')
+    stream_handler.lambda_handler({'Records': db.stream_records(GROWTH)}, None)
+    records = db.stream_records(GROWTH)
+    db.throttle['batch_get_item'] = 1
+    response = cohorts.lambda_handler({'Records': records}, None)
+    assert response == {'batchItemFailures': [
+        {'itemIdentifier': record['dynamodb']['SequenceNumber']} for record in records]}
+    assert not db.items[COHORTS]
+
+def query(**params):
+    response = handler({'queryStringParameters': params}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_cohort_percentile_query(db):
+    add_babies(db, 10)
+    for i in range(10):
+        put_growth(db, f'w{i}', on_day(100), 5.0 + i * 0.2, 'kg', baby_id=f'baby-{i}')
+    sync(db, cohorts)
+    zscores = sorted(stored_zscores(db, 10))
+
+    status, body = query(measurementType='weight', sex='F', ageMonths='3', zscore=str(zscores[-1] + 0.1))
+    assert status == 200 and body['population'] == 10 and body['cohortPercentile'] == pytest.approx(100)
+    status, body = query(measurementType='weight', sex='female', ageMonths='3')
+    assert status == 200 and 'cohortPercentile' not in body and set(body['quantiles']) == {
+        f'p{p}' for p in cohorts.COHORT_PERCENTILES}
+
+    # Answered from the cache until it expires
+    calls = len(db.calls)
+    query(measurementType='weight', sex='female', ageMonths='3', zscore='0')
+    assert len(db.calls) == calls and cohort_rank.cohort_cache_stats()['hits'] == 2
+
+    assert query(measurementType='weight', sex='male', ageMonths='3')[0] == 404
+    assert query(measurementType='weight', sex='female', ageMonths='61')[0] == 400
+    assert query(measurementType='weight', sex='female', ageMonths='3', zscore='nan')[0] == 400
+
+
+def test_small_cohorts_are_not_answered(db, monkeypatch):
+    monkeypatch.setattr(cohort_rank, 'COHORT_MIN_POPULATION', 20)
+    add_babies(db, 3)
+    for i in range(3):
+        put_growth(db, f'w{i}', on_day(100), 5.0 + i * 0.2, 'kg', baby_id=f'baby-{i}')
+    sync(db, cohorts)
+    status, body = query(measurementType='weight', sex='female', ageMonths='3', zscore='0')
+    assert status == 404 and 'Not enough' in body['error']
+
+
+def test_build_from_csv_export(db, tmp_path, capsys):
+    path = tmp_path / 'growth.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['dataId', 'babyId', 'measurementType', 'measurementDate', 'zscore', 'gender', 'dateOfBirth'])
+        for i in range(12):
+            writer.writerow([f'w{i}', f'baby-{i}', 'weight', '2025-04-11', i / 4 - 1, 'M', '2025-01-01'])
+        writer.writerow(['w-unscored', 'baby-x', 'weight', '2025-04-11', '', 'M', '2025-01-01'])
+
+    assert build_cohorts.main([str(path), '--dry-run']) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report['rows'] == 13 and report['unscorable'] == 1 and report['cohorts'] == 1
+    assert report['sketches']['wfa#male#3'] == {'population': 12, 'median': 0.5}
+    assert not db.items[COHORTS]
+
+    assert build_cohorts.main([str(path)]) == 0
+    assert stored_cohort(db, 'wfa#male#3')['population'] == 12
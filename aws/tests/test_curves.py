@@ -0,0 +1,90 @@
+"""
+Tests for the reference centile curves endpoint.
+Checks the inverse LMS transform against the scoring path and the
+ETag / 304 behaviour of the handler.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import curves  # noqa: E402
+from aws.lambdas.percentile import percentile_engine as engine  # noqa: E402
+from aws.lambdas.percentile.lms_tables import load_artifact  # noqa: E402
+
+handler = curves.lambda_handler.__wrapped__
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    curves.clear_curve_cache()
+    yield
+    curves.clear_curve_cache()
+
+
+def get(params, headers=None):
+    return handler({"queryStringParameters": params, "headers": headers or {}}, None)
+
+
+@pytest.mark.parametrize('size', [3, 400])
+def test_centile_curves_invert_scoring(size):
+    """Scoring a point of the P-th curve gives back P, on the scalar and NumPy paths"""
+    table = load_artifact()[('wfa', 'female')]
+    xs = [i * 1856 / (size - 1) for i in range(size)]
+    result = engine.centile_curves(table, [3, 50, 97], xs)
+    for centile, values in result.items():
+        for x, value in zip(xs, values):
+            _, percentile, _ = engine.score(value, table, x)
+            assert percentile == pytest.approx(centile, abs=1e-9)
+
+
+def test_median_curve_is_M():
+    table = load_artifact()[('wfa', 'male')]
+    values = engine.centile_curves(table, [50], [0, 30, 365])[50]
+    assert values == pytest.approx([table.M[0], table.M[30], table.M[365]])
+
+
+def test_curves_payload():
+    response = get({"sex": "male", "from": "0", "to": "70", "step": "7"})
+    assert response["statusCode"] == 200
+    payload = json.loads(response["body"])
+    assert payload["x"] == [float(d) for d in range(0, 71, 7)]
+    assert list(payload["centiles"]) == ["P3", "P15", "P50", "P85", "P97"]
+    p3, p97 = payload["centiles"]["P3"], payload["centiles"]["P97"]
+    assert all(low < high for low, high in zip(p3, p97))
+    assert p3 == sorted(p3)
+    assert response["headers"]["Cache-Control"].startswith("public")
+
+
+def test_etag_is_stable_and_honours_if_none_match():
+    params = {"sex": "female", "centiles": "50,10"}
+    first = get(params)
+    etag = first["headers"]["ETag"]
+    curves.clear_curve_cache()
+    assert get(params)["headers"]["ETag"] == etag
+    assert list(json.loads(first["body"])["centiles"]) == ["P10", "P50"]
+
+    not_modified = get(params, {"if-none-match": f'W/"other", {etag}'})
+    assert not_modified["statusCode"] == 304
+    assert not_modified["body"] == ""
+    assert get({"sex": "male", "centiles": "50,10"}, {"If-None-Match": etag})["statusCode"] == 200
+
+
+@pytest.mark.parametrize('params', [
+    {},
+    {"sex": "female", "indicator": "xyz"},
+    {"sex": "female", "to": "5000"},
+    {"sex": "female", "step": "0"},
+    {"sex": "female", "step": "0.1"},
+    {"sex": "female", "centiles": "0,50"},
+])
+def test_invalid_requests(params):
+    response = get(params)
+    assert response["statusCode"] == 400
+    body = json.loads(response["body"])
+    assert body["success"] is False and "input" not in body
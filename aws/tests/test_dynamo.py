@@ -0,0 +1,43 @@
+"""
+Tests for the DynamoDB JSON conversion and batch helpers in dynamo.py.
+"""
+
+import os
+import sys
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import dynamo  # noqa: E402
+from aws.tools.local_dynamodb import LocalDynamoDB  # noqa: E402
+
+
+def test_item_round_trip():
+    item = {
+        'dataId': 'g1', 'value': 4500, 'percentile': 26.32, 'isEstimated': False, 'notes': None,
+        'deviceInfo': {'model': 'scale', 'readings': [1, 2.5]}, 'tags': {'a', 'b'},
+    }
+    dumped = dynamo.dump_item(item)
+    assert dumped['value'] == {'N': '4500'}
+    assert dumped['percentile'] == {'N': '26.32'}
+    assert dynamo.load_item(dumped) == item
+
+
+def test_binary_round_trip():
+    assert dynamo.serialize(b'\x00KLL') == {'B': b'\x00KLL'}
+    # Stream records and exports carry binary values base64-encoded
+    assert dynamo.deserialize({'B': 'AEtMTA=='}) == b'\x00KLL'
+
+
+def test_batch_get_chunks_and_projects():
+    db = LocalDynamoDB({'babies': 'babyId'})
+    dynamo.set_client(db)
+    try:
+        for i in range(150):
+            db.put_item(TableName='babies', Item=dynamo.dump_item({'babyId': f'b{i}', 'gender': 'F', 'name': 'x'}))
+        found = dynamo.batch_get('babies', 'babyId', [f'b{i}' for i in range(150)] + ['missing'], ('gender',))
+    finally:
+        dynamo.set_client(None)
+    assert len(found) == 150
+    assert found['b7'] == {'babyId': 'b7', 'gender': 'F'}
+    assert db.calls.count('batch_get_item') == 2
@@ -0,0 +1,173 @@
+"""
+Tests for the negotiated response encodings: format and gzip negotiation
+(binary bodies only where API Gateway decodes them), columnar and NDJSON
+batch results matching the JSON ones, no input echo unless asked for, the
+payload limit, and per-encoding curve ETags.
+"""
+
+import base64
+import gzip
+import json
+import os
+import sys
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import curves  # noqa: E402
+import encoding  # noqa: E402
+import lambda_function  # noqa: E402
+
+handler = lambda_function.lambda_handler.__wrapped__
+
+MEASUREMENTS = [
+    {'weight': 5.35, 'date_birth': '2025-03-25', 'date_measurement': '2025-06-22', 'sex': 'female'},
+    {'weight': 8.2, 'height': 70.0, 'date_birth': '2024-01-15', 'date_measurement': '2024-07-15', 'sex': 'male'},
+    {'weight': 4.0, 'date_birth': '2025-03-25', 'sex': 'female'},
+]
+
+
+def call(body, **headers):
+    return handler({'body': json.dumps(body), 'headers': headers}, None)
+
+
+def decoded(response):
+    body = response['body']
+    if response.get('isBase64Encoded'):
+        body = base64.b64decode(body)
+        if response['headers'].get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        body = body.decode()
+    return body
+
+
+@pytest.mark.parametrize('headers, requested, expected', [
+    ({}, None, ('json', False)),
+    ({'Accept': 'application/x-ndjson, application/json'}, None, ('ndjson', False)),
+    ({'accept': 'text/html, application/vnd.upnest.columnar+json;q=0.9'}, None, ('columnar', False)),
+    ({'Accept': 'application/x-ndjson;q=0', 'Accept-Encoding': 'gzip, deflate, br'}, None, ('json', True)),
+    ({'Accept-Encoding': 'gzip;q=0'}, None, ('json', False)),
+    ({'Accept': 'application/x-ndjson'}, 'columnar', ('columnar', False)),
+])
+def test_negotiate(headers, requested, expected):
+    assert encoding.negotiate({'headers': headers}, requested) == expected
+
+
+def test_unavailable_formats_are_rejected(monkeypatch):
+    monkeypatch.setattr(encoding, '_msgpack_module', False)
+    assert encoding.negotiate({'headers': {'Accept': 'application/x-msgpack'}}) == ('json', False)
+    for name in ('msgpack', 'xml'):
+        response = call({'measurements': MEASUREMENTS, 'format': name})
+        assert response['statusCode'] == 400 and 'not available' in json.loads(response['body'])['error']
+
+
+@pytest.mark.parametrize('headers, requested, expected', [
+    ({'Accept': 'application/json', 'Accept-Encoding': 'gzip'}, None, ('json', False)),
+    ({'Accept': 'application/gzip', 'Accept-Encoding': 'gzip'}, None, ('json', True)),
+    ({'Accept': 'application/x-msgpack, application/json'}, None, ('msgpack', False)),
+    ({'Accept': 'text/html, application/x-msgpack'}, None, ('json', False)),
+    ({'Accept': 'application/x-ndjson', 'Accept-Encoding': 'gzip'}, None, ('ndjson', False)),
+])
+def test_binary_bodies_need_a_binary_accept_type(monkeypatch, headers, requested, expected):
+    # As deployed: API Gateway only decodes base64 bodies for its binary media types
+    monkeypatch.setattr(encoding, 'BINARY_MEDIA_TYPES', ('application/gzip', 'application/x-msgpack'))
+    monkeypatch.setattr(encoding, '_msgpack_module', object())
+    assert encoding.negotiate({'headers': headers}, requested) == expected
+
+
+def test_requested_binary_format_without_binary_accept_is_rejected(monkeypatch):
+    monkeypatch.setattr(encoding, 'BINARY_MEDIA_TYPES', ('application/x-msgpack',))
+    monkeypatch.setattr(encoding, '_msgpack_module', object())
+    with pytest.raises(ValueError, match="needs 'Accept: application/x-msgpack'"):
+        encoding.negotiate({'headers': {'Accept': 'application/json'}}, 'msgpack')
+    assert encoding.negotiate({'headers': {'Accept': 'application/x-msgpack'}}, 'msgpack') == ('msgpack', False)
+
+
+def test_input_is_only_echoed_on_request():
+    assert 'input' not in json.loads(call({'measurements': MEASUREMENTS})['body'])
+    assert 'input' not in json.loads(call(MEASUREMENTS[0])['body'])
+    echoed = json.loads(call({'measurements': MEASUREMENTS, 'echo': True})['body'])
+    assert echoed['input']['measurements'] == MEASUREMENTS
+
+
+def test_columnar_matches_json_results():
+    results = json.loads(call({'measurements': MEASUREMENTS})['body'])['results']
+    response = call({'measurements': MEASUREMENTS}, Accept='application/vnd.upnest.columnar+json')
+    assert response['headers']['Content-Type'] == 'application/vnd.upnest.columnar+json'
+    body = json.loads(response['body'])
+    assert body['count'] == 3 and body['failed'] == 1 and 'results' not in body
+    columns = body['columns']
+    assert columns['success'] == [r['success'] for r in results]
+    assert columns['error'] == [r.get('error') for r in results]
+    wfa = columns['indicators']['wfa']
+    assert wfa['percentile'] == [r.get('percentile') for r in results]
+    assert wfa['L'] == [r['LMS']['L'] if 'LMS' in r else None for r in results]
+    # Indicators without a table carry their error in the column
+    lhfa = columns['indicators']['lhfa']
+    assert lhfa['percentile'] == [None, None, None] and lhfa['error'][1] == results[1]['indicators']['lhfa']['error']
+
+
+def test_ndjson_has_one_line_per_result():
+    response = call({'measurements': MEASUREMENTS, 'format': 'ndjson'})
+    head, *rows = [json.loads(line) for line in response['body'].splitlines()]
+    assert head['count'] == 3 and 'results' not in head
+    assert rows == json.loads(call({'measurements': MEASUREMENTS})['body'])['results']
+
+
+def test_gzip_is_used_for_large_bodies_only():
+    small = call(MEASUREMENTS[0], **{'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small['headers'] and not small.get('isBase64Encoded')
+
+    body = {'measurements': MEASUREMENTS * 20}
+    plain = call(body)
+    zipped = call(body, **{'Accept-Encoding': 'gzip'})
+    assert zipped['isBase64Encoded'] and zipped['headers']['Content-Encoding'] == 'gzip'
+    assert decoded(zipped) == plain['body']
+    assert len(zipped['body']) < len(plain['body']) / 4
+
+
+def test_msgpack_is_binary(monkeypatch):
+    class FakeMsgpack:
+        @staticmethod
+        def packb(payload, use_bin_type):
+            return b'\x81' + json.dumps(payload).encode()
+    monkeypatch.setattr(encoding, '_msgpack_module', FakeMsgpack)
+    response = call({'measurements': MEASUREMENTS}, Accept='application/x-msgpack')
+    assert response['isBase64Encoded'] and response['headers']['Content-Type'] == 'application/x-msgpack'
+    assert base64.b64decode(response['body']).startswith(b'\x81')
+
+
+def test_msgpack_roundtrip():
+    msgpack = pytest.importorskip('msgpack')
+    response = call({'measurements': MEASUREMENTS, 'format': 'msgpack'})
+    assert msgpack.unpackb(base64.b64decode(response['body'])) == json.loads(call({'measurements': MEASUREMENTS})['body'])
+
+
+def test_oversized_responses_are_413(monkeypatch):
+    monkeypatch.setattr(encoding, 'MAX_RESPONSE_BYTES', 2000)
+    response = call({'measurements': MEASUREMENTS * 20})
+    assert response['statusCode'] == 413 and 'gzip' in json.loads(response['body'])['error']
+
+
+def test_base64_request_bodies():
+    raw = json.dumps({'measurements': MEASUREMENTS}).encode()
+    plain = handler({'body': base64.b64encode(raw).decode(), 'isBase64Encoded': True}, None)
+    zipped = handler({'body': base64.b64encode(gzip.compress(raw)).decode(), 'isBase64Encoded': True,
+                      'headers': {'Content-Encoding': 'gzip'}}, None)
+    assert plain['statusCode'] == zipped['statusCode'] == 200
+    assert plain['body'] == zipped['body']
+
+
+def test_curve_encodings_are_cached_and_tagged_separately():
+    curves.clear_curve_cache()
+    params = {'sex': 'female', 'step': '1'}
+    event = {'queryStringParameters': params, 'headers': {}}
+    plain = curves.lambda_handler.__wrapped__(dict(event), None)
+    zipped = curves.lambda_handler.__wrapped__(dict(event, headers={'Accept-Encoding': 'gzip'}), None)
+    assert zipped['headers']['ETag'] != plain['headers']['ETag']
+    assert decoded(zipped) == plain['body']
+    again = curves.lambda_handler.__wrapped__(
+        dict(event, headers={'Accept-Encoding': 'gzip', 'If-None-Match': zipped['headers']['ETag']}), None)
+    assert again['statusCode'] == 304
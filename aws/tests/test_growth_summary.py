@@ -0,0 +1,195 @@
+"""
+Tests for the materialized growth summary, run against the in-memory
+DynamoDB stand-in: incremental updates from the GrowthData stream (including
+the score write-backs of the enrichment worker) must match a rebuild from
+scratch, replays must not double count, babies with earlier measurements
+start from the index, concurrent writes retry, and the build tool backfills
+every baby.
+"""
+
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import dynamo  # noqa: E402
+import growth_summary  # noqa: E402
+from aws.tests.conftest import GROWTH, SUMMARY, put_baby, put_growth, stored, sync  # noqa: E402
+from aws.tools import build_summaries  # noqa: E402
+
+BIRTH = date(2025, 1, 1)
+
+
+@pytest.fixture
+def db(db):
+    put_baby(db, 'baby-f', 'F', BIRTH)
+    return db
+
+
+def on_day(day):
+    return BIRTH + timedelta(days=day)
+
+
+def summary(db, baby_id='baby-f'):
+    return stored(db, SUMMARY, baby_id)
+
+
+def rebuilt(db, baby_id='baby-f'):
+    growth_summary.rebuild_babies([baby_id])
+    return summary(db, baby_id)
+
+
+def test_bucket_resolution():
+    assert [growth_summary.bucket(d) for d in (0, 6, 7, 90, 91, 120, 121, 730, 731, 822)] == \
+        [0, 0, 7, 84, 91, 91, 121, 721, 731, 822]
+
+
+def test_summary_follows_inserts_and_score_writebacks(db):
+    for i, day in enumerate(range(0, 400, 10)):
+        put_growth(db, f'w{i:02d}', on_day(day), round(3.3 + day * 0.02, 2), 'kg')
+    put_growth(db, 'h1', on_day(30), 54.0, 'cm', kind='height')
+    sync(db, growth_summary)
+
+    result = summary(db)
+    weight = result['types']['weight']
+    assert weight['count'] == 40 and weight['unit'] == 'kg'
+    assert weight['latest'][4] == 'w39' and weight['latest'][3] is not None
+    # Weekly, then 30-day buckets: fewer points than measurements, newest per bucket
+    assert len(weight['series']) < 40 and weight['series'][-1] == weight['latest']
+    assert all(point[2] is not None for point in weight['series'])
+    assert weight['trend']['direction'] in ('up', 'down', 'stable')
+    assert result['types']['height']['count'] == 1
+    assert result['types'] == rebuilt(db)['types']
+
+
+def test_edits_and_deletes_match_rebuild(db):
+    for i, day in enumerate((0, 3, 5, 14, 40, 70, 100)):
+        put_growth(db, f'w{i}', on_day(day), 3.3 + i * 0.4, 'kg')
+    sync(db, growth_summary)
+    # A notes edit, a value edit, a date move, a delete of a shown point and of a hidden one
+    item = dynamo.load_item(db.items[GROWTH]['w6'])
+    db.put_item(TableName=GROWTH, Item=dynamo.dump_item(dict(item, notes='checkup')))
+    put_growth(db, 'w5', on_day(70), 6.1, 'kg')
+    put_growth(db, 'w4', on_day(45), 5.0, 'kg')
+    db.delete_item(TableName=GROWTH, Key={'dataId': {'S': 'w2'}})
+    db.delete_item(TableName=GROWTH, Key={'dataId': {'S': 'w1'}})
+    db.delete_item(TableName=GROWTH, Key={'dataId': {'S': 'w6'}})
+    sync(db, growth_summary)
+
+    incremental = summary(db)['types']
+    assert incremental['weight']['count'] == 4
+    assert incremental['weight']['latest'][4] == 'w5'
+    assert incremental == rebuilt(db)['types']
+
+
+def test_replayed_records_are_not_counted_twice(db):
+    put_growth(db, 'w1', on_day(10), 3.9, 'kg')
+    put_growth(db, 'w2', on_day(20), 4.2, 'kg')
+    records = db.stream_records(GROWTH)
+    growth_summary.lambda_handler({'Records': records}, None)
+    failed, stats = growth_summary.process_records(records)
+    assert failed == [] and stats['replayed'] == 2 and stats['written'] == 0
+    assert summary(db)['types']['weight']['count'] == 2
+    assert summary(db)['version'] == 1
+
+    # An older record of an item replayed after a newer one is skipped too
+    put_growth(db, 'w1', on_day(10), 4.0, 'kg')
+    newer = db.stream_records(GROWTH)
+    growth_summary.lambda_handler({'Records': newer}, None)
+    growth_summary.process_records(records[:1] + newer)
+    assert summary(db)['types']['weight']['latest'][1] == 4.2
+    assert [point[1] for point in summary(db)['types']['weight']['series']] == [4.0, 4.2]
+
+
+def test_applied_window_is_bounded(db, monkeypatch):
+    monkeypatch.setattr(growth_summary, 'APPLIED_WINDOW', 5)
+    for i in range(12):
+        put_growth(db, f'w{i:02d}', on_day(i * 10), 3.5 + i * 0.1, 'kg')
+        growth_summary.lambda_handler({'Records': db.stream_records(GROWTH)}, None)
+    result = summary(db)
+    assert result['types']['weight']['count'] == 12 and 'ids' not in result['types']['weight']
+    assert [data_id for data_id, _ in result['applied']] == [f'w{i:02d}' for i in range(7, 12)]
+
+
+def test_babies_with_earlier_measurements_start_from_the_index(db):
+    # Stored before the summary consumer was deployed: never seen on its stream
+    for i in range(5):
+        put_growth(db, f'old{i}', on_day(i * 20), 3.5 + i * 0.5, 'kg')
+    db.stream_records(GROWTH)
+    put_growth(db, 'new', on_day(110), 6.2, 'kg')
+    growth_summary.lambda_handler({'Records': db.stream_records(GROWTH)}, None)
+    weight = summary(db)['types']['weight']
+    assert weight['count'] == 6 and len(weight['series']) == 6
+    assert weight['latest'][4] == 'new'
+    assert summary(db)['types'] == rebuilt(db)['types']
+
+
+def test_concurrent_write_is_retried(db, monkeypatch):
+    put_growth(db, 'w1', on_day(10), 3.9, 'kg')
+    growth_summary.lambda_handler({'Records': db.stream_records(GROWTH)}, None)
+    put_growth(db, 'w2', on_day(20), 4.2, 'kg')
+    records = db.stream_records(GROWTH)
+
+    original = growth_summary.load_summaries
+    raced = []
+
+    def load_then_race(baby_ids):
+        summaries = original(baby_ids)
+        if not raced:
+            # Another invocation writes between our read and our write
+            raced.append(1)
+            growth_summary.rebuild_babies(baby_ids)
+        return summaries
+
+    monkeypatch.setattr(growth_summary, 'load_summaries', load_then_race)
+    failed, stats = growth_summary.process_records(records)
+    assert failed == [] and stats['conflicts'] == 1
+    assert summary(db)['types']['weight']['count'] == 2
+
+
+def test_failed_write_reports_the_babys_records(db):
+    put_growth(db, 'w1', on_day(10), 3.9, 'kg')
+    records = db.stream_records(GROWTH)
+    db.failing_keys.add('baby-f')
+    response = growth_summary.lambda_handler({'Records': records}, None)
+    assert response == {'batchItemFailures': [{'itemIdentifier': records[0]['dynamodb']['SequenceNumber']}]}
+
+
+def test_unknown_babies_and_types_are_skipped(db):
+    put_growth(db, 'w1', on_day(10), 3.9, 'kg', baby_id='missing')
+    put_growth(db, 'x1', on_day(10), 1.0, 'kg', kind='temperature')
+    failed, stats = growth_summary.process_records(db.stream_records(GROWTH))
+    assert failed == [] and stats['orphaned'] == 1
+    assert db.items[SUMMARY] == {}
+
+
+def test_moving_a_measurement_to_another_baby(db):
+    put_baby(db, 'baby-g', 'F', BIRTH)
+    put_growth(db, 'w1', on_day(10), 3.9, 'kg')
+    put_growth(db, 'w2', on_day(20), 4.2, 'kg')
+    sync(db, growth_summary)
+    put_growth(db, 'w2', on_day(20), 4.2, 'kg', baby_id='baby-g')
+    sync(db, growth_summary)
+    assert summary(db)['types']['weight']['count'] == 1
+    assert summary(db, 'baby-g')['types']['weight']['latest'][4] == 'w2'
+    assert summary(db)['types'] == rebuilt(db)['types']
+
+
+def test_build_tool_backfills_every_baby(db, capsys):
+    put_baby(db, 'baby-g', 'F', BIRTH)
+    for i in range(3):
+        put_growth(db, f'f{i}', on_day(i * 30), 3.5 + i * 0.8, 'kg')
+        put_growth(db, f'g{i}', on_day(i * 30), 3.2 + i * 0.7, 'kg', baby_id='baby-g')
+    report = build_summaries.rebuild_table(segments=2, page_size=1, progress=None)
+    assert report['babies'] == 2 and report['written'] == 2 and report['failed'] == 0
+    assert summary(db)['types']['weight']['count'] == 3
+    assert summary(db, 'baby-g')['types']['weight']['latest'][4] == 'g2'
+
+    assert build_summaries.main(['--baby-id', 'baby-g']) == 0
+    assert json.loads(capsys.readouterr().out)['written'] == 1
+    assert summary(db, 'baby-g')['version'] == 2
@@ -0,0 +1,100 @@
+"""
+Tests for the baby history endpoint against the in-memory DynamoDB stand-in:
+ownership is checked against the JWT sub, the history is read across query
+pages and scored like the synchronous endpoint, and the summary view reads
+the stored growth summary.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import growth_summary  # noqa: E402
+import history  # noqa: E402
+import lambda_function  # noqa: E402
+from aws.tests.conftest import SUMMARY, put_baby, put_growth  # noqa: E402
+
+handler = history.lambda_handler.__wrapped__
+
+
+@pytest.fixture
+def db(db):
+    put_baby(db, 'baby-f', 'F', '2025-03-25')
+    put_baby(db, 'baby-x', 'M', '2025-01-01', user_id='user-2')
+    for i, (date, grams) in enumerate([('2025-06-22', 5350), ('2025-04-25', 4100), ('2025-05-24', 4900)]):
+        put_growth(db, f'w{i}', date, grams, 'grams')
+    put_growth(db, 'h0', '2025-06-22', 59.5, 'cm', kind='height')
+    put_growth(db, 'bad', '2025-01-01', 3000, 'grams')
+    put_growth(db, 'other', '2025-06-22', 7.0, 'kg', baby_id='baby-x')
+    return db
+
+
+def call(params, sub='user-1'):
+    response = handler({'queryStringParameters': params, 'user': {'sub': sub}}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_history_is_scored_like_the_synchronous_endpoint(db):
+    status, body = call({'babyId': 'baby-f'})
+    assert status == 200 and body['sex'] == 'female' and body['count'] == 5
+    weights = body['series']['weight']
+    assert [p['dataId'] for p in weights] == ['w1', 'w2', 'w0']
+    expected = lambda_function.score_measurements(
+        [{'weight': 5.35, 'date_birth': '2025-03-25', 'date_measurement': '2025-06-22', 'sex': 'female'}])[0]
+    assert weights[-1]['zscore'] == pytest.approx(expected['zscore'])
+    assert weights[-1]['percentile'] == pytest.approx(expected['percentile'], abs=0.01)
+    # Only the weight-for-age table is installed here
+    assert list(body['series']) == ['weight']
+    assert {p['dataId']: p['measurementType'] for p in body['unscorable']} == {'bad': 'weight', 'h0': 'height'}
+    assert 'before birth' in next(p['error'] for p in body['unscorable'] if p['dataId'] == 'bad')
+
+
+def test_history_follows_query_pages(db, monkeypatch):
+    monkeypatch.setattr(history, 'HISTORY_PAGE_SIZE', 2)
+    status, body = call({'babyId': 'baby-f', 'measurementType': 'weight'})
+    assert status == 200 and len(body['series']['weight']) == 3 and list(body['series']) == ['weight']
+    assert db.calls.count('query') == 3
+
+
+def test_summary_view(db):
+    # No summary stored yet: built from the index for the response, not written
+    status, body = call({'babyId': 'baby-f', 'view': 'summary'})
+    assert status == 200 and body['sex'] == 'female' and body['updatedAt'] is None
+    weight = body['types']['weight']
+    assert weight['count'] == 4 and weight['unit'] == 'kg' and weight['latest'][4] == 'w0'
+    assert [point[4] for point in weight['series']] == ['w1', 'w2', 'w0']
+    assert set(body['types']) == {'weight', 'height'} and not db.items[SUMMARY]
+
+    growth_summary.rebuild_babies(['baby-f'])
+    calls = len(db.calls)
+    status, body = call({'babyId': 'baby-f', 'view': 'summary', 'measurementType': 'height'})
+    assert status == 200 and list(body['types']) == ['height'] and body['updatedAt']
+    assert 'query' not in db.calls[calls:] and 'applied' not in body
+    assert call({'babyId': 'baby-x', 'view': 'summary'})[0] == 404
+
+
+def test_other_users_babies_are_not_found(db):
+    assert call({'babyId': 'baby-x'})[0] == 404
+    assert call({'babyId': 'missing'})[0] == 404
+    assert call({'babyId': 'baby-f'}, sub=None)[0] == 404
+    assert 'query' not in db.calls
+
+
+@pytest.mark.parametrize('params, error', [
+    ({}, 'babyId'),
+    ({'babyId': 'baby-f', 'measurementType': 'temperature'}, 'measurementType must be'),
+    ({'babyId': 'baby-f', 'view': 'chart'}, 'view must be'),
+])
+def test_invalid_requests(db, params, error):
+    status, body = call(params)
+    assert status == 400 and error in body['error'] and 'input' not in body
+
+
+def test_storage_errors_are_500(db):
+    db.throttle['query'] = 1
+    assert call({'babyId': 'baby-f'})[0] == 500
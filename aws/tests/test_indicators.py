@@ -0,0 +1,105 @@
+"""
+Tests for the growth indicator registry.
+Uses small synthetic LMS tables for the indicators whose WHO files are not
+bundled, and checks routing, BMI derivation and per-indicator errors.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile'))
+
+from aws.lambdas.percentile import indicators
+from aws.lambdas.percentile.lambda_function import lambda_handler
+from aws.lambdas.percentile.lms_tables import LMSTable
+
+
+def synthetic_table(code, sex, index_name, start, step, rows, M):
+    x = [start + i * step for i in range(rows)]
+    return LMSTable(code, sex, index_name, x, [1.0] * rows, [M] * rows, [0.1] * rows, step)
+
+
+SYNTHETIC = {
+    ('lhfa', 'female'): synthetic_table('lhfa', 'female', 'Day', 0, 1.0, 1857, 60.0),
+    ('bfa', 'female'): synthetic_table('bfa', 'female', 'Day', 0, 1.0, 1857, 15.0),
+    ('wfl', 'female'): synthetic_table('wfl', 'female', 'Length', 45.0, 0.1, 651, 6.0),
+    ('wfh', 'female'): synthetic_table('wfh', 'female', 'Height', 65.0, 0.1, 551, 12.0),
+    ('hcfa', 'female'): None,
+}
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    """Install the synthetic tables in both module copies (package and Lambda-flat imports)"""
+    modules = [indicators, sys.modules.get('indicators')]
+    for module in filter(None, modules):
+        for key, table in SYNTHETIC.items():
+            monkeypatch.setitem(module.TABLES, key, table)
+
+
+def test_registry_covers_stored_measurement_types():
+    measured = {indicator.measurement for indicator in indicators.INDICATORS.values()}
+    assert measured == set(indicators.MEASUREMENT_FIELDS)
+
+
+def test_measurement_values_derives_bmi():
+    values = indicators.measurement_values({'weight': '6.4', 'height': 64})
+    assert values['bmi'] == round(6.4 / 0.64 ** 2, 2)
+    assert 'bmi' not in indicators.measurement_values({'weight': 6.4})
+
+
+def test_measurement_values_quantized_to_precision():
+    values = indicators.measurement_values({'weight': 5.35049, 'height': 61.96, 'head_circumference': 40.04})
+    assert values == {'weight': 5.35, 'height': 62.0, 'head_circumference': 40.0, 'bmi': 13.92}
+
+
+@pytest.mark.parametrize('field', ['weight', 'height'])
+def test_measurement_values_rejects_non_positive(field):
+    with pytest.raises(ValueError, match=f'{field} must be a positive number'):
+        indicators.measurement_values({field: -1})
+
+
+def test_plan_routes_length_and_height(tables):
+    values = indicators.measurement_values({'weight': 6.0, 'height': 64.0})
+    rows, errors = indicators.plan('female', 100, values)
+    assert [row[0] for row in rows] == ['wfa', 'lhfa', 'bfa', 'wfl']
+    assert errors == {}
+
+    rows, _ = indicators.plan('female', 800, indicators.measurement_values({'weight': 11.0, 'height': 85.0}))
+    assert 'wfh' in [row[0] for row in rows] and 'wfl' not in [row[0] for row in rows]
+
+
+def test_plan_reports_missing_table_and_out_of_range(tables):
+    rows, errors = indicators.plan('female', 100, {'head_circumference': 40.0, 'weight': 4.0, 'height': 40.0})
+    assert 'not available' in errors['hcfa']
+    assert 'outside the Weight-for-length reference range' in errors['wfl']
+    assert 'wfa' in [row[0] for row in rows]
+
+
+def test_handler_scores_all_indicators_in_one_call(tables):
+    event = {"body": json.dumps({
+        "weight": 6.0,
+        "height": 60.0,
+        "head_circumference": 40.0,
+        "date_birth": "2025-03-25",
+        "date_measurement": "2025-06-22",
+        "sex": "female",
+    })}
+    body = json.loads(lambda_handler.__wrapped__(event, None)["body"])
+    assert body["success"] is True
+    assert list(body["indicators"]) == ['wfa', 'lhfa', 'hcfa', 'bfa', 'wfl']
+    assert body["indicators"]["lhfa"]["zscore"] == pytest.approx(0.0)
+    assert body["indicators"]["wfl"]["percentile"] == 50.0
+    assert body["indicators"]["hcfa"]["success"] is False
+    assert body["percentile"] == body["indicators"]["wfa"]["percentile"]
+
+
+def test_handler_height_only(tables):
+    event = {"height": 66.0, "date_birth": "2025-03-25", "date_measurement": "2025-06-22", "sex": "female"}
+    body = json.loads(lambda_handler.__wrapped__(event, None)["body"])
+    assert body["success"] is True
+    assert "percentile" not in body
+    assert list(body["indicators"]) == ['lhfa']
@@ -0,0 +1,190 @@
+"""
+Tests for the JWKS key cache in jwt_validator, against a local stand-in
+JWKS server: TTL refresh, key rotation, single-flight fetches, bounded
+timeouts, backing off after a failed refresh and pre-warming.
+"""
+
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from aws.lambdas.percentile import jwt_validator
+from aws.tools.local_jwks import JWKSServer, SigningKey, id_token_claims, jwks_document
+
+POOL_ID = 'us-east-1_local'
+CLIENT_ID = 'local-client'
+ISSUER = f'https://cognito-idp.us-east-1.amazonaws.com/{POOL_ID}'
+
+
+@pytest.fixture(scope='module')
+def keys():
+    return [SigningKey('key-1'), SigningKey('key-2')]
+
+
+@pytest.fixture
+def validator(monkeypatch):
+    """jwt_validator with an empty key cache, configured for the local pool"""
+    monkeypatch.setattr(jwt_validator, 'COGNITO_REGION', 'us-east-1')
+    monkeypatch.setattr(jwt_validator, 'COGNITO_USER_POOL_ID', POOL_ID)
+    monkeypatch.setattr(jwt_validator, 'COGNITO_CLIENT_ID', CLIENT_ID)
+    monkeypatch.setattr(jwt_validator, '_jwks_cache', None)
+    monkeypatch.setattr(jwt_validator, '_jwks_fetched_at', 0.0)
+    monkeypatch.setattr(jwt_validator, '_last_fetch_attempt', float('-inf'))
+    monkeypatch.setattr(jwt_validator, '_last_fetch_failure', float('-inf'))
+    monkeypatch.setattr(jwt_validator, '_public_keys', {})
+    # Exercise the key cache on every call, not the verified token cache
+    monkeypatch.setattr(jwt_validator, 'TOKEN_CACHE_SIZE', 0)
+    return jwt_validator
+
+
+def token_for(key, **extra):
+    return key.sign(id_token_claims(ISSUER, CLIENT_ID, **extra))
+
+
+def test_keys_are_parsed_once(validator, keys, monkeypatch):
+    with JWKSServer(keys[:1]) as server:
+        monkeypatch.setattr(validator, 'JWKS_URL', server.url)
+        for _ in range(5):
+            assert validator.validate_jwt_token(token_for(keys[0]))['sub'] == 'local-user'
+        assert server.requests == 1
+        assert set(validator._public_keys) == {'key-1'}
+
+
+def test_ttl_expiry_refreshes(validator, keys, monkeypatch):
+    with JWKSServer(keys[:1]) as server:
+        monkeypatch.setattr(validator, 'JWKS_URL', server.url)
+        monkeypatch.setattr(validator, 'JWKS_CACHE_TTL', 0.05)
+        validator.validate_jwt_token(token_for(keys[0]))
+        time.sleep(0.1)
+        validator.validate_jwt_token(token_for(keys[0]))
+        assert server.requests == 2
+
+
+def test_failed_refresh_keeps_cached_key(validator, keys, monkeypatch):
+    with JWKSServer(keys[:1]) as server:
+        monkeypatch.setattr(validator, 'JWKS_URL', server.url)
+        validator.validate_jwt_token(token_for(keys[0]))
+    monkeypatch.setattr(validator, 'JWKS_CACHE_TTL', 0.0)
+    assert validator.validate_jwt_token(token_for(keys[0]))['sub'] == 'local-user'
+
+
+def test_failed_refresh_is_not_retried_within_the_interval(validator, keys, monkeypatch):
+    with JWKSServer(keys[:1]) as server:
+        monkeypatch.setattr(validator, 'JWKS_URL', server.url)
+        validator.validate_jwt_token(token_for(keys[0]))
+    monkeypatch.setattr(validator, 'JWKS_CACHE_TTL', 0.0)
+    fetches = []
+
+    def unreachable(*args, **kwargs):
+        fetches.append(1)
+        raise requests.ConnectionError('JWKS endpoint down')
+
+    monkeypatch.setattr(requests, 'get', unreachable)
+    for _ in range(3):
+        assert validator.validate_jwt_token(token_for(keys[0]))['sub'] == 'local-user'
+    assert len(fetches) == 1
+
+    # Retried once the interval has passed
+    monkeypatch.setattr(validator, 'JWKS_MIN_REFRESH_INTERVAL', 0.0)
+    validator.validate_jwt_token(token_for(keys[0]))
+    assert len(fetches) == 2
+
+
+
+def test_failed_cold_fetch_is_not_retried_within_the_interval(validator, keys, monkeypatch):
+    fetches = []
+
+    def unreachable(*args, **kwargs):
+        fetches.append(1)
+        raise requests.ConnectionError('JWKS endpoint down')
+
+    monkeypatch.setattr(requests, 'get', unreachable)
+    with pytest.raises(requests.ConnectionError):
+        validator.get_public_key('key-1')
+    # Rejected without calling the endpoint again until the interval has passed
+    for _ in range(3):
+        with pytest.raises(ValueError, match='Unable to find JWK'):
+            validator.get_public_key('key-1')
+    assert len(fetches) == 1
+
+    monkeypatch.setattr(validator, 'JWKS_MIN_REFRESH_INTERVAL', 0.0)
+    with pytest.raises(requests.ConnectionError):
+        validator.get_public_key('key-1')
+    assert len(fetches) == 2
+
+def test_unknown_kid_refreshes_after_rotation(validator, keys, monkeypatch):
+    with JWKSServer(keys[:1]) as server:
+        monkeypatch.setattr(validator, 'JWKS_URL', server.url)
+        monkeypatch.setattr(validator, 'JWKS_MIN_REFRESH_INTERVAL', 0.0)
+        validator.validate_jwt_token(token_for(keys[0]))
+        server.keys = keys  # Cognito rotates in key-2
+        assert validator.validate_jwt_token(token_for(keys[1]))['sub'] == 'local-user'
+        assert server.requests == 2
+
+
+def test_unknown_kid_refresh_is_rate_limited(validator, keys, monkeypatch):
+    with JWKSServer(keys[:1]) as server:
+        monkeypatch.setattr(validator, 'JWKS_URL', server.url)
+        validator.validate_jwt_token(token_for(keys[0]))
+        for _ in range(3):
+            with pytest.raises(ValueError, match='Unable to find JWK'):
+                validator.validate_jwt_token(token_for(SigningKey('forged')))
+        assert server.requests == 1
+
+
+def test_concurrent_misses_share_one_fetch(validator, keys, monkeypatch):
+    with JWKSServer(keys, delay=0.2) as server:
+        monkeypatch.setattr(validator, 'JWKS_URL', server.url)
+        barrier = threading.Barrier(8)
+        errors = []
+
+        def validate():
+            barrier.wait()
+            try:
+                validator.validate_jwt_token(token_for(keys[1]))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=validate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert server.requests == 1
+
+
+def test_fetch_timeout_is_bounded(validator, keys, monkeypatch):
+    with JWKSServer(keys, delay=1.0) as server:
+        monkeypatch.setattr(validator, 'JWKS_URL', server.url)
+        monkeypatch.setattr(validator, 'JWKS_READ_TIMEOUT', 0.1)
+        start = time.monotonic()
+        with pytest.raises(ValueError, match='Token validation failed'):
+            validator.validate_jwt_token(token_for(keys[0]))
+        assert time.monotonic() - start < 0.8
+
+
+def test_prewarm_from_env_json(validator, keys, monkeypatch):
+    monkeypatch.setattr(validator, 'JWKS_URL', 'http://127.0.0.1:9/unreachable')
+    monkeypatch.setattr(validator, 'JWKS_JSON', json.dumps(jwks_document(keys)))
+    assert validator.prewarm_jwks() is True
+    assert validator.validate_jwt_token(token_for(keys[1]))['sub'] == 'local-user'
+
+
+def test_prewarm_from_file(validator, keys, monkeypatch, tmp_path):
+    path = tmp_path / 'jwks.json'
+    path.write_text(json.dumps(jwks_document(keys)))
+    monkeypatch.setattr(validator, 'JWKS_URL', 'http://127.0.0.1:9/unreachable')
+    monkeypatch.setattr(validator, 'JWKS_JSON', None)
+    monkeypatch.setattr(validator, 'JWKS_FILE', str(path))
+    assert validator.prewarm_jwks() is True
+    assert set(validator._public_keys) == {'key-1', 'key-2'}
+
+
+def test_prewarm_bad_file_is_not_fatal(validator, monkeypatch):
+    monkeypatch.setattr(validator, 'JWKS_JSON', None)
+    monkeypatch.setattr(validator, 'JWKS_FILE', '/nonexistent/jwks.json')
+    assert validator.prewarm_jwks() is False
@@ -0,0 +1,88 @@
+"""
+Tests for the precompiled LMS table artifact.
+Checks the binary round trip, corruption detection, that the committed
+artifact matches the xlsx sources, and the cold-load budget.
+"""
+
+import os
+import struct
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile'))
+
+from aws.lambdas.percentile import lms_tables
+from aws.lambdas.percentile.lms_tables import ArtifactError, pack_tables, read_tables
+
+SAMPLE = [
+    ('wfa', 'male', 'Day', [0, 1, 2], [0.3487, 0.3127, 0.3029], [3.3464, 3.3174, 3.337], [0.14602, 0.14693, 0.14676]),
+    ('wfl', 'female', 'Length', [45.0, 45.1], [-0.3833, -0.3833], [2.4607, 2.4777], [0.09029, 0.09033]),
+]
+
+
+def test_round_trip():
+    tables = read_tables(pack_tables(SAMPLE))
+    assert set(tables) == {('wfa', 'male'), ('wfl', 'female')}
+    wfl = tables[('wfl', 'female')]
+    assert wfl.index_name == 'Length'
+    assert list(wfl.x) == [45.0, 45.1]
+    assert list(tables[('wfa', 'male')].M) == [3.3464, 3.3174, 3.337]
+
+
+def test_grid_step_stored():
+    tables = read_tables(pack_tables(SAMPLE + [
+        ('hcfa', 'male', 'Day', [0, 1, 3], [1.0] * 3, [34.46] * 3, [0.03686] * 3),
+    ]))
+    assert tables[('wfa', 'male')].step == 1.0
+    assert tables[('wfl', 'female')].step == pytest.approx(0.1)
+    assert tables[('hcfa', 'male')].step == 0.0
+
+
+def test_grid_step():
+    assert lms_tables.grid_step([45.0 + i / 10 for i in range(651)]) == pytest.approx(0.1)
+    assert lms_tables.grid_step([0, 1, 2, 4]) == 0.0
+    assert lms_tables.grid_step([3, 2, 1]) == 0.0
+    assert lms_tables.grid_step([7]) == 0.0
+
+
+def test_checksum_mismatch():
+    artifact = bytearray(pack_tables(SAMPLE))
+    artifact[-1] ^= 0xFF
+    with pytest.raises(ArtifactError, match='checksum'):
+        read_tables(bytes(artifact))
+
+
+def test_unsupported_version():
+    artifact = bytearray(pack_tables(SAMPLE))
+    struct.pack_into('<H', artifact, 8, lms_tables.FORMAT_VERSION + 1)
+    with pytest.raises(ArtifactError, match='version'):
+        read_tables(bytes(artifact))
+
+
+def test_missing_artifact():
+    with pytest.raises(ArtifactError):
+        lms_tables.load_artifact('/nonexistent/lms_tables.bin')
+
+
+def test_artifact_matches_sources():
+    """The committed artifact must be rebuilt whenever a source table changes"""
+    pytest.importorskip('pandas')
+    pytest.importorskip('openpyxl')
+    from aws.lambdas.percentile.build_tables import compile_tables
+
+    with open(lms_tables.ARTIFACT_PATH, 'rb') as f:
+        assert f.read() == compile_tables()
+
+
+def test_cold_load_under_one_millisecond():
+    lms_tables.load_artifact()  # warm the page cache, as the deployment package is
+    best = min(_timed(lms_tables.load_artifact) for _ in range(20))
+    assert best < 0.001
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
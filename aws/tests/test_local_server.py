@@ -0,0 +1,80 @@
+"""
+Tests for the local HTTP server and load generator: requests go through
+require_jwt_auth against the stand-in JWKS, and the load report counts
+every request.
+"""
+
+import http.client
+import json
+import os
+from urllib.parse import urlsplit
+
+import pytest
+
+from aws.tools import loadgen
+from aws.tools.local_server import LocalServer, api_gateway_event
+
+
+@pytest.fixture(scope='module')
+def server():
+    # LocalServer exports the local Cognito settings; keep them out of other tests
+    environ = dict(os.environ)
+    with LocalServer() as server:
+        yield server
+    os.environ.clear()
+    os.environ.update(environ)
+
+
+def request(server, method, path, body=None, token=None):
+    url = urlsplit(server.url)
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    connection.request(method, path, body, headers)
+    response = connection.getresponse()
+    payload = response.read()
+    connection.close()
+    return response.status, json.loads(payload) if payload else None
+
+
+def test_api_gateway_event_shape():
+    event = api_gateway_event('GET', '/percentile/curves?sex=male&to=', [('Authorization', 'x')], None, '10.0.0.1')
+    assert event['path'] == '/percentile/curves'
+    assert event['queryStringParameters'] == {'sex': 'male', 'to': ''}
+    assert event['headers'] == {'Authorization': 'x'}
+    assert event['requestContext']['identity']['sourceIp'] == '10.0.0.1'
+
+
+def test_single_request_is_authenticated(server):
+    body = json.dumps({"weight": 5.35, "date_birth": "2025-03-25", "date_measurement": "2025-06-22", "sex": "female"})
+    status, payload = request(server, 'POST', '/upnest-percentile', body)
+    assert status == 401
+
+    status, payload = request(server, 'POST', '/upnest-percentile', body, server.token(sub='user-1'))
+    assert status == 200
+    assert payload['user_id'] == 'user-1'
+    assert abs(payload['percentile'] - 26.32) < 0.5
+
+
+def test_curves_route_and_unknown_path(server):
+    status, payload = request(server, 'GET', '/percentile/curves?sex=female&to=14', token=server.token())
+    assert status == 200 and payload['x'] == [0.0, 7.0, 14.0]
+    status, _ = request(server, 'GET', '/nope', token=server.token())
+    assert status == 404
+
+
+def test_load_report(server):
+    bodies = loadgen.make_bodies(10) + loadgen.make_bodies(2, batch_size=5)
+    report = loadgen.run_load(server.url, server.token(), bodies, 24, 3)
+    assert report['requests'] == 24
+    assert report['errors'] == 0
+    assert report['p50'] <= report['p99'] <= report['max']
+    assert 'req/s' in loadgen.format_report('single', report)
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert loadgen.percentile(values, 50) == 50
+    assert loadgen.percentile(values, 99) == 99
+    assert loadgen.percentile([7], 90) == 7
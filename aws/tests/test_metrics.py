@@ -0,0 +1,117 @@
+"""
+Tests for the per-request EMF metrics: one document per authenticated
+request with the phase timings and cache counters, the cold-start flag on the
+first request only, and the no-op mode.
+"""
+
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import jwt_validator  # noqa: E402
+import lambda_function  # noqa: E402
+import metrics  # noqa: E402
+from aws.tools.local_jwks import SigningKey, id_token_claims, jwks_document  # noqa: E402
+
+POOL_ID = 'us-east-1_local'
+CLIENT_ID = 'local-client'
+ISSUER = f'https://cognito-idp.us-east-1.amazonaws.com/{POOL_ID}'
+
+MEASUREMENT = {'weight': 5.35, 'date_birth': '2025-03-25', 'date_measurement': '2025-06-22', 'sex': 'female'}
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    documents = []
+    monkeypatch.setattr(metrics, 'emit', documents.append)
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', True)
+    monkeypatch.setattr(metrics, '_cold_start', False)
+    return documents
+
+
+@pytest.fixture
+def key(monkeypatch):
+    key = SigningKey('key-1')
+    monkeypatch.setattr(jwt_validator, 'COGNITO_REGION', 'us-east-1')
+    monkeypatch.setattr(jwt_validator, 'COGNITO_USER_POOL_ID', POOL_ID)
+    monkeypatch.setattr(jwt_validator, 'COGNITO_CLIENT_ID', CLIENT_ID)
+    jwt_validator.set_jwks(jwks_document([key]))
+    jwt_validator.clear_token_cache()
+    yield key
+    jwt_validator.clear_token_cache()
+
+
+def call(token, measurements):
+    event = {'headers': {'Authorization': f'Bearer {token}'}, 'body': json.dumps({'measurements': measurements})}
+    return lambda_function.lambda_handler(event, SimpleNamespace(aws_request_id='req-1'))
+
+
+def test_request_emits_one_document_with_phases(emitted, key):
+    token = key.sign(id_token_claims(ISSUER, CLIENT_ID, sub='user-1'))
+    response = call(token, [MEASUREMENT, MEASUREMENT])
+    assert response['statusCode'] == 200
+    assert len(emitted) == 1
+    document = emitted[0]
+    names = [m['Name'] for m in document['_aws']['CloudWatchMetrics'][0]['Metrics']]
+    for name in ('AuthTime', 'ParseTime', 'ScoreTime', 'SerializeTime', 'TotalTime'):
+        assert name in names and document[name] >= 0
+    assert document['TotalTime'] >= document['ScoreTime']
+    assert document['BatchSize'] == 2 and document['TokenCacheMisses'] == 1
+    assert document['ResultCacheHits'] + document['ResultCacheMisses'] == 2
+    assert document['Handler'] == 'lambda_function' and document['ColdStart'] == 'false'
+    assert document['RequestId'] == 'req-1' and document['StatusCode'] == 200
+    json.dumps(document)
+
+    call(token, [MEASUREMENT])
+    # Same token: verified claims come from the cache
+    assert emitted[1]['TokenCacheHits'] == 1 and 'TokenCacheMisses' not in emitted[1]
+
+
+def test_rejected_request_is_measured(emitted):
+    response = lambda_function.lambda_handler({'headers': {}}, None)
+    assert response['statusCode'] == 401
+    assert emitted[0]['StatusCode'] == 401 and 'ScoreTime' not in emitted[0]
+
+
+def test_cold_start_reports_init_metrics_once(emitted, monkeypatch):
+    monkeypatch.setattr(metrics, '_cold_start', True)
+    monkeypatch.setattr(metrics, '_init_metrics', {})
+    metrics.record_init('TableLoadTime', 12.5)
+    for _ in range(2):
+        with metrics.request('test'):
+            with metrics.request('nested'):
+                metrics.count('Items', 3)
+    assert len(emitted) == 2
+    assert emitted[0]['ColdStart'] == 'true' and emitted[0]['TableLoadTime'] == 12.5
+    assert emitted[0]['Handler'] == 'test' and emitted[0]['Items'] == 3
+    assert emitted[1]['ColdStart'] == 'false' and 'TableLoadTime' not in emitted[1]
+
+
+def test_disabled_and_outside_requests_are_noops(emitted, monkeypatch):
+    assert metrics.phase('ScoreTime') is metrics._NOOP
+    metrics.count('Items')
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', False)
+    with metrics.request('test') as scope:
+        assert scope is None
+        assert metrics.phase('ScoreTime') is metrics._NOOP
+        metrics.count('Items')
+    assert emitted == []
+
+
+def test_emf_document_format(capsys):
+    scope = metrics._Scope('test')
+    scope.add('ScoreTime', 1.23456, 'Milliseconds')
+    metrics.emit(metrics.emf_document(scope, True, timestamp=1700000000.0))
+    document = json.loads(capsys.readouterr().out)
+    assert document['_aws'] == {
+        'Timestamp': 1700000000000,
+        'CloudWatchMetrics': [{'Namespace': metrics.METRICS_NAMESPACE, 'Dimensions': metrics.DIMENSIONS,
+                               'Metrics': [{'Name': 'ScoreTime', 'Unit': 'Milliseconds'}]}],
+    }
+    assert document['ScoreTime'] == 1.235
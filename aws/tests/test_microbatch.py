@@ -0,0 +1,170 @@
+"""
+Tests for micro-batching in the server mode: concurrent calls share one
+scoring call and each gets its own results, a lone caller is scored inline,
+a caller that nobody joins scores its batch after the window, errors reach
+every caller of the batch, batching that is slower than inline scoring is
+given up, and batched handler responses match unbatched ones.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import lambda_function  # noqa: E402
+import microbatch  # noqa: E402
+
+
+class Recorder:
+    """A score function returning (value, x) pairs and half the rows as hits"""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def __call__(self, values, tables, xs):
+        self.calls.append(len(values))
+        # Zeros are the warm-up calls of concurrently()
+        if self.error and any(values):
+            raise self.error
+        return [(v, x) for v, x in zip(values, xs)], len(values) // 2
+
+
+def concurrently(collector, requests):
+    """
+    Score each request's rows on its own thread, all at once. Every thread
+    calls once beforehand so the collector counts them all as active callers.
+    """
+    barrier = threading.Barrier(len(requests))
+    results = [None] * len(requests)
+
+    def run(i, rows):
+        collector.score([0.0], [None], [i])
+        barrier.wait()
+        try:
+            results[i] = collector.score(rows, [None] * len(rows), [i] * len(rows))
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, rows)) for i, rows in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_share_one_score_call():
+    score = Recorder()
+    collector = microbatch.Collector(window_us=200_000, score=score)
+    requests = [[1.0], [2.0, 2.5], [3.0], [4.0]]
+    results = concurrently(collector, requests)
+    assert score.calls[-1] == 5
+    for i, rows in enumerate(requests):
+        scored, _ = results[i]
+        assert scored == [(v, i) for v in rows]
+    assert sum(hits for _, hits in results) == 2
+    assert collector.stats['requests'] >= 4
+
+
+def test_lone_caller_is_scored_inline():
+    score = Recorder()
+    collector = microbatch.Collector(window_us=5_000_000, score=score)
+    start = time.perf_counter()
+    for _ in range(3):
+        assert collector.score([1.0], [None], [0]) == ([(1.0, 0)], 0)
+    assert time.perf_counter() - start < 1
+    assert collector.stats['inline'] == 3 and collector.stats['batches'] == 0
+
+
+def test_caller_nobody_joins_scores_after_the_window():
+    score = Recorder()
+    collector = microbatch.Collector(window_us=50_000, score=score)
+    # Another thread called recently, so the next call waits for it to join
+    thread = threading.Thread(target=collector.score, args=([0.0], [None], [0]))
+    thread.start()
+    thread.join()
+    start = time.perf_counter()
+    assert collector.score([1.0, 2.0], [None, None], [1, 1]) == ([(1.0, 1), (2.0, 1)], 1)
+    assert 0.04 < time.perf_counter() - start < 1
+    assert collector.stats['batches'] == 1 and collector.stats['requests'] == 1
+
+
+def test_large_calls_and_errors():
+    score = Recorder()
+    collector = microbatch.Collector(window_us=200_000, max_rows=3, score=score)
+    results = concurrently(collector, [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    assert score.calls[-2:] == [3, 3]
+    assert results[0][0] == [(1.0, 0), (2.0, 0), (3.0, 0)]
+
+    collector = microbatch.Collector(window_us=200_000, score=Recorder(error=RuntimeError('boom')))
+    assert all(isinstance(result, RuntimeError) for result in concurrently(collector, [[1.0], [2.0], [3.0]]))
+
+
+def test_batching_that_does_not_pay_off_falls_back_to_inline():
+    def slow_batches(values, tables, xs):
+        if len(values) > 1:
+            time.sleep(0.02)
+        return [None] * len(values), 0
+
+    collector = microbatch.Collector(window_us=5_000, score=slow_batches, epoch_calls=8)
+    barrier = threading.Barrier(2)
+
+    def run():
+        barrier.wait()
+        for _ in range(60):
+            collector.score([1.0], [None], [0])
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert collector.stats['batching_epochs'] >= 1
+    assert collector.stats['inline_epochs'] > collector.stats['batching_epochs']
+
+
+def test_score_without_collector_is_score_batch_cached():
+    microbatch.disable()
+    assert microbatch.collector() is None
+    table = lambda_function.get_table('wfa', 'female')
+    expected, _ = lambda_function.score_batch_cached([5.0], [table], [60])
+    assert microbatch.score([5.0], [table], [60]) == (expected, 1)
+
+
+@pytest.fixture
+def batching():
+    collector = microbatch.enable(window_us=2000)
+    yield collector
+    microbatch.disable()
+
+
+def test_handler_responses_match_unbatched(batching):
+    handler = lambda_function.lambda_handler.__wrapped__
+    events = [
+        {'body': json.dumps({'weight': 4 + i / 10, 'date_birth': '2025-01-01',
+                             'date_measurement': '2025-03-01', 'sex': 'female' if i % 2 else 'male'})}
+        for i in range(16)
+    ]
+    responses = [None] * len(events)
+
+    def run(i):
+        responses[i] = handler(events[i], None)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(events))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    microbatch.disable()
+    for event, response in zip(events, responses):
+        expected = handler(event, None)
+        assert response['statusCode'] == 200
+        assert json.loads(response['body']) == json.loads(expected['body'])
@@ -4,6 +4,10 @@ Checks correct calculation for a typical baby girl,
 and verifies error handling for missing fields.
 """
 
+import json
+import random
+from datetime import date, timedelta
+
 from aws.lambdas.percentile.lambda_function import lambda_handler
 
 def test_percentile_girl_3months():
@@ -38,3 +42,71 @@ def test_percentile_missing_field():
 
 # You can add more tests for edge cases and different inputs if needed.
 
+
+def call_unauthenticated(event):
+    """Invoke the handler behind require_jwt_auth and decode the JSON body"""
+    response = lambda_handler.__wrapped__(event, None)
+    return response["statusCode"], json.loads(response["body"])
+
+def test_batch_mixed_measurements():
+    """
+    Test batch mode: mixed sexes and dates, results in input order,
+    matching the single-measurement path.
+    """
+    measurements = [
+        {"weight": 5.35, "date_birth": "2025-03-25", "date_measurement": "2025-06-22", "sex": "female"},
+        {"weight": 9.1, "date_birth": "2024-01-15", "date_measurement": "2025-01-20", "sex": "male"},
+        {"weight": 3.4, "date_birth": "2025-06-01", "date_measurement": "2025-06-01", "sex": "male"},
+    ]
+    status, body = call_unauthenticated({"measurements": measurements})
+    assert status == 200
+    assert body["count"] == 3 and body["failed"] == 0
+    for item, result in zip(measurements, body["results"]):
+        _, single = call_unauthenticated(dict(item))
+        assert result["percentile"] == single["percentile"]
+        assert abs(result["zscore"] - single["zscore"]) < 1e-12
+
+def test_batch_per_item_errors():
+    """
+    Test that invalid items fail on their own without failing the batch.
+    """
+    measurements = [
+        {"weight": 5.35, "date_birth": "2025-03-25", "date_measurement": "2025-06-22", "sex": "female"},
+        {"weight": 5.35, "date_birth": "2025-03-25", "sex": "female"},
+        {"weight": 5.35, "date_birth": "2025-03-25", "date_measurement": "2025-06-22", "sex": "other"},
+        {"weight": -1, "date_birth": "2025-03-25", "date_measurement": "2025-06-22", "sex": "female"},
+        "not an object",
+    ]
+    status, body = call_unauthenticated({"body": json.dumps({"measurements": measurements})})
+    assert status == 200
+    assert [r["success"] for r in body["results"]] == [True, False, False, False, False]
+    assert [r["index"] for r in body["results"]] == list(range(5))
+    assert "Missing" in body["results"][1]["error"]
+    assert "Sex must be" in body["results"][2]["error"]
+    assert body["failed"] == 4
+
+def test_batch_large_vectorized():
+    """
+    Test a 1,000 item batch (NumPy path when installed) against scalar scoring.
+    """
+    rng = random.Random(3)
+    measurements = [
+        {
+            "weight": round(rng.uniform(2.0, 20.0), 3),
+            "date_birth": "2021-01-01",
+            "date_measurement": (date(2021, 1, 1) + timedelta(days=rng.randint(0, 1900))).isoformat(),
+            "sex": rng.choice(["male", "female"]),
+        }
+        for _ in range(1000)
+    ]
+    status, body = call_unauthenticated({"measurements": measurements})
+    assert status == 200 and body["failed"] == 0
+    for item, result in zip(measurements[:100], body["results"]):
+        _, single = call_unauthenticated(dict(item))
+        assert abs(result["zscore"] - single["zscore"]) < 1e-12
+        assert result["LMS"] == single["LMS"]
+
+def test_batch_not_an_array():
+    status, body = call_unauthenticated({"measurements": {"weight": 5.35}})
+    assert status == 400
+    assert "must be an array" in body["error"]
@@ -0,0 +1,166 @@
+"""
+Tests for the pandas/SciPy-free percentile engine.
+Compares it against the original DataFrame + norm.cdf implementation and
+checks the import-time budget of the Lambda module.
+"""
+
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+from aws.lambdas.percentile import percentile_engine as engine
+from aws.lambdas.percentile.lms_tables import LMSTable, load_artifact
+
+IMPORT_BUDGET_MS = 100
+HEAVY_MODULES = ('pandas', 'scipy', 'numpy', 'requests')
+
+
+def reference_score(df, value, age_days):
+    """The pre-engine implementation: DataFrame lookup and scipy norm.cdf"""
+    from scipy.stats import norm
+
+    row = df.loc[df['Day'] == age_days]
+    if row.empty:
+        idx = (df['Day'] - age_days).abs().idxmin()
+        row = df.loc[[idx]]
+    L, M, S = float(row['L'].iloc[0]), float(row['M'].iloc[0]), float(row['S'].iloc[0])
+    z = engine.calculate_zscore(value, L, M, S)
+    return z, norm.cdf(z) * 100
+
+
+@pytest.mark.parametrize('sex', ['male', 'female'])
+def test_matches_pandas_scipy(sex):
+    pd = pytest.importorskip('pandas')
+    pytest.importorskip('scipy')
+    table = load_artifact()[('wfa', sex)]
+    df = pd.DataFrame({'Day': [int(x) for x in table.x], 'L': list(table.L), 'M': list(table.M), 'S': list(table.S)})
+
+    rng = random.Random(42)
+    for _ in range(500):
+        age_days = rng.randint(-10, 1900)
+        weight = round(rng.uniform(1.5, 30.0), 3)
+        z, percentile, _ = engine.score(weight, table, age_days)
+        ref_z, ref_percentile = reference_score(df, weight, age_days)
+        assert z == ref_z
+        assert percentile == pytest.approx(ref_percentile, rel=0, abs=1e-12)
+        assert round(percentile, 2) == round(ref_percentile, 2)
+
+
+def test_nearest_index_matches_idxmin_on_sparse_table():
+    pd = pytest.importorskip('pandas')
+    days = [0, 2, 5, 9, 30]
+    series = pd.Series(days)
+    for age in range(-3, 40):
+        assert engine.nearest_index(days, age) == (series - age).abs().idxmin()
+
+
+def test_direct_index_matches_binary_search():
+    for table in load_artifact().values():
+        assert table.step == 1.0
+        for age in range(-5, 1900):
+            assert engine.lookup_index(table, age) == engine.nearest_index(table.x, age)
+
+
+def test_direct_index_on_length_grid():
+    x = [45.0 + i / 10 for i in range(651)]
+    ones = [1.0] * len(x)
+    dense = LMSTable('wfl', 'male', 'Length', x, ones, ones, ones, 0.1)
+    sparse = dense._replace(step=0.0)
+    rng = random.Random(7)
+    for _ in range(2000):
+        length = round(rng.uniform(40.0, 115.0), 2)
+        if round(length * 100) % 10 == 5:
+            continue  # exact midpoints depend on float noise in the stored index
+        assert engine.lookup_index(dense, length) == engine.lookup_index(sparse, length)
+
+
+@pytest.fixture
+def result_cache(monkeypatch):
+    monkeypatch.setattr(engine, 'RESULT_CACHE_SIZE', 4)
+    engine.clear_result_cache()
+    yield engine
+    engine.clear_result_cache()
+
+
+def test_result_cache_hits_and_evictions(result_cache):
+    table = load_artifact()[('wfa', 'female')]
+    first, hits = engine.score_batch_cached([5.35, 6.1], [table, table], [89, 120])
+    assert hits == 0
+    again, hits = engine.score_batch_cached([6.1, 5.35, 7.0], [table] * 3, [120, 89, 200])
+    assert hits == 2
+    assert again[:2] == [first[1], first[0]]
+    assert again[2] == engine.score(7.0, table, 200)
+
+    engine.score_batch_cached([3.0, 3.1, 3.2], [table] * 3, [1, 2, 3])
+    stats = engine.result_cache_stats()
+    assert stats == {'hits': 2, 'misses': 6, 'evictions': 2, 'size': 4, 'capacity': 4}
+
+
+def test_result_cache_keys_include_sex(result_cache):
+    tables = load_artifact()
+    boys, girls = tables[('wfa', 'male')], tables[('wfa', 'female')]
+    results, _ = engine.score_batch_cached([5.35, 5.35], [boys, girls], [89, 89])
+    assert results[0] != results[1]
+
+
+def test_result_cache_disabled(result_cache, monkeypatch):
+    monkeypatch.setattr(engine, 'RESULT_CACHE_SIZE', 0)
+    table = load_artifact()[('wfa', 'female')]
+    engine.score_batch_cached([5.35], [table], [89])
+    _, hits = engine.score_batch_cached([5.35], [table], [89])
+    assert hits == 0 and engine.result_cache_stats()['size'] == 0
+
+
+@pytest.mark.parametrize('birth,measurement', [
+    ('2025-03-25', '2025-06-22'),
+    ('2024-02-28', '2024-03-01'),
+    ('2025-03-25T23:00:00', '2025-06-22T01:00:00'),
+    ('2025-03-25T00:00:00Z', '2025-06-22T12:30:00Z'),
+])
+def test_age_in_days_matches_pandas(birth, measurement):
+    pd = pytest.importorskip('pandas')
+    expected = (pd.to_datetime(measurement) - pd.to_datetime(birth)).days
+    assert engine.age_in_days(birth, measurement) == expected
+
+
+def test_invalid_date():
+    with pytest.raises(ValueError, match='Invalid date'):
+        engine.age_in_days('2025-13-01', '2025-06-22')
+
+
+def test_xlsx_fallback_table_shape():
+    pytest.importorskip('pandas')
+    pytest.importorskip('openpyxl')
+    from aws.lambdas.percentile.lms_tables import read_xlsx_table
+
+    path = os.path.join(lambda_dir, 'data', 'weight', 'wfa-girls-zscore-expanded-tables.xlsx')
+    table = read_xlsx_table('wfa', 'female', path)
+    assert isinstance(table, LMSTable)
+    assert table.index_name == 'Day'
+    assert engine.lookup_lms(table, 89) == engine.lookup_lms(load_artifact()[('wfa', 'female')], 89)
+
+
+def test_import_time_budget():
+    """Importing the Lambda module must stay light: no pandas/SciPy/NumPy/requests"""
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import lambda_function\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        f"print(elapsed, ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    timings = []
+    for _ in range(3):
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=lambda_dir, capture_output=True, text=True, check=True
+        )
+        elapsed, _, loaded = result.stdout.strip().partition(' ')
+        assert loaded == ''
+        timings.append(float(elapsed))
+    assert min(timings) < IMPORT_BUDGET_MS
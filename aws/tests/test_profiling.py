@@ -0,0 +1,111 @@
+"""
+Tests for the sampled profiling hook: unsampled invocations get the shared
+no-op, a sampled invocation logs a CPU and memory summary (and writes the raw
+stats with PROFILE_DIR), and only one invocation is profiled at a time.
+"""
+
+import json
+import logging
+import os
+import pstats
+import sys
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import lambda_function  # noqa: E402
+import profiling  # noqa: E402
+import stream_handler  # noqa: E402
+
+MEASUREMENTS = [{'weight': 5.35, 'date_birth': '2025-03-25', 'date_measurement': '2025-06-22', 'sex': 'female'}] * 20
+
+
+@pytest.fixture
+def rate(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', '')
+
+    def set_rate(value):
+        monkeypatch.setattr(profiling, 'PROFILE_SAMPLE_RATE', value)
+    return set_rate
+
+
+def profile_summaries(caplog):
+    return [json.loads(r.getMessage()[len('Profile: '):]) for r in caplog.records if r.getMessage().startswith('Profile: ')]
+
+
+def test_unsampled_invocations_get_the_noop(rate, monkeypatch):
+    rate(0)
+    assert profiling.sample('test') is profiling._NOOP
+    rate(0.5)
+    monkeypatch.setattr(profiling.random, 'random', lambda: 0.9)
+    assert profiling.sample('test') is profiling._NOOP
+
+
+def test_sampled_invocation_logs_summary(rate, caplog):
+    rate(1)
+    caplog.set_level(logging.INFO, logger=profiling.logger.name)
+    with profiling.sample('lambda_function'):
+        lambda_function.score_measurements(MEASUREMENTS)
+    summary, = profile_summaries(caplog)
+    assert summary['handler'] == 'lambda_function' and summary['wallMs'] > 0
+    functions = [f['function'] for f in summary['functions']]
+    assert any('score_measurements' in f for f in functions)
+    assert len(functions) <= profiling.PROFILE_TOP
+    assert summary['memory']['peakBytes'] > 0 and summary['memory']['top']
+    assert not any('profiling.py' in entry['location'] for entry in summary['memory']['top'])
+
+
+def test_profile_dir_gets_raw_stats(rate, tmp_path, monkeypatch, caplog):
+    rate(1)
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(profiling, 'PROFILE_MEMORY', False)
+    stream_handler.lambda_handler({'Records': []}, None)
+    summary_file, = tmp_path.glob('stream_handler-*.json')
+    stats_file, = tmp_path.glob('stream_handler-*.prof')
+    assert 'memory' not in json.loads(summary_file.read_text())
+    assert pstats.Stats(str(stats_file)).total_calls > 0
+
+
+def test_one_profile_at_a_time(rate):
+    rate(1)
+    with profiling.sample('outer') as outer:
+        assert isinstance(outer, profiling._Profile)
+        assert profiling.sample('inner') is profiling._NOOP
+    assert isinstance(profiling.sample('next'), profiling._Profile)
+    profiling._profile_lock.release()
+
+
+def test_profiling_errors_do_not_fail_the_invocation(rate, monkeypatch):
+    rate(1)
+
+    def broken(*args):
+        raise OSError('disk full')
+    monkeypatch.setattr(profiling, 'write', broken)
+    with profiling.sample('test'):
+        result = lambda_function.score_measurements(MEASUREMENTS[:1])
+    assert result[0]['success']
+    assert profiling._profile_lock.acquire(blocking=False)
+    profiling._profile_lock.release()
+
+
+def test_failing_to_start_releases_the_lock(rate, monkeypatch, caplog):
+    import cProfile
+    import tracemalloc
+
+    rate(1)
+
+    def busy(self):
+        raise ValueError('Another profiling tool is already active')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(cProfile.Profile, 'enable', busy)
+        with profiling.sample('lambda_function'):
+            lambda_function.score_measurements(MEASUREMENTS)
+    assert 'Unable to start profiling' in caplog.text and not tracemalloc.is_tracing()
+
+    caplog.set_level(logging.INFO, logger=profiling.logger.name)
+    with profiling.sample('lambda_function'):
+        lambda_function.score_measurements(MEASUREMENTS)
+    assert len(profile_summaries(caplog)) == 1
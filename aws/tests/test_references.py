@@ -0,0 +1,160 @@
+"""
+Tests for the reference-standard registry: which standard and age a
+measurement is scored at (Fenton, corrected age, WHO 5-19, a requested
+standard), packs loaded on first use under the memory budget, and the
+standard reported by the handler. Packs are synthetic, built into a
+temporary directory.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import build_tables  # noqa: E402
+import lambda_function  # noqa: E402
+import lms_tables  # noqa: E402
+import percentile_engine  # noqa: E402
+import references  # noqa: E402
+
+handler = lambda_function.lambda_handler.__wrapped__
+
+
+def grid(first, last, step, M):
+    rows = int(round((last - first) / step)) + 1
+    x = [first + i * step for i in range(rows)]
+    return x, [1.0] * rows, [M(v) for v in x], [0.1] * rows
+
+
+PACKS = {
+    'fenton': [('wfa', 'female', 'Week', *grid(22, 50, 1, lambda w: 0.1 * w - 1.5))],
+    'who-5-19': [('wfa', 'female', 'Month', *grid(61, 120, 1, lambda m: 18 + (m - 61) / 6)),
+                 ('lhfa', 'female', 'Month', *grid(61, 228, 1, lambda m: 110 + (m - 61) / 3))],
+    'cdc-2-20': [('wfa', 'female', 'Month', *grid(24, 240.5, 0.5, lambda m: 12 + m / 6))],
+}
+
+
+@pytest.fixture
+def packs(tmp_path, monkeypatch):
+    """Install the synthetic packs from a temporary directory, with an empty pack cache"""
+    standards = dict(references.STANDARDS)
+    for code, tables in PACKS.items():
+        path = tmp_path / f'{code}.bin'
+        path.write_bytes(lms_tables.pack_tables(tables))
+        standards[code] = standards[code]._replace(artifact=str(path))
+    monkeypatch.setattr(references, 'STANDARDS', standards)
+    references.clear_packs()
+    yield tmp_path
+    references.clear_packs()
+
+
+def test_term_babies_use_who_by_age(packs):
+    placement = references.place(100)
+    assert placement.standard.code == 'who-0-5' and placement.x == 100 and placement.corrected_days is None
+    placement = references.place(2500)
+    assert placement.standard.code == 'who-5-19' and placement.x == round(2500 / references.DAYS_PER_MONTH, 2)
+    assert references.place(100, gestation=39).standard.code == 'who-0-5'
+
+
+def test_preterm_babies_use_fenton_then_corrected_age(packs):
+    placement = references.place(14, gestation=30)
+    assert placement.standard.code == 'fenton' and placement.x == 32
+
+    # 30 weeks + 21 weeks is past Fenton: WHO at age less 10 weeks
+    placement = references.place(147, gestation=30)
+    assert placement.standard.code == 'who-0-5'
+    assert placement.corrected_days == placement.x == 77
+
+    placement = references.place(800, gestation=30)
+    assert placement.corrected_days is None and placement.x == 800
+
+
+def test_requested_standard_where_it_covers_the_age(packs):
+    placement = references.place(1000, requested='cdc-2-20')
+    assert placement.standard.code == 'cdc-2-20' and placement.x == round(1000 / references.DAYS_PER_MONTH, 2)
+    assert references.place(300, requested='cdc-2-20').standard.code == 'who-0-5'
+    assert references.place(300, requested='fenton').standard.code == 'who-0-5'
+    with pytest.raises(ValueError, match='Unknown standard'):
+        references.place(300, requested='nchs')
+
+
+def test_missing_packs_keep_who_0_5(packs):
+    os.remove(references.STANDARDS['fenton'].artifact)
+    os.remove(references.STANDARDS['who-5-19'].artifact)
+    references.clear_packs()
+    assert references.place(14, gestation=30).standard.code == 'who-0-5'
+    assert references.place(14, gestation=30).corrected_days == 0
+    assert references.place(2500).standard.code == 'who-0-5'
+
+
+@pytest.mark.parametrize('value, error', [('abc', 'must be a number'), (20, 'between 22 and 44')])
+def test_gestational_weeks_validation(value, error):
+    with pytest.raises(ValueError, match=error):
+        references.gestational_weeks(value)
+    assert references.gestational_weeks('') is None
+
+
+def test_packs_are_loaded_once_and_evicted_over_budget(packs, monkeypatch):
+    sizes = {code: os.path.getsize(references.STANDARDS[code].artifact) for code in PACKS}
+    monkeypatch.setattr(references, 'PACK_MEMORY_BUDGET_MB',
+                        (sizes['fenton'] + sizes['cdc-2-20']) / 1024 / 1024)
+    fenton = references.load_pack('fenton')
+    assert references.load_pack('fenton') is fenton
+    assert fenton[('wfa', 'female')].standard == 'fenton'
+    references.load_pack('who-5-19')
+    assert references.pack_stats()['packs'] == ['fenton', 'who-5-19']
+
+    references.load_pack('fenton')
+    references.load_pack('cdc-2-20')
+    stats = references.pack_stats()
+    assert stats['packs'] == ['fenton', 'cdc-2-20'] and stats['evictions'] == 1
+    assert stats['bytes'] <= stats['budget'] and stats['hits'] == 2
+
+
+def test_handler_reports_standard_and_corrected_age(packs):
+    body = {'weight': 1.8, 'date_birth': '2025-01-01', 'date_measurement': '2025-01-15',
+            'sex': 'female', 'gestational_age_weeks': 30}
+    response = json.loads(handler({'body': json.dumps(body)}, None)['body'])
+    assert response['standard'] == 'fenton'
+    table = references.get_table('wfa', 'female', 'fenton')
+    assert response['zscore'] == pytest.approx(percentile_engine.score(1.8, table, 32.0)[0])
+
+    corrected = json.loads(handler({'body': json.dumps(dict(body, date_measurement='2025-06-01'))}, None)['body'])
+    assert corrected['standard'] == 'who-0-5' and corrected['corrected_age_days'] == 81
+    term = json.loads(handler({'body': json.dumps(dict(body, gestational_age_weeks=40))}, None)['body'])
+    assert term['standard'] == 'who-0-5' and 'corrected_age_days' not in term
+
+
+def test_standards_without_a_table_or_age_report_per_indicator(packs):
+    body = {'weight': 30.0, 'height': 135.0, 'date_birth': '2015-01-01', 'date_measurement': '2025-06-01',
+            'sex': 'female'}
+    result = lambda_function.score_measurements([body])[0]
+    assert result['standard'] == 'who-5-19'
+    assert 'outside the Weight-for-age range of the WHO Growth Reference' in result['indicators']['wfa']['error']
+    assert result['indicators']['lhfa']['success']
+    assert 'not available in the WHO Growth Reference' in result['indicators']['bfa']['error']
+    assert 'wfh' not in result['indicators']
+
+
+def test_result_cache_keeps_standards_apart(packs):
+    who = lambda_function.get_table('wfa', 'female')
+    fenton = references.get_table('wfa', 'female', 'fenton')
+    results, _ = percentile_engine.score_batch_cached([3.0, 3.0], [who, fenton], [30, 30])
+    assert results[0] != results[1]
+
+
+def test_build_pack_from_csv_sources(tmp_path):
+    source = tmp_path / 'fenton'
+    source.mkdir()
+    (source / 'weight-girls-2013.csv').write_text('Week,L,M,S\n22,1,0.5,0.1\n23,1,0.6,0.1\n')
+    (source / 'hfa-boys.csv').write_text('Week,L,M,S\n22,1,28,0.1\n23,1,29,0.1\n')
+    (source / 'README.txt').write_text('not a table')
+    output = tmp_path / 'packs' / 'fenton.bin'
+    assert build_tables.main(['--standard', 'fenton', '--data-dir', str(source), '--output', str(output)]) == 0
+    tables = lms_tables.load_artifact(str(output), standard='fenton')
+    assert set(tables) == {('wfa', 'female'), ('lhfa', 'male')}
+    assert list(tables[('lhfa', 'male')].M) == [28, 29] and tables[('lhfa', 'male')].step == 1
@@ -0,0 +1,163 @@
+"""
+Tests for the offline re-scoring CLI: file exports (JSONL with a Babies
+export, CSV with inline baby columns), resuming from a checkpoint, and the
+segmented Scan of the in-memory DynamoDB stand-in.
+"""
+
+import csv
+import json
+import threading
+
+import pytest
+
+from aws.tools import rescore
+from aws.tools.local_dynamodb import LocalDynamoDB
+
+import dynamo  # noqa: E402  (on sys.path through aws.tools.rescore)
+import lambda_function  # noqa: E402
+
+BABIES = [
+    {'babyId': 'baby-f', 'gender': 'F', 'dateOfBirth': '2025-03-25'},
+    {'babyId': 'baby-m', 'gender': 'M', 'dateOfBirth': '2024-01-15'},
+]
+
+
+def growth_rows(count):
+    return [
+        {'dataId': f'g{i:03d}', 'babyId': 'baby-f' if i % 2 else 'baby-m', 'measurementDate': '2025-06-22',
+         'measurementType': 'weight', 'value': 5000 + 10 * i, 'unit': 'grams'}
+        for i in range(count)
+    ]
+
+
+def write_jsonl(path, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def export(tmp_path):
+    growth = tmp_path / 'growth.jsonl'
+    babies = tmp_path / 'babies.jsonl'
+    rows = growth_rows(25) + [dict(growth_rows(1)[0], dataId='orphan', babyId='missing')]
+    write_jsonl(growth, rows)
+    # DynamoDB export format for the Babies table
+    write_jsonl(babies, [{'Item': dynamo.dump_item(baby)} for baby in BABIES])
+    return growth, babies
+
+
+def test_rescore_jsonl_export(export, tmp_path):
+    growth, babies = export
+    output = tmp_path / 'out.jsonl'
+    report = rescore.rescore_file(str(growth), str(output), rescore.load_babies(str(babies)),
+                                  workers=0, chunk_size=4, progress=None)
+    rows = read_jsonl(output)
+    assert report['rows'] == 26 and report['scored'] == 25 and report['unscorable'] == 1
+    assert [row['dataId'] for row in rows] == [row['dataId'] for row in read_jsonl(growth)]
+    expected = lambda_function.score_measurements(
+        [{'weight': 5.01, 'date_birth': '2025-03-25', 'date_measurement': '2025-06-22', 'sex': 'female'}])[0]
+    assert rows[1]['babyId'] == 'baby-f' and rows[1]['percentile'] == expected['percentile']
+    assert rows[-1]['percentile'] is None and 'not found' in rows[-1]['scoreError']
+    assert not (tmp_path / 'out.jsonl.checkpoint').exists()
+
+
+def test_rescore_csv_with_inline_baby_columns(tmp_path):
+    source = tmp_path / 'growth.csv'
+    with open(source, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['dataId', 'measurementType', 'value', 'unit', 'measurementDate',
+                                               'gender', 'dateOfBirth', 'percentile'])
+        writer.writeheader()
+        writer.writerow({'dataId': 'g1', 'measurementType': 'weight', 'value': '5.35', 'unit': 'kg',
+                         'measurementDate': '2025-06-22', 'gender': 'F', 'dateOfBirth': '2025-03-25',
+                         'percentile': '99'})
+    output = tmp_path / 'out.csv'
+    rescore.rescore_file(str(source), str(output), workers=0, progress=None)
+    with open(output, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0])[-2:] == ['zscore', 'scoreError']
+    assert abs(float(rows[0]['percentile']) - 26.32) < 0.5
+    assert rows[0]['scoreError'] == ''
+
+
+def test_resume_after_interruption(export, tmp_path, monkeypatch):
+    growth, babies = export
+    babies = rescore.load_babies(str(babies))
+    expected = tmp_path / 'expected.jsonl'
+    rescore.rescore_file(str(growth), str(expected), babies, workers=0, chunk_size=4, progress=None)
+
+    output = tmp_path / 'out.jsonl'
+    checkpoint = tmp_path / 'run.checkpoint'
+    calls = []
+    original = rescore.score_chunk
+
+    def crash_on_fourth_chunk(pairs):
+        calls.append(1)
+        if len(calls) == 4:
+            raise KeyboardInterrupt
+        return original(pairs)
+
+    monkeypatch.setattr(rescore, 'score_chunk', crash_on_fourth_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        rescore.rescore_file(str(growth), str(output), babies, workers=0, chunk_size=4,
+                             checkpoint_path=str(checkpoint), progress=None)
+    assert json.loads(checkpoint.read_text())['rows'] == 12
+
+    monkeypatch.setattr(rescore, 'score_chunk', original)
+    report = rescore.rescore_file(str(growth), str(output), babies, workers=0, chunk_size=4,
+                                  checkpoint_path=str(checkpoint), resume=True, progress=None)
+    assert report['rows'] == 14 and report['scored'] == 25
+    assert output.read_text() == expected.read_text()
+    assert not checkpoint.exists()
+
+
+def test_process_pool_matches_in_process(export, tmp_path):
+    growth, babies = export
+    babies = rescore.load_babies(str(babies))
+    inline, pooled = tmp_path / 'inline.jsonl', tmp_path / 'pooled.jsonl'
+    rescore.rescore_file(str(growth), str(inline), babies, workers=0, chunk_size=5, progress=None)
+    rescore.rescore_file(str(growth), str(pooled), babies, workers=2, chunk_size=5, progress=None)
+    assert pooled.read_text() == inline.read_text()
+
+
+def test_rescore_table_with_segmented_scan(tmp_path):
+    db = LocalDynamoDB({dynamo.GROWTH_TABLE_NAME: 'dataId', dynamo.BABIES_TABLE_NAME: 'babyId'})
+    for baby in BABIES:
+        db.put_item(TableName=dynamo.BABIES_TABLE_NAME, Item=dynamo.dump_item(baby))
+    for row in growth_rows(30):
+        db.put_item(TableName=dynamo.GROWTH_TABLE_NAME, Item=dynamo.dump_item(row))
+    dynamo.set_client(db)
+    try:
+        report = rescore.rescore_table(segments=3, page_size=4, workers=0,
+                                       checkpoint_path=str(tmp_path / 'scan.checkpoint'), progress=None)
+        again = rescore.rescore_table(segments=3, page_size=4, workers=0, progress=None)
+    finally:
+        dynamo.set_client(None)
+    assert report['rows'] == 30 and report['scored'] == 30
+    assert all('percentile' in item for item in db.items[dynamo.GROWTH_TABLE_NAME].values())
+    assert again['scored'] == 0 and again['unchanged'] == 30
+    assert not (tmp_path / 'scan.checkpoint').exists()
+
+
+def test_checkpoint_positions_saved_from_many_segments(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = rescore.Checkpoint.load(path, False, table='growth', segments=8)
+
+    def advance(segment):
+        for page in range(50):
+            checkpoint.save_position(segment, {'dataId': {'S': f'{segment}-{page}'}})
+        checkpoint.save_position(segment, None)
+
+    threads = [threading.Thread(target=advance, args=(segment,)) for segment in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    resumed = rescore.Checkpoint.load(path, True, table='growth', segments=8)
+    assert all(resumed.position(segment) == {'key': None, 'done': True} for segment in range(8))
+    assert checkpoint.position(8) == {}
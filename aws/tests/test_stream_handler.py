@@ -0,0 +1,114 @@
+"""
+Tests for the GrowthData stream enrichment worker, run against the
+in-memory DynamoDB stand-in: scores are written back in batches, the
+worker's own writes are skipped and failed writes are reported per record.
+"""
+
+import os
+import sys
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import dynamo  # noqa: E402
+import lambda_function  # noqa: E402
+import stream_handler  # noqa: E402
+from aws.tests.conftest import GROWTH, put_baby, put_growth, stored  # noqa: E402
+
+
+@pytest.fixture
+def db(db):
+    put_baby(db, 'baby-f', 'F', '2025-03-25')
+    put_baby(db, 'baby-m', 'M', '2024-01-15')
+    return db
+
+
+def run(db):
+    return stream_handler.lambda_handler({'Records': db.stream_records(GROWTH)}, None)
+
+
+def test_scores_inserts_in_one_batched_write(db):
+    put_growth(db, 'g1')
+    put_growth(db, 'g2', baby_id='baby-m', value=8.2, unit='kg', date='2024-07-15')
+    put_growth(db, 'g3', value=56.0, unit='cm', kind='height')
+    assert run(db) == {'batchItemFailures': []}
+
+    # Same result as the synchronous endpoint (5.35 kg girl at 89 days)
+    assert abs(stored(db, GROWTH, 'g1')['percentile'] - 26.32) < 0.5
+    expected = lambda_function.score_measurements(
+        [{'weight': 8.2, 'date_birth': '2024-01-15', 'date_measurement': '2024-07-15', 'sex': 'male'}])[0]
+    assert stored(db, GROWTH, 'g2')['zscore'] == pytest.approx(expected['zscore'])
+    assert stored(db, GROWTH, 'g2')['percentile'] == expected['percentile']
+    # Only the weight-for-age table is installed: heights stay unscored
+    assert 'percentile' not in stored(db, GROWTH, 'g3')
+    assert db.calls.count('batch_execute_statement') == 1
+    assert db.calls.count('batch_get_item') == 1
+
+
+def test_own_writes_and_unchanged_scores_are_skipped(db):
+    put_growth(db, 'g1')
+    run(db)
+    writes = db.calls.count('batch_execute_statement')
+
+    # The write-back MODIFY records come back through the stream
+    assert run(db) == {'batchItemFailures': []}
+    assert db.calls.count('batch_execute_statement') == writes
+
+    # A notes edit does not rescore; a value edit does
+    item = stored(db, GROWTH, 'g1')
+    db.put_item(TableName=GROWTH, Item=dynamo.dump_item(dict(item, notes='checkup')))
+    failed, stats = stream_handler.process_records(db.stream_records(GROWTH))
+    assert stats['skipped'] == 1 and stats['scored'] == 0
+    db.put_item(TableName=GROWTH, Item=dynamo.dump_item(dict(item, value=6100)))
+    failed, stats = stream_handler.process_records(db.stream_records(GROWTH))
+    assert stats['scored'] == 1
+    assert stored(db, GROWTH, 'g1')['percentile'] > item['percentile']
+
+
+def test_edit_after_record_is_not_overwritten(db):
+    put_growth(db, 'g1')
+    records = db.stream_records(GROWTH)
+    put_growth(db, 'g1', value=6100)
+    failed, stats = stream_handler.process_records(records)
+    assert failed == [] and stats['conflicts'] == 1
+    assert 'percentile' not in stored(db, GROWTH, 'g1')
+
+
+def test_unscorable_items_are_not_retried(db):
+    put_growth(db, 'g1', baby_id='missing')
+    put_growth(db, 'g2', unit='stone')
+    put_growth(db, 'g3', date='2025-01-01')
+    failed, stats = stream_handler.process_records(db.stream_records(GROWTH))
+    assert failed == [] and stats['unscorable'] == 3
+
+
+def test_failed_writes_are_reported_per_record(db):
+    put_growth(db, 'g1')
+    put_growth(db, 'g2', value=4800)
+    records = db.stream_records(GROWTH)
+    db.failing_keys.add('g2')
+    response = stream_handler.lambda_handler({'Records': records}, None)
+    assert response == {'batchItemFailures': [{'itemIdentifier': records[1]['dynamodb']['SequenceNumber']}]}
+    assert 'percentile' in stored(db, GROWTH, 'g1')
+
+
+def test_throttled_batch_fails_every_write(db):
+    put_growth(db, 'g1')
+    put_growth(db, 'g2', value=4800)
+    records = db.stream_records(GROWTH)
+    db.throttle['batch_execute_statement'] = 1
+    response = stream_handler.lambda_handler({'Records': records}, None)
+    assert len(response['batchItemFailures']) == 2
+
+    # The retried batch succeeds
+    assert stream_handler.lambda_handler({'Records': records}, None) == {'batchItemFailures': []}
+
+
+def test_removes_are_ignored(db):
+    put_growth(db, 'g1')
+    db.stream_records(GROWTH)
+    db.delete_item(TableName=GROWTH, Key={'dataId': {'S': 'g1'}})
+    failed, stats = stream_handler.process_records(db.stream_records(GROWTH))
+    assert failed == [] and stats['skipped'] == 1
@@ -0,0 +1,114 @@
+"""
+Tests for the verified token cache in jwt_validator: repeat tokens skip
+signature verification, while expired tokens and tokens whose kid left the
+JWKS miss. Also checks LRU eviction and the stats counters.
+"""
+
+import time
+
+import pytest
+
+from aws.lambdas.percentile import jwt_validator
+from aws.tools.local_jwks import SigningKey, id_token_claims, jwks_document
+
+POOL_ID = 'us-east-1_local'
+CLIENT_ID = 'local-client'
+ISSUER = f'https://cognito-idp.us-east-1.amazonaws.com/{POOL_ID}'
+
+
+@pytest.fixture(scope='module')
+def key():
+    return SigningKey('key-1')
+
+
+@pytest.fixture
+def validator(monkeypatch, key):
+    monkeypatch.setattr(jwt_validator, 'COGNITO_REGION', 'us-east-1')
+    monkeypatch.setattr(jwt_validator, 'COGNITO_USER_POOL_ID', POOL_ID)
+    monkeypatch.setattr(jwt_validator, 'COGNITO_CLIENT_ID', CLIENT_ID)
+    monkeypatch.setattr(jwt_validator, 'TOKEN_CACHE_SIZE', 8)
+    monkeypatch.setattr(jwt_validator, 'TOKEN_CACHE_SKEW', 30)
+    monkeypatch.setattr(jwt_validator, 'JWKS_URL', 'http://127.0.0.1:9/unreachable')
+    jwt_validator.set_jwks(jwks_document([key]))
+    jwt_validator.clear_token_cache()
+    yield jwt_validator
+    jwt_validator.clear_token_cache()
+
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    """Count signature verifications done through jwt.decode"""
+    calls = []
+    original = jwt_validator.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(jwt_validator.jwt, 'decode', counting_decode)
+    return calls
+
+
+def test_repeat_token_skips_verification(validator, key, decode_calls):
+    token = key.sign(id_token_claims(ISSUER, CLIENT_ID, sub='user-1'))
+    for _ in range(5):
+        assert validator.validate_jwt_token(token)['sub'] == 'user-1'
+    assert len(decode_calls) == 1
+    stats = validator.token_cache_stats()
+    assert stats['hits'] == 4 and stats['misses'] == 1 and stats['size'] == 1
+
+
+def test_cached_claims_are_copies(validator, key):
+    token = key.sign(id_token_claims(ISSUER, CLIENT_ID))
+    validator.validate_jwt_token(token)['sub'] = 'tampered'
+    assert validator.validate_jwt_token(token)['sub'] == 'local-user'
+
+
+def test_token_near_expiry_is_not_served_from_cache(validator, key, decode_calls):
+    token = key.sign(id_token_claims(ISSUER, CLIENT_ID, ttl=10))  # inside the 30 s skew
+    validator.validate_jwt_token(token)
+    validator.validate_jwt_token(token)
+    assert len(decode_calls) == 2
+    assert validator.token_cache_stats()['expired'] == 1
+
+
+def test_expired_token_still_rejected(validator, key):
+    token = key.sign(id_token_claims(ISSUER, CLIENT_ID, ttl=-5))
+    for _ in range(2):
+        with pytest.raises(ValueError, match='expired'):
+            validator.validate_jwt_token(token)
+
+
+def test_kid_removed_from_jwks_misses(validator, key, monkeypatch):
+    token = key.sign(id_token_claims(ISSUER, CLIENT_ID))
+    validator.validate_jwt_token(token)
+    monkeypatch.setattr(validator, 'JWKS_MIN_REFRESH_INTERVAL', 3600)
+    monkeypatch.setattr(validator, '_last_fetch_attempt', time.monotonic())
+    validator.set_jwks(jwks_document([SigningKey('key-2')]))  # key-1 revoked
+    with pytest.raises(ValueError, match='Unable to find JWK'):
+        validator.validate_jwt_token(token)
+    assert validator.token_cache_stats()['revoked'] == 1
+
+
+def test_lru_eviction(validator, key, monkeypatch, decode_calls):
+    monkeypatch.setattr(validator, 'TOKEN_CACHE_SIZE', 2)
+    tokens = [key.sign(id_token_claims(ISSUER, CLIENT_ID, sub=f'user-{i}')) for i in range(3)]
+    validator.validate_jwt_token(tokens[0])
+    validator.validate_jwt_token(tokens[1])
+    validator.validate_jwt_token(tokens[0])  # tokens[1] is now least recently used
+    validator.validate_jwt_token(tokens[2])
+    stats = validator.token_cache_stats()
+    assert stats['evictions'] == 1 and stats['size'] == 2
+    validator.validate_jwt_token(tokens[0])
+    assert len(decode_calls) == 3
+    validator.validate_jwt_token(tokens[1])
+    assert len(decode_calls) == 4
+
+
+def test_disabled_cache(validator, key, monkeypatch, decode_calls):
+    monkeypatch.setattr(validator, 'TOKEN_CACHE_SIZE', 0)
+    token = key.sign(id_token_claims(ISSUER, CLIENT_ID))
+    validator.validate_jwt_token(token)
+    validator.validate_jwt_token(token)
+    assert len(decode_calls) == 2
+    assert validator.token_cache_stats()['size'] == 0
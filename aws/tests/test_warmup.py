@@ -0,0 +1,135 @@
+"""
+Tests for the init-phase warmup and the warm-ping fast path: pings skip
+authentication and metrics, initialize() preloads tables, NumPy and keys,
+handler modules that need DynamoDB warm it too, and a container warmed at
+init answers its first request at warm latency.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+sys.path.append(lambda_dir)
+
+import indicators  # noqa: E402
+import jwt_validator  # noqa: E402
+import lambda_function  # noqa: E402
+import percentile_engine  # noqa: E402
+import warmup  # noqa: E402
+from aws.tools.local_jwks import SigningKey, jwks_document  # noqa: E402
+
+
+@pytest.mark.parametrize('event, ping', [
+    ({'warmup': True}, True),
+    ({'source': 'aws.events', 'detail-type': 'Scheduled Event', 'detail': {}}, True),
+    ({'warmup': 'true'}, False),
+    ({'body': json.dumps({'warmup': True}), 'headers': {}}, False),
+    ({'httpMethod': 'POST', 'headers': {}}, False),
+    (None, False),
+])
+def test_is_warm_ping(event, ping):
+    assert warmup.is_warm_ping(event) is ping
+
+
+def test_ping_skips_auth_and_metrics(monkeypatch, capsys):
+    monkeypatch.setattr(warmup, '_initialized', True)
+    response = lambda_function.lambda_handler({'warmup': True}, None)
+    assert response['statusCode'] == 200 and json.loads(response['body']) == {'warm': True}
+    # No EMF line: pings stay out of the latency metrics
+    assert '_aws' not in capsys.readouterr().out
+    # A request through API Gateway still needs a token
+    assert lambda_function.lambda_handler({'body': json.dumps({'warmup': True}), 'headers': {}}, None)['statusCode'] == 401
+
+
+def test_first_ping_initializes(monkeypatch):
+    calls = []
+    monkeypatch.setattr(warmup, '_initialized', False)
+    monkeypatch.setattr(warmup, 'initialize', lambda: calls.append(1))
+    warmup.ping_response()
+    assert calls == [1]
+
+
+def test_initialize_preloads_tables_and_keys(monkeypatch):
+    monkeypatch.setattr(warmup, '_initialized', False)
+    monkeypatch.setattr(indicators, 'TABLES', {})
+    for name in ('_public_keys', '_jwks_cache', '_jwks_fetched_at'):
+        monkeypatch.setattr(jwt_validator, name, getattr(jwt_validator, name))
+    monkeypatch.setattr(jwt_validator, '_public_keys', {})
+    monkeypatch.setattr(jwt_validator, 'JWKS_URL', None)
+    monkeypatch.setattr(jwt_validator, 'COGNITO_USER_POOL_ID', None)
+    timings = warmup.initialize()
+    assert set(timings) == {'tables', 'scoring', 'auth'}
+    assert len(indicators.TABLES) == 2 * len(indicators.INDICATORS)
+    assert percentile_engine._np
+    assert warmup.initialize() == {}
+
+    monkeypatch.setattr(warmup, '_initialized', False)
+    jwt_validator.set_jwks(jwks_document([SigningKey()]))
+    assert warmup.initialize()['auth'] >= 0
+
+
+def test_failing_steps_do_not_break_init(monkeypatch):
+    monkeypatch.setattr(warmup, '_initialized', False)
+    monkeypatch.setattr(warmup, '_warm_tables', lambda: 1 / 0)
+    assert 'tables' in warmup.initialize()
+    assert warmup._initialized
+
+
+def test_dynamodb_step_runs_after_a_plain_init(monkeypatch):
+    calls = []
+    monkeypatch.setattr(warmup, '_initialized', True)
+    monkeypatch.setattr(warmup, '_dynamodb_initialized', False)
+    monkeypatch.setattr(warmup, '_warm_dynamodb', lambda: calls.append(1))
+    assert set(warmup.initialize(dynamodb=True)) == {'dynamodb'}
+    assert warmup.initialize(dynamodb=True) == {} and calls == [1]
+
+
+HANDLER_IMPORT = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import warmup
+calls = []
+warmup._warm_dynamodb = lambda: calls.append(1)
+import history
+print(json.dumps({'initialized': warmup._initialized, 'dynamodb': calls}))
+"""
+
+
+def test_handler_module_warms_dynamodb_at_init():
+    # history imports lambda_function, which initializes without DynamoDB first
+    env = dict(os.environ, WARMUP_ON_INIT='true', METRICS_ENABLED='false')
+    output = subprocess.run([sys.executable, '-c', HANDLER_IMPORT, lambda_dir], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert json.loads(output) == {'initialized': True, 'dynamodb': [1]}
+
+
+FIRST_REQUEST = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+import lambda_function
+handler = lambda_function.lambda_handler.__wrapped__
+measurement = {'weight': 5.35, 'date_birth': '2025-03-25', 'date_measurement': '2025-06-22', 'sex': 'female'}
+body = json.dumps({'measurements': [measurement] * 100})
+times = []
+for _ in range(2):
+    lambda_function.clear_result_cache()
+    start = time.perf_counter()
+    handler({'body': body}, None)
+    times.append((time.perf_counter() - start) * 1000)
+print(json.dumps(times))
+"""
+
+
+def test_first_request_after_init_warmup_is_warm():
+    env = dict(os.environ, WARMUP_ON_INIT='true', METRICS_ENABLED='false')
+    runs = [
+        json.loads(subprocess.run([sys.executable, '-c', FIRST_REQUEST, lambda_dir], env=env,
+                                  capture_output=True, text=True, check=True).stdout)
+        for _ in range(3)
+    ]
+    first, warm = min(run[0] for run in runs), min(run[1] for run in runs)
+    assert first < 3 * warm + 10
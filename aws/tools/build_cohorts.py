@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Rebuild the cohort sketches (lambdas/percentile/cohorts.py) from scratch.
+
+Reads the stored z-scores of every GrowthData measurement, either with a
+parallel segmented Scan of the table (one thread per segment, each filling
+its own sketches) or from JSONL/CSV exports (as read by rescore.py), merges
+the sketches of all segments or files and replaces the stored cohorts with
+them. The GrowthData stream then keeps them current incrementally. Run it
+once to seed the table and again to clear drift from replayed stream
+records or from edits to babies' sex or date of birth.
+
+Measurements without a z-score or a cohort are counted as unscorable; run
+rescore.py first when the scores themselves are stale.
+
+    python -m aws.tools.build_cohorts --scan --segments 8
+    python -m aws.tools.build_cohorts growth-*.jsonl.gz --babies babies.jsonl --dry-run
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+if lambda_dir not in sys.path:
+    sys.path.insert(0, lambda_dir)
+
+import cohorts  # noqa: E402
+import dynamo  # noqa: E402
+
+from aws.tools.rescore import (  # noqa: E402
+    DEFAULT_CHUNK_SIZE, DEFAULT_PAGE_SIZE, Report, _baby, chunked, load_babies, read_rows,
+)
+
+# GrowthData attributes a cohort needs
+SCAN_ATTRIBUTES = ('dataId', 'babyId', 'measurementType', 'measurementDate', 'zscore')
+
+
+def merge(parts):
+    """One {cohort key: KLLSketch} from many"""
+    merged = {}
+    for sketches in parts:
+        for key, sketch in sketches.items():
+            if key in merged:
+                merged[key].merge(sketch)
+            else:
+                merged[key] = sketch
+    return merged
+
+
+def sketch_files(paths, babies=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=sys.stderr):
+    """Cohort sketches of JSONL/CSV exports. Returns (sketches, report dict)."""
+    babies = babies or {}
+    report = Report()
+    sketches = {}
+    for path in paths:
+        for chunk in chunked(read_rows(path), chunk_size):
+            pairs = [(_numeric(row), _baby(babies, row)) for row in chunk]
+            _, skipped = cohorts.sketch_items(pairs, sketches)
+            report.add(rows=len(chunk), scored=len(chunk) - skipped, unscorable=skipped)
+            report.progress(progress)
+    return sketches, report.as_dict()
+
+
+def _numeric(row):
+    """CSV rows carry zscore as text"""
+    zscore = row.get('zscore')
+    if isinstance(zscore, str):
+        try:
+            return dict(row, zscore=float(zscore))
+        except ValueError:
+            return dict(row, zscore=None)
+    return row
+
+
+def sketch_table(segments=4, page_size=DEFAULT_PAGE_SIZE, progress=sys.stderr):
+    """
+    Cohort sketches of the GrowthData table from a parallel segmented Scan.
+    Returns (sketches, report dict).
+    """
+    report = Report()
+    babies = {}
+    babies_lock = threading.Lock()
+    client = dynamo.get_client()
+    names = {f'#a{i}': name for i, name in enumerate(SCAN_ATTRIBUTES)}
+    parts = [{} for _ in range(segments)]
+
+    def lookup_babies(items):
+        with babies_lock:
+            missing = {item.get('babyId') for item in items if item.get('babyId')} - babies.keys()
+        found = dynamo.batch_get(dynamo.BABIES_TABLE_NAME, 'babyId', sorted(missing),
+                                 attributes=('gender', 'dateOfBirth')) if missing else {}
+        with babies_lock:
+            babies.update(found)
+            babies.update({baby_id: None for baby_id in missing - found.keys()})
+            return {item.get('babyId'): babies.get(item.get('babyId')) for item in items}
+
+    def scan_segment(segment):
+        start_key = None
+        while True:
+            request = {'TableName': dynamo.GROWTH_TABLE_NAME, 'Segment': segment, 'TotalSegments': segments,
+                       'Limit': page_size, 'ProjectionExpression': ', '.join(names),
+                       'ExpressionAttributeNames': names}
+            if start_key:
+                request['ExclusiveStartKey'] = start_key
+            page = client.scan(**request)
+            items = [dynamo.load_item(item) for item in page.get('Items', [])]
+            found = lookup_babies(items)
+            _, skipped = cohorts.sketch_items([(item, found.get(item.get('babyId'))) for item in items],
+                                              parts[segment])
+            report.add(rows=len(items), scored=len(items) - skipped, unscorable=skipped)
+            report.progress(progress)
+            start_key = page.get('LastEvaluatedKey')
+            if start_key is None:
+                return
+
+    errors = []
+
+    def run(segment):
+        try:
+            scan_segment(segment)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(segment,)) for segment in range(segments)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return merge(parts), report.as_dict()
+
+
+def store(sketches):
+    """Replace the stored cohorts with sketches. Returns the counters of the write."""
+    results, stats = cohorts.store_cohorts({key: (sketch, None) for key, sketch in sketches.items()},
+                                           replace=True)
+    stats['failed'] = sum(1 for error in results.values() if error is not None)
+    return stats
+
+
+def describe(sketches):
+    """Population and median z-score of each cohort, by key"""
+    return {key: {'population': sketch.count, 'median': round(sketch.quantile(0.5), 3)}
+            for key, sketch in sorted(sketches.items())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild the cohort sketches of stored growth measurements')
+    parser.add_argument('inputs', nargs='*', help='JSONL or CSV exports of GrowthData (.gz allowed)')
+    parser.add_argument('--babies', help='JSONL or CSV export of Babies')
+    parser.add_argument('--scan', action='store_true', help='read the GrowthData table instead of exports')
+    parser.add_argument('--segments', type=int, default=4, help='parallel Scan segments (--scan)')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='items per Scan page (--scan)')
+    parser.add_argument('--dry-run', action='store_true', help='print the cohorts instead of storing them')
+    args = parser.parse_args(argv)
+
+    if args.scan:
+        sketches, report = sketch_table(args.segments, args.page_size)
+    else:
+        if not args.inputs:
+            parser.error('input files are required without --scan')
+        babies = load_babies(args.babies) if args.babies else None
+        sketches, report = sketch_files(args.inputs, babies)
+    report['cohorts'] = len(sketches)
+    if args.dry_run:
+        report['sketches'] = describe(sketches)
+    else:
+        report.update(store(sketches))
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Build or rebuild the per-baby growth summaries (lambdas/percentile/growth_summary.py).
+
+Scans the Babies table with a parallel segmented Scan (one thread per
+segment) and rebuilds the summary of each baby from its BabyGrowthIndex
+items, or only the babies given with --baby-id. Run it once after deploying
+the summary consumer to backfill babies with existing measurements (the
+consumer also builds a missing summary on the baby's next change), and again
+to repair a summary that drifted.
+
+Run it while the consumer is caught up with the GrowthData stream: a record
+still in flight when its baby is rebuilt is applied on top of the rebuild.
+
+    python -m aws.tools.build_summaries --segments 8
+    python -m aws.tools.build_summaries --baby-id b-123 --baby-id b-456
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+if lambda_dir not in sys.path:
+    sys.path.insert(0, lambda_dir)
+
+import dynamo  # noqa: E402
+import growth_summary  # noqa: E402
+
+from aws.tools.rescore import Report  # noqa: E402
+
+# Babies per Scan page, rebuilt together
+DEFAULT_PAGE_SIZE = 100
+
+COUNTERS = ('written', 'rebuilt', 'orphaned', 'conflicts', 'failed')
+
+
+def rebuild(baby_ids, report, progress=sys.stderr):
+    stats = growth_summary.rebuild_babies(baby_ids)
+    report.add(rows=len(baby_ids), **{name: stats.get(name, 0) for name in COUNTERS})
+    report.progress(progress)
+
+
+def rebuild_table(segments=4, page_size=DEFAULT_PAGE_SIZE, progress=sys.stderr):
+    """Rebuild the summary of every baby in the Babies table. Returns the report dict."""
+    report = Report(**dict.fromkeys(COUNTERS, 0))
+    client = dynamo.get_client()
+
+    def scan_segment(segment):
+        start_key = None
+        while True:
+            request = {'TableName': dynamo.BABIES_TABLE_NAME, 'Segment': segment, 'TotalSegments': segments,
+                       'Limit': page_size, 'ProjectionExpression': '#id',
+                       'ExpressionAttributeNames': {'#id': 'babyId'}}
+            if start_key:
+                request['ExclusiveStartKey'] = start_key
+            page = client.scan(**request)
+            baby_ids = [dynamo.load_item(item)['babyId'] for item in page.get('Items', [])]
+            if baby_ids:
+                rebuild(baby_ids, report, progress)
+            start_key = page.get('LastEvaluatedKey')
+            if start_key is None:
+                return
+
+    errors = []
+
+    def run(segment):
+        try:
+            scan_segment(segment)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(segment,)) for segment in range(segments)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return _counts(report)
+
+
+def rebuild_ids(baby_ids, progress=sys.stderr):
+    """Rebuild the summaries of baby_ids. Returns the report dict."""
+    report = Report(**dict.fromkeys(COUNTERS, 0))
+    rebuild(list(baby_ids), report, progress)
+    return _counts(report)
+
+
+def _counts(report):
+    counts = report.as_dict()
+    counts['babies'] = counts.pop('rows')
+    for name in ('scored', 'unscorable', 'rows_per_second', 'rows_per_hour'):
+        counts.pop(name)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or rebuild the per-baby growth summaries')
+    parser.add_argument('--baby-id', action='append', default=[], help='rebuild only this baby (repeatable)')
+    parser.add_argument('--segments', type=int, default=4, help='parallel Scan segments of Babies')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='babies per Scan page')
+    args = parser.parse_args(argv)
+
+    if args.baby_id:
+        report = rebuild_ids(args.baby_id)
+    else:
+        report = rebuild_table(args.segments, args.page_size)
+    print(json.dumps(report, indent=2))
+    return 0 if report['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
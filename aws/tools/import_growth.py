@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Import a CSV or JSONL file of historical measurements for one baby.
+
+Runs the import of POST /percentile/import (lambdas/percentile/bulk_import.py)
+on a local file of any size, against the table in DYNAMODB_ENDPOINT_URL or
+AWS: rows are read, scored and written a chunk at a time, and the per-row
+report is written to --report as JSONL while the import runs, so memory stays
+flat however long the file. The baby is read from the Babies table; the
+measurements are owned by its userId. Running it again on the same file
+imports nothing new.
+
+    python -m aws.tools.import_growth scale-export.csv.gz --baby-id b-123 --report import.jsonl
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+if lambda_dir not in sys.path:
+    sys.path.insert(0, lambda_dir)
+
+import bulk_import  # noqa: E402
+import dynamo  # noqa: E402
+
+from aws.tools.rescore import Report  # noqa: E402
+
+
+def content_type(path):
+    path = path.removesuffix('.gz')
+    if path.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'application/x-ndjson'
+    return 'text/csv' if path.endswith('.csv') else ''
+
+
+def import_file(path, baby_id, report_path=None, chunk_size=None, progress=sys.stderr):
+    """Import path for baby_id. Returns the counts by status (plus rows and timing)."""
+    baby = dynamo.batch_get(dynamo.BABIES_TABLE_NAME, 'babyId', [baby_id],
+                            attributes=('userId', 'dateOfBirth', 'gender')).get(baby_id)
+    if baby is None:
+        raise ValueError(f"Baby {baby_id} not found")
+    report = Report(**dict.fromkeys(bulk_import.STATUSES, 0))
+    opener = gzip.open if path.endswith('.gz') else open
+    output = open(report_path, 'w') if report_path else None
+    try:
+        with opener(path, 'rb') as stream:
+            rows = bulk_import.read_rows(stream, content_type(path))
+            last_row = None
+            for entry in bulk_import.import_rows(baby, baby.get('userId'), rows, chunk_size):
+                report.add(**{entry['status']: 1}, rows=entry['row'] != last_row)
+                last_row = entry['row']
+                if output is not None:
+                    output.write(json.dumps(entry) + '\n')
+                report.progress(progress)
+    finally:
+        if output is not None:
+            output.close()
+    counts = report.as_dict()
+    counts.pop('scored')
+    counts.pop('unscorable')
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import historical growth measurements for one baby')
+    parser.add_argument('input', help='CSV or JSONL file (.gz allowed)')
+    parser.add_argument('--baby-id', required=True, help='baby the measurements belong to')
+    parser.add_argument('--report', help='per-row report (JSONL)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help=f'rows per scoring and write chunk (default {bulk_import.IMPORT_CHUNK_SIZE})')
+    args = parser.parse_args(argv)
+    print(json.dumps(import_file(args.input, args.baby_id, args.report, args.chunk_size), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
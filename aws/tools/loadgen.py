@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Load generator for the percentile API.
+
+Replays single-measurement and batch requests against a server with a fixed
+number of concurrent keep-alive connections and reports throughput and
+latency percentiles per scenario. Without --url it starts an in-process
+LocalServer (see local_server.py) and signs its own token, so a baseline
+needs no AWS and no second terminal:
+
+    python -m aws.tools.loadgen --requests 2000 --concurrency 8
+    python -m aws.tools.local_server --workers 4 &
+    python -m aws.tools.loadgen --url http://127.0.0.1:8000 --token <token>
+"""
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+PATH = '/upnest-percentile'
+
+
+def make_measurement(rng):
+    birth = date(2021, 1, 1)
+    return {
+        "weight": round(rng.uniform(2.0, 20.0), 3),
+        "height": round(rng.uniform(45.0, 110.0), 1),
+        "date_birth": birth.isoformat(),
+        "date_measurement": (birth + timedelta(days=rng.randint(0, 1856))).isoformat(),
+        "sex": rng.choice(["male", "female"]),
+    }
+
+
+def make_bodies(count, batch_size=None, seed=0):
+    """count request bodies: single measurements, or batches of batch_size"""
+    rng = random.Random(seed)
+    if batch_size is None:
+        return [json.dumps(make_measurement(rng)) for _ in range(count)]
+    return [
+        json.dumps({"measurements": [make_measurement(rng) for _ in range(batch_size)]})
+        for _ in range(count)
+    ]
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile (q in 0-100) of an ascending list"""
+    if not sorted_values:
+        return float('nan')
+    rank = max(1, round(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_load(url, token, bodies, requests, concurrency):
+    """
+    POST requests bodies (cycling through them) from concurrency threads,
+    one keep-alive connection each. Returns a report dict with req/s and
+    latency percentiles in ms.
+    """
+    target = urlsplit(url)
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        connection = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        own = []
+        own_statuses = {}
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            try:
+                connection.request('POST', target.path.rstrip('/') + PATH, bodies[i % len(bodies)], headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+                status = 'error'
+            own.append((time.perf_counter() - start) * 1000)
+            own_statuses[status] = own_statuses.get(status, 0) + 1
+        connection.close()
+        with lock:
+            latencies.extend(own)
+            for status, count in own_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if status != 200),
+        "statuses": statuses,
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else float('nan'),
+    }
+
+
+def format_report(name, report, per_request=1):
+    line = (
+        f"{name:<14} {report['requests']:>6} req  {report['rps']:9.1f} req/s"
+        f"  p50 {report['p50']:7.2f}  p90 {report['p90']:7.2f}  p99 {report['p99']:7.2f}"
+        f"  max {report['max']:7.2f} ms  errors {report['errors']}"
+    )
+    if per_request > 1:
+        line += f"  ({report['rps'] * per_request:.0f} measurements/s)"
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load generator for the percentile API')
+    parser.add_argument('--url', help='server base URL (default: start an in-process LocalServer)')
+    parser.add_argument('--token', help='bearer token (required with --url)')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--json', action='store_true', help='print the reports as JSON')
+    args = parser.parse_args(argv)
+
+    server = None
+    url, token = args.url, args.token
+    if url is None:
+        from aws.tools.local_server import LocalServer
+
+        server = LocalServer().start()
+        url, token = server.url, server.token()
+    elif not token:
+        parser.error('--token is required with --url')
+
+    scenarios = [
+        ('single', make_bodies(min(args.requests, 1000)), args.requests, 1),
+        (f'batch x{args.batch_size}', make_bodies(50, args.batch_size), max(1, args.requests // args.batch_size),
+         args.batch_size),
+    ]
+    reports = {}
+    try:
+        for name, bodies, requests, per_request in scenarios:
+            # Warm up connections, token cache and lazy imports before timing
+            run_load(url, token, bodies, min(requests, args.concurrency * 2), args.concurrency)
+            reports[name] = run_load(url, token, bodies, requests, args.concurrency)
+            if not args.json:
+                print(format_report(name, reports[name], per_request), flush=True)
+    finally:
+        if server is not None:
+            server.stop()
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    return 1 if any(report['errors'] for report in reports.values()) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
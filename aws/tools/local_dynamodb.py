@@ -0,0 +1,227 @@
+"""
+In-memory stand-in for the DynamoDB client, for tests and local runs.
+
+Implements the client methods the percentile handlers call, on items kept in
+DynamoDB JSON, and records every write as a DynamoDB Streams record
+(NEW_AND_OLD_IMAGES) so stream consumers can be fed their own writes back.
+Install it with dynamo.set_client(LocalDynamoDB(...)).
+
+Only the request shapes the handlers use are understood: BatchExecuteStatement
+accepts UPDATE "<table>" SET a = ?, ... WHERE "key" = ? [AND "attr" = ?]...
+and INSERT INTO "<table>" VALUE {'a': ?, ...}; Query accepts a single
+equality key condition, on the table or on any attribute named as an index key.
+"""
+
+import copy
+import re
+import zlib
+from decimal import Decimal
+
+# UPDATE "table" SET "a" = ?, b = ? WHERE "k" = ? AND "v" = ?
+UPDATE_PATTERN = re.compile(r'^\s*UPDATE\s+"(?P<table>[^"]+)"\s+SET\s+(?P<set>.+?)\s+WHERE\s+(?P<where>.+?)\s*$', re.I | re.S)
+ASSIGNMENT_PATTERN = re.compile(r'^\s*"?(?P<name>[A-Za-z_][\w]*)"?\s*=\s*\?\s*$')
+# INSERT INTO "table" VALUE {'a': ?, 'b': ?}
+INSERT_PATTERN = re.compile(r'^\s*INSERT\s+INTO\s+"(?P<table>[^"]+)"\s+VALUE\s+\{(?P<fields>.+)\}\s*$', re.I | re.S)
+FIELD_PATTERN = re.compile(r"^\s*'(?P<name>[^']+)'\s*:\s*\?\s*$")
+# #k = :v or name = :v
+KEY_CONDITION_PATTERN = re.compile(r'^\s*(?P<name>#?\w+)\s*=\s*(?P<value>:\w+)\s*$')
+
+
+def _equal(a, b):
+    """DynamoDB equality of two attribute values (numbers compare by value)"""
+    if a is not None and b is not None and 'N' in a and 'N' in b:
+        return Decimal(a['N']) == Decimal(b['N'])
+    return a == b
+
+
+class ClientError(Exception):
+    """Raised like botocore's ClientError, with response['Error']['Code']"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class LocalDynamoDB:
+    """
+    Tables are declared up front by partition key name:
+
+        db = LocalDynamoDB({'UpNest-GrowthData-dev': 'dataId'})
+        db.put_item(TableName='UpNest-GrowthData-dev', Item={...})
+        db.stream_records('UpNest-GrowthData-dev')
+    """
+
+    def __init__(self, tables):
+        self.keys = dict(tables)
+        self.items = {name: {} for name in self.keys}
+        self.streams = {name: [] for name in self.keys}
+        self.calls = []
+        # Requests to reject with ThrottlingException, by method name
+        self.throttle = {}
+        # Keys whose writes fail, to exercise partial batch failures
+        self.failing_keys = set()
+        self._sequence = 0
+
+    def _table(self, name):
+        if name not in self.items:
+            raise ClientError('ResourceNotFoundException', f"Requested resource not found: {name}")
+        return self.items[name]
+
+    def _call(self, method):
+        self.calls.append(method)
+        if self.throttle.get(method):
+            self.throttle[method] -= 1
+            raise ClientError('ThrottlingException', 'Rate exceeded')
+
+    def _key(self, table_name, item):
+        key_name = self.keys[table_name]
+        (kind, value), = item[key_name].items()
+        return value
+
+    def _write(self, table_name, new, key=None):
+        table = self._table(table_name)
+        key = key if key is not None else self._key(table_name, new)
+        old = table.get(key)
+        if new is None:
+            table.pop(key, None)
+        else:
+            table[key] = copy.deepcopy(new)
+        self._sequence += 1
+        record = {
+            'eventID': str(self._sequence),
+            'eventName': 'REMOVE' if new is None else 'MODIFY' if old is not None else 'INSERT',
+            'eventSource': 'aws:dynamodb',
+            'dynamodb': {
+                'Keys': {self.keys[table_name]: {'S': key}},
+                'SequenceNumber': f'{self._sequence:021d}',
+                'StreamViewType': 'NEW_AND_OLD_IMAGES',
+            },
+        }
+        if new is not None:
+            record['dynamodb']['NewImage'] = copy.deepcopy(new)
+        if old is not None:
+            record['dynamodb']['OldImage'] = copy.deepcopy(old)
+        self.streams[table_name].append(record)
+
+    def stream_records(self, table_name, clear=True):
+        """Stream records written since the last call, as a Lambda event's Records"""
+        records = self.streams[table_name]
+        if clear:
+            self.streams[table_name] = []
+        return list(records)
+
+    # Client methods
+
+    def put_item(self, TableName, Item, **kwargs):
+        self._call('put_item')
+        self._write(TableName, Item)
+        return {}
+
+    def get_item(self, TableName, Key, **kwargs):
+        self._call('get_item')
+        (_, value), = next(iter(Key.values())).items()
+        item = self._table(TableName).get(value)
+        return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def delete_item(self, TableName, Key, **kwargs):
+        self._call('delete_item')
+        (_, value), = next(iter(Key.values())).items()
+        if value in self._table(TableName):
+            self._write(TableName, None, key=value)
+        return {}
+
+    def scan(self, TableName, Segment=0, TotalSegments=1, Limit=None, ExclusiveStartKey=None, **kwargs):
+        """Items of one segment in key order; segments split keys by CRC32"""
+        self._call('scan')
+        keys = sorted(k for k in self._table(TableName) if zlib.crc32(k.encode()) % TotalSegments == Segment)
+        if ExclusiveStartKey is not None:
+            (_, start), = next(iter(ExclusiveStartKey.values())).items()
+            keys = [k for k in keys if k > start]
+        page = keys[:Limit] if Limit else keys
+        response = {'Items': [copy.deepcopy(self.items[TableName][k]) for k in page], 'Count': len(page)}
+        if Limit and len(keys) > Limit:
+            response['LastEvaluatedKey'] = {self.keys[TableName]: {'S': page[-1]}}
+        return response
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues, IndexName=None,
+              ExpressionAttributeNames=None, Limit=None, ExclusiveStartKey=None, **kwargs):
+        """Items whose key attribute equals the value, in table key order (the index sort key is ignored)"""
+        self._call('query')
+        match = KEY_CONDITION_PATTERN.match(KeyConditionExpression)
+        if not match:
+            raise ClientError('ValidationException', f"Unsupported key condition: {KeyConditionExpression}")
+        name = (ExpressionAttributeNames or {}).get(match['name'], match['name'])
+        value = ExpressionAttributeValues[match['value']]
+        table = self._table(TableName)
+        keys = sorted(k for k, item in table.items() if _equal(item.get(name), value))
+        if ExclusiveStartKey is not None:
+            start = self._key(TableName, ExclusiveStartKey)
+            keys = [k for k in keys if k > start]
+        page = keys[:Limit] if Limit else keys
+        response = {'Items': [copy.deepcopy(table[k]) for k in page], 'Count': len(page)}
+        if Limit and len(keys) > Limit:
+            response['LastEvaluatedKey'] = {self.keys[TableName]: {'S': page[-1]}}
+        return response
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self._call('batch_get_item')
+        responses = {}
+        for table_name, request in RequestItems.items():
+            table = self._table(table_name)
+            names = request.get('ExpressionAttributeNames')
+            projection = set(names.values()) if names else None
+            found = []
+            for key in request['Keys']:
+                (_, value), = next(iter(key.values())).items()
+                item = table.get(value)
+                if item is not None:
+                    item = {k: v for k, v in item.items() if projection is None or k in projection}
+                    found.append(copy.deepcopy(item))
+            responses[table_name] = found
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def batch_execute_statement(self, Statements, **kwargs):
+        self._call('batch_execute_statement')
+        if len(Statements) > 25:
+            raise ClientError('ValidationException', 'Too many statements')
+        return {'Responses': [self._execute(s['Statement'], s.get('Parameters', [])) for s in Statements]}
+
+    def _execute(self, statement, parameters):
+        insert = INSERT_PATTERN.match(statement)
+        if insert:
+            return self._insert(insert, statement, parameters)
+        match = UPDATE_PATTERN.match(statement)
+        if not match:
+            return {'Error': {'Code': 'ValidationException', 'Message': f"Unsupported statement: {statement}"}}
+        table_name = match['table']
+        assignments = [ASSIGNMENT_PATTERN.match(part) for part in match['set'].split(',')]
+        conditions = [ASSIGNMENT_PATTERN.match(part) for part in re.split(r'\s+AND\s+', match['where'], flags=re.I)]
+        if not all(assignments) or not all(conditions):
+            return {'Error': {'Code': 'ValidationException', 'Message': f"Unsupported statement: {statement}"}}
+        values = list(parameters)
+        updates = {m['name']: values.pop(0) for m in assignments}
+        expected = {m['name']: values.pop(0) for m in conditions}
+
+        key_name = self.keys[table_name]
+        (_, key), = expected[key_name].items()
+        if key in self.failing_keys:
+            return {'Error': {'Code': 'InternalServerError', 'Message': 'Internal server error'}}
+        item = self._table(table_name).get(key)
+        if item is None or not all(_equal(item.get(name), value) for name, value in expected.items()):
+            return {'Error': {'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'}}
+        self._write(table_name, dict(item, **updates))
+        return {}
+
+    def _insert(self, match, statement, parameters):
+        table_name = match['table']
+        fields = [FIELD_PATTERN.match(part) for part in match['fields'].split(',')]
+        if not all(fields) or len(fields) != len(parameters):
+            return {'Error': {'Code': 'ValidationException', 'Message': f"Unsupported statement: {statement}"}}
+        item = {m['name']: value for m, value in zip(fields, parameters)}
+        key = self._key(table_name, item)
+        if key in self.failing_keys:
+            return {'Error': {'Code': 'InternalServerError', 'Message': 'Internal server error'}}
+        if key in self._table(table_name):
+            return {'Error': {'Code': 'DuplicateItem', 'Message': 'Duplicate primary key exists in table'}}
+        self._write(table_name, item)
+        return {}
@@ -0,0 +1,111 @@
+"""
+Local stand-in for the Cognito JWKS endpoint, for tests and local runs.
+
+Generates RSA signing keys, serves them as a JWKS document over HTTP on
+localhost and signs Cognito-shaped ID tokens with them. Requests are counted
+and can be delayed to exercise caching, single-flight and timeouts.
+"""
+
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+JWKS_PATH = '/.well-known/jwks.json'
+
+
+class SigningKey:
+    """An RSA key pair with a Cognito-style kid"""
+
+    def __init__(self, kid=None):
+        self.kid = kid or uuid.uuid4().hex
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def public_jwk(self):
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update({'kid': self.kid, 'alg': 'RS256', 'use': 'sig'})
+        return jwk
+
+    def sign(self, claims):
+        return jwt.encode(claims, self.private_key, algorithm='RS256', headers={'kid': self.kid})
+
+
+def id_token_claims(issuer, audience, sub='local-user', ttl=3600, **extra):
+    """Claims shaped like a Cognito ID token"""
+    now = int(time.time())
+    claims = {
+        'sub': sub,
+        'aud': audience,
+        'iss': issuer,
+        'token_use': 'id',
+        'email': f'{sub}@example.com',
+        'cognito:username': sub,
+        'iat': now,
+        'auth_time': now,
+        'exp': now + ttl,
+    }
+    claims.update(extra)
+    return claims
+
+
+def jwks_document(keys):
+    return {'keys': [key.public_jwk() for key in keys]}
+
+
+class JWKSServer:
+    """
+    Serve a JWKS document on 127.0.0.1 from a background thread.
+
+        with JWKSServer([SigningKey()]) as server:
+            server.url, server.requests
+    """
+
+    def __init__(self, keys, delay=0.0, port=0):
+        self.keys = list(keys)
+        self.delay = delay
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.delay:
+                    time.sleep(server.delay)
+                if self.path != JWKS_PATH:
+                    self.send_error(404)
+                    return
+                body = json.dumps(jwks_document(server.keys)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}{JWKS_PATH}'
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
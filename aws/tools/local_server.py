@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Local HTTP server for the percentile Lambda handlers.
+
+Serves the same routes as API Gateway (POST /upnest-percentile, GET
+/percentile/curves, POST /percentile/analytics, GET /percentile/history) by
+turning each HTTP request into an API Gateway proxy event, so
+require_jwt_auth runs exactly as deployed. Tokens are checked against a
+local stand-in JWKS (see local_jwks.py) instead of Cognito; the server
+prints a signed token to use at startup. /percentile/history reads DynamoDB
+(set DYNAMODB_ENDPOINT_URL to use DynamoDB Local).
+
+Each worker is a ThreadingHTTPServer with keep-alive. With --workers N the
+signing key is created once and N forked processes share the port through
+SO_REUSEPORT (Linux), which gets past the GIL for CPU-bound scoring.
+With --microbatch, concurrent requests within a worker are scored together
+(see microbatch.py).
+
+Usage: python -m aws.tools.local_server [--port 8000] [--workers N] [--microbatch [WINDOW_US]]
+"""
+
+import argparse
+import base64
+import importlib
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from aws.tools.local_jwks import SigningKey, id_token_claims, jwks_document
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+
+LOCAL_REGION = 'us-east-1'
+LOCAL_POOL_ID = 'us-east-1_local'
+LOCAL_CLIENT_ID = 'local-client'
+LOCAL_ISSUER = f'https://cognito-idp.{LOCAL_REGION}.amazonaws.com/{LOCAL_POOL_ID}'
+
+# (method, path) -> (module, handler) in the Lambda directory
+ROUTES = {
+    ('POST', '/upnest-percentile'): ('lambda_function', 'lambda_handler'),
+    ('GET', '/percentile/curves'): ('curves', 'lambda_handler'),
+    ('POST', '/percentile/analytics'): ('analytics', 'lambda_handler'),
+    ('GET', '/percentile/history'): ('history', 'lambda_handler'),
+    ('GET', '/percentile/cohort'): ('cohort_rank', 'lambda_handler'),
+    ('POST', '/percentile/import'): ('bulk_import', 'lambda_handler'),
+}
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
+}
+
+
+def configure_auth(key):
+    """
+    Point jwt_validator at the local pool and pre-warm it with key's JWKS.
+    Works before the Lambda modules are imported (through the environment
+    they read at import) and after (by updating the loaded module).
+    """
+    jwks = jwks_document([key])
+    settings = {
+        'COGNITO_REGION': LOCAL_REGION,
+        'COGNITO_USER_POOL_ID': LOCAL_POOL_ID,
+        'COGNITO_CLIENT_ID': LOCAL_CLIENT_ID,
+        'JWKS_JSON': json.dumps(jwks),
+        # Never reach out to Cognito for an unknown kid
+        'JWKS_URL': 'http://127.0.0.1:9/.well-known/jwks.json',
+    }
+    os.environ.update(settings)
+    validator = sys.modules.get('jwt_validator')
+    if validator is not None:
+        for name, value in settings.items():
+            setattr(validator, name, value)
+        validator.set_jwks(jwks)
+
+
+def load_handlers():
+    """Import the Lambda modules as Lambda does (flat) and return handlers by route"""
+    if lambda_dir not in sys.path:
+        sys.path.insert(0, lambda_dir)
+    return {
+        route: getattr(importlib.import_module(module), name)
+        for route, (module, name) in ROUTES.items()
+    }
+
+
+def api_gateway_event(method, target, headers, body, client_ip):
+    """The API Gateway (REST, proxy integration) event for one HTTP request"""
+    url = urlsplit(target)
+    query = dict(parse_qsl(url.query, keep_blank_values=True))
+    return {
+        'httpMethod': method,
+        'path': url.path,
+        'resource': url.path,
+        'headers': dict(headers),
+        'queryStringParameters': query or None,
+        'body': body,
+        'isBase64Encoded': False,
+        'requestContext': {'httpMethod': method, 'path': url.path, 'identity': {'sourceIp': client_ip}},
+    }
+
+
+class LambdaRequestHandler(BaseHTTPRequestHandler):
+    """Dispatches requests to the handlers in server.handlers"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # keep-alive response waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._invoke('GET')
+
+    def do_POST(self):
+        self._invoke('POST')
+
+    def do_OPTIONS(self):
+        self._send(200, dict(CORS_HEADERS), b'')
+
+    def _invoke(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else None
+        handler = self.server.handlers.get((method, urlsplit(self.path).path))
+        if handler is None:
+            payload = json.dumps({'error': 'Not Found', 'success': False}).encode()
+            self._send(404, {'Content-Type': 'application/json', **CORS_HEADERS}, payload)
+            return
+        event = api_gateway_event(method, self.path, self.headers.items(), body, self.client_address[0])
+        try:
+            response = handler(event, None)
+        except Exception as e:
+            # Lambda would report an invocation error as a 502 from API Gateway
+            self.log_error(f"Handler raised {e!r}")
+            payload = json.dumps({'message': 'Internal server error'}).encode()
+            self._send(502, {'Content-Type': 'application/json'}, payload)
+            return
+        body = response.get('body', '')
+        # API Gateway decodes binary (gzip, msgpack) bodies before sending them
+        body = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode()
+        self._send(response['statusCode'], response.get('headers') or {}, body)
+
+    def _send(self, status, headers, body):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            super().log_message(*args)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # socketserver listens with a backlog of 5; bursts of new connections
+    # beyond that are dropped and retried by the client a second later
+    request_queue_size = 128
+    reuse_port = False
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+class LocalServer:
+    """
+    One server worker on host:port in a background thread.
+
+        with LocalServer() as server:
+            server.url, server.token()
+    """
+
+    def __init__(self, port=0, host='127.0.0.1', key=None, reuse_port=False, verbose=False, microbatch_us=None):
+        self.key = key or SigningKey('local-key')
+        configure_auth(self.key)
+        handlers = load_handlers()
+        if microbatch_us is not None:
+            importlib.import_module('microbatch').enable(window_us=microbatch_us)
+        self.httpd = _Server((host, port), LambdaRequestHandler, bind_and_activate=False)
+        self.httpd.reuse_port = reuse_port
+        try:
+            self.httpd.server_bind()
+            self.httpd.server_activate()
+        except OSError:
+            self.httpd.server_close()
+            raise
+        self.httpd.handlers = handlers
+        self.httpd.verbose = verbose
+        self.url = f'http://{host}:{self.httpd.server_address[1]}'
+        self._thread = None
+
+    def token(self, sub='local-user', ttl=3600):
+        return self.key.sign(id_token_claims(LOCAL_ISSUER, LOCAL_CLIENT_ID, sub=sub, ttl=ttl))
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _worker(port, host, key, verbose, microbatch_us):
+    LocalServer(port, host, key, reuse_port=True, verbose=verbose, microbatch_us=microbatch_us).serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local HTTP server for the percentile Lambda')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1, help='processes sharing the port (SO_REUSEPORT)')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    parser.add_argument('--microbatch', type=int, nargs='?', const=1000, metavar='WINDOW_US',
+                        help='score concurrent requests together, waiting at most WINDOW_US (default 1000)')
+    args = parser.parse_args(argv)
+
+    key = SigningKey('local-key')
+    token = key.sign(id_token_claims(LOCAL_ISSUER, LOCAL_CLIENT_ID, ttl=24 * 3600))
+    print(f"Serving {', '.join(path for _, path in ROUTES)} on http://{args.host}:{args.port} "
+          f"with {args.workers} worker(s)")
+    print(f"Token (valid 24 h): {token}", flush=True)
+
+    if args.workers <= 1:
+        server = LocalServer(args.port, args.host, key, verbose=args.verbose, microbatch_us=args.microbatch)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.httpd.server_close()
+        return 0
+
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        parser.error('--workers needs SO_REUSEPORT (Linux or macOS)')
+    context = multiprocessing.get_context('fork')
+    workers = [
+        context.Process(target=_worker, args=(args.port, args.host, key, args.verbose, args.microbatch),
+                           daemon=True)
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
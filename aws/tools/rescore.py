@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Offline re-scoring of historical growth data.
+
+Recomputes percentile and zscore for every stored measurement after the WHO
+tables or the scoring method change, using the same code path as the stream
+worker (stream_handler.score_items). Two sources are supported:
+
+  files  JSONL (plain items or DynamoDB export {"Item": ...} lines, optionally
+         .gz) or CSV exports of GrowthData. Rows are read lazily, scored in
+         chunks across a process pool and written in input order to a new
+         file with percentile, zscore and scoreError set. Baby sex and date of
+         birth come from a Babies export (--babies) or from gender/dateOfBirth
+         columns on the rows themselves.
+  table  a parallel segmented Scan of the GrowthData table (DynamoDB Local or
+         any endpoint in DYNAMODB_ENDPOINT_URL). Changed scores are written
+         back with the stream worker's conditional batched updates.
+
+Only a bounded number of chunks is in flight at any time, and progress is
+checkpointed after every chunk written (file offset and row count, or the
+last evaluated key per segment), so an interrupted run resumes with --resume.
+
+    python -m aws.tools.rescore growth.jsonl --babies babies.jsonl --output rescored.jsonl
+    python -m aws.tools.rescore --scan --segments 8
+"""
+
+import argparse
+import copy
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+lambda_dir = os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'percentile')
+if lambda_dir not in sys.path:
+    sys.path.insert(0, lambda_dir)
+
+import dynamo  # noqa: E402
+import stream_handler  # noqa: E402
+
+DEFAULT_CHUNK_SIZE = 20000
+DEFAULT_PAGE_SIZE = 1000
+
+# Seconds between progress lines on stderr
+PROGRESS_INTERVAL = 5.0
+
+SCORE_FIELDS = ('percentile', 'zscore', 'scoreError')
+
+
+def score_chunk(pairs):
+    """Process pool task: score a chunk of (item, baby) pairs"""
+    return stream_handler.score_items(pairs, cached=False)
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def _is_csv(path):
+    return path.removesuffix('.gz').endswith('.csv')
+
+
+def input_fields(path):
+    """Column names of a CSV input (None for JSONL)"""
+    if not _is_csv(path):
+        return None
+    with _open_text(path) as f:
+        return next(csv.reader(f), [])
+
+
+def read_rows(path):
+    """Yield the items of a JSONL or CSV export as plain dicts"""
+    with _open_text(path) as f:
+        if _is_csv(path):
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if 'Item' in row and isinstance(row['Item'], dict):
+                row = dynamo.load_item(row['Item'])
+            yield row
+
+
+def load_babies(path):
+    """babyId -> Babies item from an export"""
+    return {row['babyId']: row for row in read_rows(path) if row.get('babyId')}
+
+
+def _baby(babies, row):
+    """Babies item for a row, or the row itself when it carries the baby columns"""
+    baby = babies.get(row.get('babyId'))
+    if baby is None and 'gender' in row:
+        return row
+    return baby
+
+
+def chunked(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Checkpoint:
+    """Progress of a run in a JSON file, replaced atomically on every save"""
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, resume, **identity):
+        state = dict(identity)
+        if resume and path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            mismatched = [name for name, value in identity.items() if saved.get(name) != value]
+            if mismatched:
+                raise ValueError(f"Checkpoint {path} belongs to another run ({', '.join(mismatched)} differ)")
+            state = saved
+        return cls(path, state)
+
+    def save(self, **changes):
+        with self._lock:
+            self.state.update(changes)
+            self._write()
+
+    def position(self, segment):
+        """Where a Scan segment stopped: {'key': start key, 'done': bool}, {} if it has not started"""
+        with self._lock:
+            return dict(self.state.get('positions', {}).get(str(segment), {}))
+
+    def save_position(self, segment, start_key):
+        """Record the key a Scan segment resumes from (None once it is done)"""
+        with self._lock:
+            positions = self.state.setdefault('positions', {})
+            positions[str(segment)] = {'key': start_key, 'done': start_key is None}
+            self._write()
+
+    def _write(self):
+        # Called with the lock held. Dumps a copy: callers also reach self.state directly
+        if not self.path:
+            return
+        state = copy.deepcopy(self.state)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Report:
+    """Counters and throughput of a run"""
+
+    def __init__(self, **initial):
+        self.counts = {'rows': 0, 'scored': 0, 'unscorable': 0}
+        self.counts.update(initial)
+        self.start = time.perf_counter()
+        self._last_progress = self.start
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+
+    def as_dict(self):
+        seconds = time.perf_counter() - self.start
+        rate = self.counts['rows'] / seconds if seconds else 0.0
+        return dict(self.counts, seconds=round(seconds, 3), rows_per_second=round(rate, 1),
+                    rows_per_hour=round(rate * 3600))
+
+    def progress(self, stream):
+        now = time.perf_counter()
+        if stream is None or now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        report = self.as_dict()
+        print(f"{report['rows']} rows, {report['rows_per_second']:.0f} rows/s", file=stream, flush=True)
+
+
+class _InlineExecutor:
+    """Scores on the calling thread (workers=0), with the executor interface used here"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        return _Done(fn(*args))
+
+
+class _Done:
+    """Completed stand-in for a Future"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+
+def default_workers():
+    """One scoring process per CPU; on a single CPU a pool only adds pickling"""
+    count = os.cpu_count() or 1
+    return count if count > 1 else 0
+
+
+def _executor(workers):
+    """A process pool of workers processes, or in-process scoring for 0"""
+    return ProcessPoolExecutor(max_workers=workers) if workers else _InlineExecutor()
+
+
+def _format_chunk(rows, results, fields):
+    """Serialize scored rows as JSONL lines, or CSV rows when fields is given"""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=fields, extrasaction='ignore') if fields else None
+    scored = 0
+    for row, (percentile, zscore, error) in zip(rows, results):
+        row = dict(row, percentile=percentile, zscore=zscore, scoreError=error)
+        scored += error is None
+        if writer is None:
+            out.write(json.dumps(row, default=str))
+            out.write('\n')
+        else:
+            writer.writerow({name: '' if value is None else value for name, value in row.items()})
+    return out.getvalue().encode('utf-8'), scored
+
+
+def rescore_file(input_path, output_path, babies=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 checkpoint_path=None, resume=False, progress=sys.stderr):
+    """
+    Re-score a JSONL/CSV export into output_path. babies maps babyId to a
+    Babies item; without one, rows must carry gender and dateOfBirth.
+    Returns the report dict.
+    """
+    workers = default_workers() if workers is None else workers
+    checkpoint = Checkpoint.load(checkpoint_path, resume, input=os.path.abspath(input_path),
+                                 output=os.path.abspath(output_path))
+    done_rows = checkpoint.state.get('rows', 0)
+    offset = checkpoint.state.get('offset', 0)
+    report = Report(scored=checkpoint.state.get('scored', 0), unscorable=checkpoint.state.get('unscorable', 0))
+    babies = babies or {}
+
+    fields = input_fields(input_path)
+    if fields is not None:
+        fields = fields + [name for name in SCORE_FIELDS if name not in fields]
+
+    mode = 'r+b' if offset else 'wb'
+    with open(output_path, mode) as output, _executor(workers) as executor:
+        output.truncate(offset)
+        output.seek(offset)
+        if fields is not None and not offset:
+            header = io.StringIO()
+            csv.writer(header).writerow(fields)
+            output.write(header.getvalue().encode('utf-8'))
+
+        rows = itertools.islice(read_rows(input_path), done_rows, None)
+        in_flight = deque()
+        max_in_flight = 2 * workers
+
+        def drain(limit):
+            nonlocal done_rows
+            while len(in_flight) > limit:
+                chunk, future = in_flight.popleft()
+                data, scored = _format_chunk(chunk, future.result(), fields)
+                output.write(data)
+                output.flush()
+                done_rows += len(chunk)
+                report.add(rows=len(chunk), scored=scored, unscorable=len(chunk) - scored)
+                checkpoint.save(rows=done_rows, offset=output.tell(), scored=report.counts['scored'],
+                                unscorable=report.counts['unscorable'])
+                report.progress(progress)
+
+        for chunk in chunked(rows, chunk_size):
+            pairs = [(row, _baby(babies, row)) for row in chunk]
+            in_flight.append((chunk, executor.submit(score_chunk, pairs)))
+            drain(max_in_flight)
+        drain(0)
+
+    checkpoint.remove()
+    return report.as_dict()
+
+
+def rescore_table(segments=4, page_size=DEFAULT_PAGE_SIZE, workers=None, checkpoint_path=None,
+                  resume=False, progress=sys.stderr):
+    """
+    Re-score the GrowthData table in place with a parallel segmented Scan:
+    one thread per segment scans a page, scores it on the process pool and
+    writes changed scores back before moving on. Returns the report dict.
+    """
+    workers = default_workers() if workers is None else workers
+    checkpoint = Checkpoint.load(checkpoint_path, resume, table=dynamo.GROWTH_TABLE_NAME, segments=segments)
+    report = Report(unchanged=0, conflicts=0, failed=0)
+    babies = {}
+    babies_lock = threading.Lock()
+    client = dynamo.get_client()
+
+    def lookup_babies(items):
+        with babies_lock:
+            missing = {item.get('babyId') for item in items if item.get('babyId')} - babies.keys()
+        found = dynamo.batch_get(dynamo.BABIES_TABLE_NAME, 'babyId', sorted(missing),
+                                 attributes=('gender', 'dateOfBirth')) if missing else {}
+        with babies_lock:
+            babies.update(found)
+            babies.update({baby_id: None for baby_id in missing - found.keys()})
+            return {item.get('babyId'): babies.get(item.get('babyId')) for item in items}
+
+    def scan_segment(executor, segment):
+        position = checkpoint.position(segment)
+        start_key = position.get('key')
+        done = position.get('done', False)
+        while not done:
+            request = {'TableName': dynamo.GROWTH_TABLE_NAME, 'Segment': segment,
+                       'TotalSegments': segments, 'Limit': page_size}
+            if start_key:
+                request['ExclusiveStartKey'] = start_key
+            page = client.scan(**request)
+            items = [dynamo.load_item(item) for item in page.get('Items', [])]
+            found = lookup_babies(items)
+            pairs = [(item, found.get(item.get('babyId'))) for item in items]
+            results = executor.submit(score_chunk, pairs).result()
+
+            writes = [
+                stream_handler.update_statement(item, percentile, zscore)
+                for item, (percentile, zscore, error) in zip(items, results)
+                if error is None and not stream_handler.score_unchanged(item, percentile, zscore)
+            ]
+            errors = dynamo.batch_execute(writes)
+            failed = [e for e in errors if e is not None and e.get('Code') != 'ConditionalCheckFailed']
+            if failed:
+                # Stop this segment at the last completed page; --resume retries it
+                raise RuntimeError(f"Segment {segment}: {len(failed)} writes failed ({failed[0].get('Code')})")
+            unscorable = sum(1 for result in results if result[2] is not None)
+            conflicts = sum(1 for e in errors if e is not None)
+            report.add(rows=len(items), scored=len(writes) - conflicts, conflicts=conflicts,
+                       unscorable=unscorable, unchanged=len(items) - unscorable - len(writes))
+
+            start_key = page.get('LastEvaluatedKey')
+            done = start_key is None
+            checkpoint.save_position(segment, start_key)
+            report.progress(progress)
+
+    errors = []
+    with _executor(workers) as executor:
+        def run(segment):
+            try:
+                scan_segment(executor, segment)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(segment,)) for segment in range(segments)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    checkpoint.remove()
+    return report.as_dict()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-score stored growth measurements')
+    parser.add_argument('input', nargs='?', help='JSONL or CSV export of GrowthData (.gz allowed)')
+    parser.add_argument('--output', help='rescored file (default: <input>.rescored.<ext>)')
+    parser.add_argument('--babies', help='JSONL or CSV export of Babies')
+    parser.add_argument('--scan', action='store_true', help='re-score the GrowthData table in place')
+    parser.add_argument('--segments', type=int, default=4, help='parallel Scan segments (--scan)')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='items per Scan page (--scan)')
+    parser.add_argument('--workers', type=int, default=None, help='scoring processes (default: one per CPU, 0: in-process)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows per scoring task')
+    parser.add_argument('--checkpoint', help='checkpoint file (default: <output>.checkpoint)')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint')
+    args = parser.parse_args(argv)
+
+    if args.scan:
+        report = rescore_table(args.segments, args.page_size, args.workers,
+                               args.checkpoint or f'{dynamo.GROWTH_TABLE_NAME}.rescore.checkpoint', args.resume)
+    else:
+        if not args.input:
+            parser.error('an input file is required without --scan')
+        base, ext = args.input.removesuffix('.gz'), ''
+        base, ext = os.path.splitext(base)
+        output = args.output or f'{base}.rescored{ext}'
+        babies = load_babies(args.babies) if args.babies else None
+        report = rescore_file(args.input, output, babies, args.workers, args.chunk_size,
+                              args.checkpoint or f'{output}.checkpoint', args.resume)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
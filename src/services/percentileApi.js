@@ -18,3 +18,140 @@ export async function calculatePercentile(data) {
     throw new Error(msg);
   }
 }
+
+/**
+ * Fetches reference centile curves (P3/P15/P50/P85/P97 by default) for charts.
+ * @param {Object} params - { sex, indicator, from, to, step, centiles }
+ * @returns {Object} { x, centiles: { P3: [...], ... }, unit, index_unit }
+ * @throws {Error} if the request fails or the backend returns an error
+ */
+export async function fetchCentileCurves(params) {
+  try {
+    const response = await axiosClient.get("/percentile/curves", { params });
+    return response.data;
+  } catch (error) {
+    const msg =
+      error.response?.data?.error ||
+      error.message ||
+      "Unknown API error";
+    throw new Error(msg);
+  }
+}
+
+/**
+ * Fetches z-score velocity, conditional gain and centile crossings for a
+ * measurement series. Pass the `state` of a previous response with only the
+ * new measurements to append them without resending the history.
+ * @param {Object} params - { sex, date_birth, indicator, unit, series: [{ date, value }], state }
+ * @returns {Object} { points, intervals, crossings, summary, state }
+ * @throws {Error} if the request fails or the backend returns an error
+ */
+export async function fetchGrowthAnalytics(params) {
+  try {
+    const response = await axiosClient.post("/percentile/analytics", params);
+    return response.data;
+  } catch (error) {
+    const msg =
+      error.response?.data?.error ||
+      error.message ||
+      "Unknown API error";
+    throw new Error(msg);
+  }
+}
+
+/**
+ * Fetches a baby's stored measurements scored server-side in one request,
+ * instead of posting each measurement to the percentile endpoint.
+ * @param {string} babyId - baby to load (must belong to the signed-in user)
+ * @param {string} [measurementType] - weight, height, head_circumference or bmi
+ * @returns {Object} { series: { weight: [{ dataId, date, value, zscore, percentile }] }, unscorable }
+ * @throws {Error} if the request fails or the backend returns an error
+ */
+export async function fetchScoredHistory(babyId, measurementType) {
+  try {
+    const params = measurementType ? { babyId, measurementType } : { babyId };
+    const response = await axiosClient.get("/percentile/history", { params });
+    return response.data;
+  } catch (error) {
+    const msg =
+      error.response?.data?.error ||
+      error.message ||
+      "Unknown API error";
+    throw new Error(msg);
+  }
+}
+
+/**
+ * Fetches a baby's growth summary for the dashboard: per measurement type the
+ * count, latest point, a series downsampled by age and the recent trend.
+ * @param {string} babyId - baby to load (must belong to the signed-in user)
+ * @returns {Object} { types: { weight: { unit, count, latest, series, trend } }, updatedAt }
+ * @throws {Error} if the request fails or the backend returns an error
+ */
+export async function fetchGrowthSummary(babyId) {
+  try {
+    const response = await axiosClient.get("/percentile/history", {
+      params: { babyId, view: "summary" },
+    });
+    return response.data;
+  } catch (error) {
+    const msg =
+      error.response?.data?.error ||
+      error.message ||
+      "Unknown API error";
+    throw new Error(msg);
+  }
+}
+
+/**
+ * Fetches where a z-score falls among other babies of the same sex and age.
+ * @param {string} measurementType - weight, height, head_circumference or bmi
+ * @param {string} sex - male or female
+ * @param {number} ageMonths - completed months of age (0-60)
+ * @param {number} [zscore] - WHO z-score to place (omit for the cohort quantiles only)
+ * @returns {Object} { population, quantiles: { p3, ..., p97 }, cohortPercentile }
+ * @throws {Error} if the request fails or the backend returns an error
+ */
+export async function fetchCohortPercentile(measurementType, sex, ageMonths, zscore) {
+  try {
+    const params = { measurementType, sex, ageMonths };
+    if (zscore !== undefined && zscore !== null) params.zscore = zscore;
+    const response = await axiosClient.get("/percentile/cohort", { params });
+    return response.data;
+  } catch (error) {
+    const msg =
+      error.response?.data?.error ||
+      error.message ||
+      "Unknown API error";
+    throw new Error(msg);
+  }
+}
+
+/**
+ * Imports a CSV or JSONL file of historical measurements (e.g. a scale or
+ * device export) for one baby. Rows already stored are skipped as duplicates.
+ * @param {string} babyId - baby the measurements belong to
+ * @param {File|Blob} file - the upload; .jsonl/.ndjson files are sent as JSONL, others as CSV
+ * @returns {Object} { counts: { imported, duplicate, invalid, failed }, rows: [{ row, status, error, warning }],
+ *   omitted }, where rows lists the rows not imported or imported without a score
+ * @throws {Error} if the request fails or the backend returns an error
+ */
+export async function importGrowthData(babyId, file) {
+  try {
+    const name = file.name || "";
+    const contentType = /\.(jsonl|ndjson|json)$/i.test(name)
+      ? "application/x-ndjson"
+      : "text/csv";
+    const response = await axiosClient.post("/percentile/import", file, {
+      params: { babyId },
+      headers: { "Content-Type": contentType },
+    });
+    return response.data;
+  } catch (error) {
+    const msg =
+      error.response?.data?.error ||
+      error.message ||
+      "Unknown API error";
+    throw new Error(msg);
+  }
+}